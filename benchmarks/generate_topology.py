@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Generates synthetic spine/leaf fabrics in DOT format for benchmarking Topology Converter.
+
+Every leaf connects to every spine and every spine to every superspine. Hosts are spread over the
+leaves round robin. With `ports` every switch gets ports=N, which makes Topology Converter create
+the unused ports up to swpN (libvirt only).
+
+Usage:
+$ python3 ./benchmarks/generate_topology.py --spines 4 --leaves 16 --hosts 64 --ports 64 \\
+    > fabric.dot
+"""
+# pylint: disable=print-function
+
+import argparse
+import sys
+
+SWITCH_OS = 'CumulusCommunity/cumulus-vx'
+HOST_OS = 'generic/ubuntu1804'
+
+def generate_fabric(superspines=0, spines=2, leaves=4, hosts=8, ports=None):
+    """
+    Generates a fabric
+
+    Arguments:
+    superspines [int] - Number of superspines
+    spines [int] - Number of spines
+    leaves [int] - Number of leaves
+    hosts [int] - Number of hosts, spread over the leaves
+    ports [int] - ports attribute of every switch (None for no port expansion)
+
+    Returns:
+    str - Topology in DOT format
+    """
+    switch_attributes = 'os="%s" memory="768"' % SWITCH_OS
+    if ports:
+        switch_attributes += ' ports="%s"' % ports
+
+    names = {'superspine': ['superspine%02d' % (i + 1) for i in range(superspines)],
+             'spine': ['spine%02d' % (i + 1) for i in range(spines)],
+             'leaf': ['leaf%02d' % (i + 1) for i in range(leaves)],
+             'host': ['server%02d' % (i + 1) for i in range(hosts)]}
+
+    lines = ['graph fabric {']
+    for function in ('superspine', 'spine', 'leaf'):
+        for name in names[function]:
+            lines.append(' "%s" [function="%s" %s]' % (name, function, switch_attributes))
+    for name in names['host']:
+        lines.append(' "%s" [function="host" os="%s" memory="512"]' % (name, HOST_OS))
+    lines.append('')
+
+    # Ports are numbered downlinks first, then uplinks
+    hosts_per_leaf = [0] * leaves
+    for index, host in enumerate(names['host'] if leaves else []):
+        leaf = index % leaves
+        hosts_per_leaf[leaf] += 1
+        lines.append(' "%s":"swp%s" -- "%s":"eth1"'
+                     % (names['leaf'][leaf], hosts_per_leaf[leaf], host))
+
+    for leaf_index, leaf in enumerate(names['leaf']):
+        for spine_index, spine in enumerate(names['spine']):
+            lines.append(' "%s":"swp%s" -- "%s":"swp%s"'
+                         % (leaf, hosts_per_leaf[leaf_index] + spine_index + 1,
+                            spine, leaf_index + 1))
+
+    for spine_index, spine in enumerate(names['spine']):
+        for superspine_index, superspine in enumerate(names['superspine']):
+            lines.append(' "%s":"swp%s" -- "%s":"swp%s"'
+                         % (spine, leaves + superspine_index + 1,
+                            superspine, spine_index + 1))
+
+    lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def main(argv=None):
+    """ Prints a generated fabric """
+    parser = argparse.ArgumentParser(description='Generate a spine/leaf fabric in DOT format')
+    parser.add_argument('--superspines', type=int, default=0)
+    parser.add_argument('--spines', type=int, default=2)
+    parser.add_argument('--leaves', type=int, default=4)
+    parser.add_argument('--hosts', type=int, default=8)
+    parser.add_argument('--ports', type=int, default=None,
+                        help='Set ports=N on every switch')
+    args = parser.parse_args(argv)
+    sys.stdout.write(generate_fabric(args.superspines, args.spines, args.leaves, args.hosts,
+                                     args.ports))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
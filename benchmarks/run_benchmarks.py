@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the phases of a conversion on generated fabrics and compares them against stored
+baselines.
+
+Every case generates a fabric (see generate_topology.py), converts it several times and keeps the
+fastest time of every phase: linting, pydotplus parsing (for comparison with the native parser,
+which lints in the same pass), the phases recorded in TcConfig.timings (parse, node loop, edge
+loop, mgmt network, port expansion, populate_data_structures and every template render) and the
+whole conversion. The peak memory of a conversion is measured in a separate run with tracemalloc.
+
+A phase regresses when it is slower than its baseline by more than --tolerance and by more than
+--min-delta milliseconds. Timings depend on the machine, so record baselines with --update on the
+machine that runs the comparison.
+
+Usage:
+$ python3 ./benchmarks/run_benchmarks.py
+$ python3 ./benchmarks/run_benchmarks.py --case small-virtualbox --repeat 10
+$ python3 ./benchmarks/run_benchmarks.py --update
+"""
+# pylint: disable=print-function
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=wrong-import-position
+from benchmarks.generate_topology import generate_fabric
+from topology_converter.api import convert
+from topology_converter.parse_topology import lint_topo_file
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+CASES = [
+    {'name': 'small-virtualbox',
+     'fabric': {'spines': 2, 'leaves': 4, 'hosts': 8},
+     'options': {'provider': 'virtualbox'}},
+    {'name': 'small-libvirt-mgmt',
+     'fabric': {'spines': 2, 'leaves': 4, 'hosts': 8},
+     'options': {'provider': 'libvirt', 'create_mgmt_network': True}},
+    {'name': 'medium-libvirt-ports',
+     'fabric': {'superspines': 2, 'spines': 4, 'leaves': 16, 'hosts': 32, 'ports': 64},
+     'options': {'provider': 'libvirt'}},
+    {'name': 'large-libvirt-mgmt',
+     'fabric': {'superspines': 4, 'spines': 8, 'leaves': 64, 'hosts': 128},
+     'options': {'provider': 'libvirt', 'create_mgmt_network': True}},
+]
+
+def convert_case(case, topology_file, output_dir):
+    """ Converts the topology of a case and returns its ConversionResult """
+    options = dict(case['options'], reproducible=True, render_workers=1)
+    with contextlib.redirect_stdout(io.StringIO()):
+        return convert(topology_file, options, output_dir)
+
+def timed(function, *args):
+    """ Returns the seconds function(*args) takes """
+    start = time.perf_counter()
+    function(*args)
+    return time.perf_counter() - start
+
+def run_case(case, repeat):
+    """
+    Benchmarks a case
+
+    Returns:
+    dict - {'phases': {phase: fastest milliseconds}, 'peak_kb': peak memory of a conversion}
+    """
+    import pydotplus # pylint: disable=import-outside-toplevel
+
+    with tempfile.TemporaryDirectory() as directory:
+        topology_file = os.path.join(directory, case['name'] + '.dot')
+        with open(topology_file, 'w') as outfile:
+            outfile.write(generate_fabric(**case['fabric']))
+        with open(topology_file) as infile:
+            dot_data = infile.read()
+        output_dir = os.path.join(directory, 'output')
+
+        # Warm up the template cache and the imports
+        convert_case(case, topology_file, output_dir)
+
+        phases = {}
+        def record(name, seconds):
+            phases[name] = min(phases.get(name, seconds), seconds)
+
+        for _ in range(repeat):
+            record('lint', timed(lint_topo_file, topology_file))
+            record('parse:pydotplus', timed(pydotplus.graph_from_dot_data, dot_data))
+            start = time.perf_counter()
+            result = convert_case(case, topology_file, output_dir)
+            record('total', time.perf_counter() - start)
+            for name, seconds in result.config.timings:
+                record(name, seconds)
+
+        tracemalloc.start()
+        convert_case(case, topology_file, output_dir)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {'phases': {name: round(seconds * 1000, 3) for name, seconds in phases.items()},
+            'peak_kb': peak // 1024}
+
+def compare(name, current, baseline, tolerance, min_delta, memory_tolerance):
+    """
+    Compares the results of a case with its baseline
+
+    Returns:
+    list - Descriptions of the regressions
+    """
+    regressions = []
+    for phase, milliseconds in current['phases'].items():
+        if phase not in baseline['phases']:
+            continue
+        limit = baseline['phases'][phase]
+        if milliseconds > limit * (1 + tolerance) and milliseconds - limit > min_delta:
+            regressions.append('%s %s: %.2f ms (baseline %.2f ms)'
+                               % (name, phase, milliseconds, limit))
+    if current['peak_kb'] > baseline['peak_kb'] * (1 + memory_tolerance):
+        regressions.append('%s peak memory: %s KB (baseline %s KB)'
+                           % (name, current['peak_kb'], baseline['peak_kb']))
+    return regressions
+
+def print_results(name, current, baseline):
+    """ Prints the results of a case next to its baseline """
+    print('\n%s (peak memory %s KB%s)' % (name, current['peak_kb'], ', baseline %s KB'
+                                          % baseline['peak_kb'] if baseline else ''))
+    for phase, milliseconds in current['phases'].items():
+        reference = baseline['phases'].get(phase) if baseline else None
+        print('    %-40s %9.2f ms%s' % (phase, milliseconds, '   (baseline %.2f ms)' % reference
+                                         if reference is not None else ''))
+
+def main(argv=None):
+    """ Runs the benchmarks """
+    parser = argparse.ArgumentParser(description='Benchmark Topology Converter')
+    parser.add_argument('--case', action='append', choices=[case['name'] for case in CASES],
+                        help='Only run this case (may be repeated)')
+    parser.add_argument('--repeat', type=int, default=5,
+                        help='Conversions per case, the fastest is kept (default 5)')
+    parser.add_argument('--baselines', default=BASELINES, help='Baseline file')
+    parser.add_argument('--update', action='store_true',
+                        help='Store the results as the new baselines')
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='Allowed slowdown of a phase as a fraction (default 0.5)')
+    parser.add_argument('--min-delta', type=float, default=2.0,
+                        help='Slowdowns below this many milliseconds are ignored (default 2)')
+    parser.add_argument('--memory-tolerance', type=float, default=0.25,
+                        help='Allowed growth of the peak memory as a fraction (default 0.25)')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.isfile(args.baselines):
+        with open(args.baselines) as infile:
+            baselines = json.load(infile)
+
+    regressions = []
+    for case in CASES:
+        if args.case and case['name'] not in args.case:
+            continue
+        current = run_case(case, args.repeat)
+        baseline = baselines.get(case['name'])
+        print_results(case['name'], current, baseline)
+        if args.update:
+            baselines[case['name']] = current
+        elif baseline:
+            regressions += compare(case['name'], current, baseline, args.tolerance,
+                                   args.min_delta, args.memory_tolerance)
+
+    if args.update:
+        with open(args.baselines, 'w') as outfile:
+            json.dump(baselines, outfile, indent=2, sort_keys=True)
+            outfile.write('\n')
+        print('\nUpdated %s' % args.baselines)
+        return 0
+
+    if regressions:
+        print('\nREGRESSIONS:')
+        for regression in regressions:
+            print('    ' + regression)
+        return 1
+    print('\nNo regressions.')
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -23,10 +23,13 @@ setuptools.setup(
         'License :: OSI Approved :: GNU General Public License v2 (GPLv2)',
         'Operating System :: OS Independent',
     ],
-    python_requires='>=3.4',
+    python_requires='>=3.7',
     install_requires=[
         'jinja2',
         'pydotplus',
     ],
+    entry_points={
+        'console_scripts': ['topology_converter=topology_converter.cli:main'],
+    },
     package_data={'topology_converter.templates': ['*.j2', 'auto_mgmt_network/*.j2']}
 )
@@ -9,7 +9,8 @@ sed -i '/^ "spine01" \[/c\ "spine01" \[os="CumulusCommunity\/cumulus-vx" vagrant
 cat topology.dot
 python3 ./topology_converter.py topology.dot -p libvirt -a
 grep 'ansible.playbook = "./helper_scripts/empty_playbook.yml"' Vagrantfile
-grep 'ansible.groups = {' Vagrantfile
+grep 'ansible.groups = $ansible_groups' Vagrantfile
+grep -F '"network:children" => ["exit","spine","leaf","internet",]' Vagrantfile
 ls helper_scripts/empty_playbook.yml
 cat helper_scripts/empty_playbook.yml
 ls ansible.cfg
@@ -0,0 +1,52 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT"' EXIT
+
+# Conversions in one interpreter do not share state, also when run concurrently
+rm -f Vagrantfile
+python3 - $OUTPUT <<'PYTHON'
+import concurrent.futures
+import os
+import sys
+
+from topology_converter.api import convert
+from topology_converter.tc_error import TcError
+
+BAD_INTERFACE = 'graph dc1 {\n "leaf1" [function="leaf"]\n "leaf2" [function="leaf"]\n' \
+                ' "leaf1":"swp1/5" -- "leaf2":"swp1/1"\n}\n'
+
+first = convert('./examples/cldemo.dot', {'provider': 'libvirt'})
+second = convert('./examples/cldemo.dot', {'provider': 'libvirt'})
+assert first.files['Vagrantfile'] == second.files['Vagrantfile']
+assert first.files['./dhcp_mac_map'] == second.files['./dhcp_mac_map']
+assert first.config.function_group == second.config.function_group
+assert first.config.function_group['leaf'] == ['leaf01', 'leaf02', 'leaf03', 'leaf04']
+assert not os.path.exists('Vagrantfile')
+
+with concurrent.futures.ThreadPoolExecutor(4) as pool:
+    results = list(pool.map(lambda topology: convert(topology),
+                            [BAD_INTERFACE, './examples/2switch.dot'] * 4))
+for warned, clean in zip(results[::2], results[1::2]):
+    assert len(warned.warnings) == 2, warned.warnings
+    assert clean.warnings == []
+    assert 'DEFINE VM for leaf1' in clean.files['Vagrantfile']
+
+result = convert('./examples/2switch_auto_mgmt.dot', create_mgmt_network=True,
+                 ansible_hostfile=True, output_dir=sys.argv[1])
+assert os.path.isfile(os.path.join(sys.argv[1], 'Vagrantfile'))
+assert os.path.isfile(os.path.join(sys.argv[1], 'dhcp_mac_map'))
+assert os.path.isfile(os.path.join(sys.argv[1], 'ansible.cfg'))
+assert os.path.isfile(os.path.join(sys.argv[1], 'helper_scripts/auto_mgmt_network/dhcpd.hosts'))
+assert all(content is None for content in result.files.values())
+
+try:
+    convert('./examples/2switch.dot', tunnel_ip='127.0.0.2')
+    raise AssertionError('tunnel_ip without libvirt was accepted')
+except TcError as err:
+    assert 'provider is not libvirt' in err.message
+PYTHON
+
+# The command line script can be imported without converting anything
+python3 -c "import importlib.util, sys; sys.argv = ['x']; spec = importlib.util.spec_from_file_location('tc', 'topology_converter.py'); spec.loader.exec_module(importlib.util.module_from_spec(spec))"
@@ -7,3 +7,14 @@ cat topology.dot
 python3 ./topology_converter.py topology.dot -p libvirt
 leaf01Block=`sed -n '/DEFINE VM for leaf01/,/DEFINE VM for/p' < Vagrantfile`
 echo $leaf01Block | grep 'ansible.playbook = "gitlabci/playbook"'
+echo $leaf01Block | grep 'ansible.groups = $ansible_groups'
+
+# The ansible groups are defined once, not for every device with a playbook
+sed -i 's/function="spine"/function="spine" playbook="gitlabci\/playbook"/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt
+if [ $(grep -c '"network:children" =>' Vagrantfile) -ne 1 ]; then
+    exit 1
+fi
+if [ $(grep -c 'ansible.groups = \$ansible_groups' Vagrantfile) -ne 3 ]; then
+    exit 1
+fi
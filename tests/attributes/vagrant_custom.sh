@@ -6,4 +6,4 @@ sed -i '/^ "leaf01" \[function="leaf"/c\ "leaf01" \[function="leaf" vagrant="git
 cat topology.dot
 python3 ./topology_converter.py topology.dot -p libvirt
 leaf01Block=`sed -n '/DEFINE VM for leaf01/,/DEFINE VM for/p' < Vagrantfile`
-echo $leaf01Block | grep 'ACTION=="add", SUBSYSTEM=="net", ATTR{ifindex}=="2", NAME="gitlabciinterface"'
+echo $leaf01Block | grep 'remap_interfaces(device, "gitlabciinterface"'
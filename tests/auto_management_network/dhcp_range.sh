@@ -0,0 +1,25 @@
+#!/usr/bin/env bash
+set -e
+
+# Custom DHCP range given as offsets into the management subnet
+cp ./examples/2switch.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -c --mgmt-dhcp-range 100-200
+grep "range 192.168.200.100 192.168.200.200;" helper_scripts/auto_mgmt_network/dhcpd.conf
+if python3 ./topology_converter.py topology.dot -p libvirt -c --mgmt-dhcp-range 100-300; then
+    exit 1
+fi
+
+# Large IPv4 management subnet
+sed -i 's/"leaf2" \[/"oob-mgmt-server" [function="oob-server" mgmt_ip="10.20.0.254\/16"]\n "leaf2" [/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -c
+grep "subnet 10.20.0.0 netmask 255.255.0.0" helper_scripts/auto_mgmt_network/dhcpd.conf
+grep 'fixed-address 10.20.0.1; option host-name "leaf1"' helper_scripts/auto_mgmt_network/dhcpd.hosts
+
+# IPv6 management subnets are rejected, the OOB server only runs an IPv4 DHCP server
+sed -i 's/mgmt_ip="10.20.0.254\/16"/mgmt_ip="fd00:200::fe"/' topology.dot
+OUTPUT=$(mktemp)
+trap 'rm -f "$OUTPUT"' EXIT
+if python3 ./topology_converter.py topology.dot -p libvirt -c > "$OUTPUT"; then
+    exit 1
+fi
+grep "only supports IPv4 subnets" "$OUTPUT"
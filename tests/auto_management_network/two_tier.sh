@@ -0,0 +1,44 @@
+#!/usr/bin/env bash
+set -e
+
+MGMT=helper_scripts/auto_mgmt_network
+
+# Up to the fanout every device is connected to the oob-mgmt-switch
+cp ./examples/cldemo.dot topology.dot
+sed -i '/oob-mgmt-server/d' topology.dot
+sed -i '/oob-mgmt-switch/d' topology.dot
+rm -f $MGMT/bridge-untagged*
+python3 ./topology_converter.py topology.dot -p libvirt -c
+if grep "DEFINE VM for oob-mgmt-leaf" Vagrantfile; then
+    exit 1
+fi
+ls $MGMT/bridge-untagged
+
+# Beyond the fanout the devices are connected to oob leaf switches, grouped by function and name
+rm -f $MGMT/bridge-untagged*
+python3 ./topology_converter.py topology.dot -p libvirt -c --mgmt-fanout 4
+if [ $(grep -c "DEFINE VM for oob-mgmt-leaf" Vagrantfile) -ne 4 ]; then
+    exit 1
+fi
+switchBlock=`sed -n '/DEFINE VM for oob-mgmt-switch /,/DEFINE VM for/p' < Vagrantfile`
+echo $switchBlock | grep "link for swp5 --> oob-mgmt-leaf04:swp1"
+leafBlock=`sed -n '/DEFINE VM for oob-mgmt-leaf01 /,/DEFINE VM for/p' < Vagrantfile`
+echo $leafBlock | grep "link for swp1 --> oob-mgmt-switch:swp2"
+echo $leafBlock | grep "link for swp2 --> leaf01:eth0"
+echo $leafBlock | grep "link for swp5 --> leaf04:eth0"
+
+# Every oob switch gets its own bridge configuration
+if ls $MGMT/bridge-untagged; then
+    exit 1
+fi
+grep "bridge-ports swp1 swp2 swp3 swp4 swp5" $MGMT/bridge-untagged-oob-mgmt-switch
+grep "bridge-ports swp1 swp2 swp3 swp4 swp5" $MGMT/bridge-untagged-oob-mgmt-leaf01
+grep 'source: "./helper_scripts/auto_mgmt_network/bridge-untagged-oob-mgmt-leaf01"' Vagrantfile
+grep "oob-mgmt-leaf04" $MGMT/hosts
+grep 'option host-name "oob-mgmt-leaf04"' $MGMT/dhcpd.hosts
+
+# More oob leaf switches than the fanout
+if python3 ./topology_converter.py topology.dot -p libvirt -c --mgmt-fanout 3; then
+    exit 1
+fi
+rm -f $MGMT/bridge-untagged-*
@@ -0,0 +1,40 @@
+#!/usr/bin/env bash
+set -e
+
+TOPOLOGIES=$(mktemp -d)
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$TOPOLOGIES" "$OUTPUT"' EXIT
+
+cp ./examples/2switch.dot ./examples/cldemo.dot "$TOPOLOGIES"
+mkdir "$TOPOLOGIES/lab"
+cp ./examples/2switch.dot "$TOPOLOGIES/lab"
+printf 'graph broken {\n "leaf1":"swp1" -- \n}\n' > "$TOPOLOGIES/broken.dot"
+
+# A broken topology fails the batch but does not stop the other conversions
+rm -f Vagrantfile
+set +e
+SUMMARY=$(python3 ./topology_converter.py -p libvirt --batch "$TOPOLOGIES" \
+          --batch-output "$OUTPUT" --batch-workers 2)
+RC=$?
+set -e
+echo "$SUMMARY"
+test $RC -eq 1
+echo "$SUMMARY" | grep -q "3 passed, 1 failed"
+echo "$SUMMARY" | grep "broken.dot" | grep -q "FAIL"
+echo "$SUMMARY" | grep "cldemo.dot" | grep "PASS" | grep -q " 16 "
+echo "$SUMMARY" | grep -q "Cannot parse the provided topology.dot file"
+
+# Every topology is written to its own directory
+for name in 2switch cldemo lab/2switch; do
+    grep -q "libvirt" "$OUTPUT/$name/Vagrantfile"
+    test -f "$OUTPUT/$name/dhcp_mac_map"
+done
+test ! -e "$OUTPUT/broken"
+test ! -e ./Vagrantfile
+
+# Without failures the batch succeeds
+rm "$TOPOLOGIES/broken.dot"
+python3 ./topology_converter.py --batch "$TOPOLOGIES/2switch.dot" "$TOPOLOGIES/lab" \
+    --batch-output "$OUTPUT/single" | grep -q "2 passed, 0 failed"
+test -f "$OUTPUT/single/2switch/Vagrantfile"
+test -f "$OUTPUT/single/2switch-2/Vagrantfile"
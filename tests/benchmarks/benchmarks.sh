@@ -0,0 +1,47 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT"' EXIT
+
+# Generated fabrics convert, including the ports expansion
+python3 ./benchmarks/generate_topology.py --superspines 2 --spines 2 --leaves 3 --hosts 5 \
+    --ports 8 > "$OUTPUT/fabric.dot"
+grep -q '"leaf03":"swp2" -- "spine01":"swp3"' "$OUTPUT/fabric.dot"
+grep -q '"spine02":"swp5" -- "superspine02":"swp2"' "$OUTPUT/fabric.dot"
+python3 ./topology_converter.py "$OUTPUT/fabric.dot" -p libvirt -c > /dev/null
+grep -q 'config.vm.define "superspine02"' Vagrantfile
+grep -q "link for swp8 --> NOTHING:NOTHING" Vagrantfile
+
+# Baselines are recorded and every phase is reported
+python3 ./benchmarks/run_benchmarks.py --case small-libvirt-mgmt --repeat 1 \
+    --baselines "$OUTPUT/baselines.json" --update > "$OUTPUT/results"
+for phase in lint parse:pydotplus parse nodes edges mgmt_network populate \
+             render:Vagrantfile.j2 render:dhcpd.hosts.j2; do
+    grep -q "^    $phase " "$OUTPUT/results"
+done
+python3 -c "import json, sys; assert json.load(open(sys.argv[1]))['small-libvirt-mgmt']['peak_kb']" \
+    "$OUTPUT/baselines.json"
+
+# Phases which got slower than their baseline fail the comparison
+python3 - "$OUTPUT/baselines.json" <<'PYTHON'
+import json
+import sys
+
+with open(sys.argv[1]) as infile:
+    baselines = json.load(infile)
+case = baselines['small-libvirt-mgmt']
+case['phases'] = {phase: milliseconds / 100 for phase, milliseconds in case['phases'].items()}
+case['peak_kb'] = 1
+with open(sys.argv[1], 'w') as outfile:
+    json.dump(baselines, outfile)
+PYTHON
+set +e
+python3 ./benchmarks/run_benchmarks.py --case small-libvirt-mgmt --repeat 1 \
+    --baselines "$OUTPUT/baselines.json" --min-delta 0 > "$OUTPUT/results"
+RC=$?
+set -e
+test $RC -eq 1
+grep -q "REGRESSIONS:" "$OUTPUT/results"
+grep -q "small-libvirt-mgmt total:" "$OUTPUT/results"
+grep -q "small-libvirt-mgmt peak memory:" "$OUTPUT/results"
@@ -0,0 +1,41 @@
+#!/usr/bin/env bash
+set -e
+
+rm -rf ./tc_cache
+cp ./examples/cldemo.dot topology.dot
+sed -i '/oob-mgmt-switch/d' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -c --cache-dir ./tc_cache -vv | grep 'conversion cache miss'
+cp Vagrantfile Vagrantfile.orig
+rm -rf Vagrantfile dhcp_mac_map helper_scripts/auto_mgmt_network
+python3 ./topology_converter.py topology.dot -p libvirt -c --cache-dir ./tc_cache -vv | grep 'conversion cache hit'
+cmp Vagrantfile Vagrantfile.orig
+ls dhcp_mac_map
+ls helper_scripts/auto_mgmt_network/dhcpd.hosts
+
+# A changed topology is a cache miss
+sed -i '/^ "leaf01"/s/memory="768"/memory="789"/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -c --cache-dir ./tc_cache -vv | grep 'conversion cache miss'
+leaf01Block=`sed -n '/DEFINE VM for leaf01/,/DEFINE VM for/p' < Vagrantfile`
+echo $leaf01Block | grep 'v.memory = 789'
+
+# The simulation ID of a reproducible conversion is part of the key
+SOURCE_DATE_EPOCH=1111 python3 ./topology_converter.py topology.dot -p virtualbox -c --reproducible --cache-dir ./tc_cache -vv | grep 'conversion cache miss'
+SOURCE_DATE_EPOCH=2222 python3 ./topology_converter.py topology.dot -p virtualbox -c --reproducible --cache-dir ./tc_cache -vv | grep 'conversion cache miss'
+grep 'simid = 2222' Vagrantfile
+SOURCE_DATE_EPOCH=1111 python3 ./topology_converter.py topology.dot -p virtualbox -c --reproducible --cache-dir ./tc_cache -vv | grep 'conversion cache hit'
+grep 'simid = 1111' Vagrantfile
+
+# Without --reproducible virtualbox Vagrantfiles hold the time of the conversion and are not cached
+python3 ./topology_converter.py topology.dot -p virtualbox -c --cache-dir ./tc_cache -vv > output.log
+if grep 'conversion cache' output.log; then
+    exit 1
+fi
+
+# A conversion in another directory does not restore the paths of this one
+python3 ./topology_converter.py topology.dot -p libvirt -c --prefix lab --cache-dir "$PWD/tc_cache" \
+    -vv > output.log
+LAB=$(mktemp -d)
+cp topology.dot "$LAB/"
+(cd "$LAB" && python3 "$OLDPWD/topology_converter.py" topology.dot -p libvirt -c --prefix lab \
+    --cache-dir "$OLDPWD/tc_cache" -vv) | grep 'conversion cache miss'
+rm -rf "$LAB" ./tc_cache Vagrantfile.orig output.log
@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+set -e
+
+FIXTURES=$(mktemp -d)
+trap 'rm -rf "$FIXTURES"' EXIT
+mkdir -p $FIXTURES/proc $FIXTURES/sys/kernel/mm/ksm $FIXTURES/sys/kernel/mm/transparent_hugepage
+cat > $FIXTURES/proc/meminfo <<MEMINFO
+MemTotal:       65536000 kB
+MemFree:        40000000 kB
+MemAvailable:   60000000 kB
+HugePages_Total:       0
+HugePages_Free:        0
+Hugepagesize:       2048 kB
+MEMINFO
+for i in $(seq 0 15); do
+    printf 'processor\t: %s\nmodel name\t: Fixture CPU\n\n' $i >> $FIXTURES/proc/cpuinfo
+done
+echo 1 > $FIXTURES/sys/kernel/mm/ksm/run
+echo 1234 > $FIXTURES/sys/kernel/mm/ksm/pages_sharing
+echo 'always [madvise] never' > $FIXTURES/sys/kernel/mm/transparent_hugepage/enabled
+
+cp ./examples/cldemo.dot topology.dot
+rm -f Vagrantfile
+python3 ./topology_converter.py topology.dot -p libvirt --capacity-report \
+    --proc-root $FIXTURES/proc --sys-root $FIXTURES/sys > report.txt
+cat report.txt
+grep "64000 MB memory (58593 MB available), 16 CPUs" report.txt
+grep "KSM enabled (1234 pages shared), transparent hugepages: madvise" report.txt
+grep "16 devices, 11520 MB guest memory" report.txt
+grep "Verdict: OK" report.txt
+grep "Recommended concurrent VM boots: 8" report.txt
+# The capacity report does not generate any files
+if [ -f Vagrantfile ]; then
+    exit 1
+fi
+
+# A host that is too small is reported as overcommitted
+sed -i 's/^MemAvailable:.*/MemAvailable:    8000000 kB/' $FIXTURES/proc/meminfo
+python3 ./topology_converter.py topology.dot -p libvirt --capacity-report \
+    --proc-root $FIXTURES/proc --sys-root $FIXTURES/sys > report.txt
+grep "Verdict: OVERCOMMITTED" report.txt
+grep "Recommended concurrent VM boots: 1" report.txt
+rm -f report.txt
@@ -0,0 +1,56 @@
+#!/usr/bin/env bash
+set -e
+
+DIFF_DIR=$(mktemp -d)
+trap 'rm -rf "$DIFF_DIR"' EXIT
+
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt \
+    --snapshot "$DIFF_DIR/snapshot.json"
+grep -q '"format": 1' "$DIFF_DIR/snapshot.json"
+
+# An unchanged topology, compared with the snapshot and with the topology file
+python3 ./topology_converter.py topology.dot -p libvirt \
+    --diff "$DIFF_DIR/snapshot.json" > "$DIFF_DIR/out"
+grep -q "The topologies are identical" "$DIFF_DIR/out"
+python3 ./topology_converter.py topology.dot -p libvirt \
+    --diff ./examples/cldemo.dot > "$DIFF_DIR/out"
+grep -q "The topologies are identical" "$DIFF_DIR/out"
+
+# Memory is part of the VM definition, config and mgmt_ip are provisioned
+sed -i 's/"leaf03" \[\(.*\) memory="768"/"leaf03" [\1 memory="1024"/' topology.dot
+sed -i 's/"server04" \[\(.*\) config="[^"]*"/"server04" [\1 config=".\/helper_scripts\/other.sh"/' \
+    topology.dot
+sed -i 's/"server01" \[/"server01" [mgmt_ip="192.168.200.51" /' topology.dot
+rm -f Vagrantfile
+python3 ./topology_converter.py topology.dot -p libvirt \
+    --diff "$DIFF_DIR/snapshot.json" > "$DIFF_DIR/out"
+cat "$DIFF_DIR/out"
+if ls Vagrantfile; then
+    exit 1
+fi
+grep -q "memory: 768 -> 1024" "$DIFF_DIR/out"
+grep -q "Recreate:  1 VMs" "$DIFF_DIR/out"
+grep -q "leaf03 (changed: memory)" "$DIFF_DIR/out"
+grep -q "server04 (changed: config)" "$DIFF_DIR/out"
+grep -q "oob-mgmt-server (management network files changed)" "$DIFF_DIR/out"
+grep -q "Untouched: 12 VMs" "$DIFF_DIR/out"
+grep -qx "vagrant destroy -f leaf03" "$DIFF_DIR/out"
+grep -qx "vagrant up --provider=libvirt leaf03" "$DIFF_DIR/out"
+grep -qx "vagrant provision oob-mgmt-server server01 server04" "$DIFF_DIR/out"
+
+# Removed devices are destroyed with the current Vagrantfile, added devices are brought up
+sed -e 's/"edge01"/"edge02"/g' ./examples/cldemo.dot > topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt \
+    --diff "$DIFF_DIR/snapshot.json" > "$DIFF_DIR/out"
+grep -q "+ device edge02" "$DIFF_DIR/out"
+grep -q -- "- device edge01" "$DIFF_DIR/out"
+grep -q "+ link edge02:eth1 -- exit01:swp1" "$DIFF_DIR/out"
+grep -qx "vagrant destroy -f edge01" "$DIFF_DIR/out"
+grep -qx "vagrant up --provider=libvirt edge02" "$DIFF_DIR/out"
+
+# Not a snapshot
+echo '{}' > "$DIFF_DIR/bad.json"
+if python3 ./topology_converter.py topology.dot --diff "$DIFF_DIR/bad.json"; then
+    exit 1
+fi
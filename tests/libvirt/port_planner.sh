@@ -0,0 +1,51 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp)
+trap 'rm -f "$OUTPUT"' EXIT
+
+cp ./examples/cldemo.dot topology.dot
+
+# The port gap is grown when the topology has more links than the configured gap
+python3 ./topology_converter.py topology.dot -p libvirt -g 10
+grep "Libvirt Port Gap: 59" Vagrantfile
+grep '"#{ 8059 + offset }"' Vagrantfile
+
+# With --port-probe only the links whose ports are bound on this host are moved
+python3 -c "
+import socket, time
+udp = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+udp.bind(('127.0.0.1', 8101))
+time.sleep(5)" &
+sleep 1
+python3 ./topology_converter.py topology.dot -p libvirt --port-probe > "$OUTPUT"
+wait
+grep "Tunnel ports of 1 links are in use" "$OUTPUT"
+if grep '"#{ 8001 + offset }"' Vagrantfile; then
+    exit 1
+fi
+grep '"#{ 8002 + offset }"' Vagrantfile
+grep '"#{ 8060 + offset }"' Vagrantfile
+
+# Without --port-probe the ports of a running simulation are kept
+python3 ./topology_converter.py topology.dot -p libvirt
+grep '"#{ 8001 + offset }"' Vagrantfile
+
+# Links are spread across loopback addresses once the port space of one address is exhausted
+python3 ./topology_converter.py topology.dot -p libvirt -s 65350
+grep "tunnel_local_ip => '127.0.0.2'" Vagrantfile
+if [ $(grep -A1 "tunnel_local_ip" Vagrantfile | grep -v "^--" | paste - - | sort | uniq -d | wc -l) -ne 0 ]; then
+    exit 1
+fi
+
+# Additional lanes do not use the tunnel IP of a device
+sed -i 's/"leaf01" \[/"leaf01" [tunnel_ip="127.0.0.2" /; s/"spine01" \[/"spine01" [tunnel_ip="127.0.0.3" /' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -s 65350
+grep "tunnel_local_ip => '127.0.0.4'" Vagrantfile
+if [ $(grep -A1 "tunnel_local_ip" Vagrantfile | grep -v "^--" | paste - - | sort | uniq -d | wc -l) -ne 0 ]; then
+    exit 1
+fi
+cp ./examples/cldemo.dot topology.dot
+if python3 ./topology_converter.py topology.dot -p libvirt -s 65350 -i 10.20.30.40; then
+    exit 1
+fi
@@ -0,0 +1,28 @@
+#!/usr/bin/env bash
+set -e
+
+cp ./examples/cldemo.dot topology.dot
+rm -f Vagrantfile-*
+python3 ./topology_converter.py topology.dot -p libvirt --shard 10.0.0.1 --shard 10.0.0.2:6400:8
+if [ $(grep -c "DEFINE VM" Vagrantfile) -ne 16 ]; then
+    exit 1
+fi
+if [ $(cat Vagrantfile-10.0.0.1 Vagrantfile-10.0.0.2 | grep -c "DEFINE VM") -ne 16 ]; then
+    exit 1
+fi
+# Every device only binds tunnels on its own hypervisor
+if grep "tunnel_local_ip => '10.0.0.2'" Vagrantfile-10.0.0.1; then
+    exit 1
+fi
+if grep "tunnel_local_ip => '10.0.0.1'" Vagrantfile-10.0.0.2; then
+    exit 1
+fi
+# Cross-host links point at the other hypervisor
+grep "tunnel_ip => '10.0.0.2'" Vagrantfile-10.0.0.1
+grep "tunnel_ip => '10.0.0.1'" Vagrantfile-10.0.0.2
+
+# Hosts which are too small for the topology are reported
+if python3 ./topology_converter.py topology.dot -p libvirt --shard 10.0.0.1:2000 --shard 10.0.0.2:2000; then
+    exit 1
+fi
+rm -f Vagrantfile-*
@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+set -e
+
+# Explicit MACs inside the automatic pool are reserved before any MAC is handed out
+cp ./examples/cldemo.dot topology.dot
+sed -i 's/"edge01":"eth2" -- "exit02":"swp1"/"edge01":"eth2" -- "exit02":"swp1" [left_mac="44:38:39:00:00:01"]/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt
+if [ $(grep -c ':mac => "44:38:39:00:00:01"' Vagrantfile) -ne 1 ]; then
+    exit 1
+fi
+grep 'edge01,eth2,44:38:39:00:00:01' dhcp_mac_map
+
+# Automatic MACs come from the configured pool
+cp ./examples/2switch.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --mac-pool 02:00:00:00:10:00
+grep ':mac => "02:00:00:00:10:00"' Vagrantfile
+if grep ':mac => "44:38:39' Vagrantfile; then
+    exit 1
+fi
+if python3 ./topology_converter.py topology.dot -p libvirt --mac-pool 02:00:00:00:10:00-02:00:00:00:10:03; then
+    exit 1
+fi
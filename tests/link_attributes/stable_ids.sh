@@ -0,0 +1,48 @@
+#!/usr/bin/env bash
+set -e
+
+ID_DIR=$(mktemp -d)
+trap 'rm -rf "$ID_DIR"' EXIT
+
+# A link added near the top only changes the devices it connects
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p virtualbox --stable-ids \
+    --snapshot "$ID_DIR/before.json"
+cp dhcp_mac_map "$ID_DIR/dhcp_mac_map"
+sed -i '0,/^ "leaf01":/s//  "leaf01":"swp40" -- "leaf02":"swp40"\n&/' topology.dot
+python3 ./topology_converter.py topology.dot -p virtualbox --stable-ids \
+    --diff "$ID_DIR/before.json" > "$ID_DIR/out"
+cat "$ID_DIR/out"
+grep -q "Recreate:  2 VMs" "$ID_DIR/out"
+grep -qx "vagrant up --provider=virtualbox leaf01 leaf02" "$ID_DIR/out"
+python3 ./topology_converter.py topology.dot -p virtualbox --stable-ids
+if [ $(grep -vc "swp40" dhcp_mac_map) -ne $(cat "$ID_DIR/dhcp_mac_map" | wc -l) ]; then
+    exit 1
+fi
+grep -v "swp40" dhcp_mac_map | diff - "$ID_DIR/dhcp_mac_map"
+
+# The lockfile keeps the assignments, also the random tunnel IP
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -i random --id-lock "$ID_DIR/ids.lock"
+TUNNEL_IP=$(python3 -c "import json, sys; print(json.load(open(sys.argv[1]))['tunnel_ip'])" \
+    "$ID_DIR/ids.lock")
+grep -q ":libvirt__tunnel_ip => '$TUNNEL_IP'" Vagrantfile
+python3 -c "import json, sys; lock = json.load(open(sys.argv[1])); \
+lock['macs']['leaf01:swp51'] = lock['macs']['leaf01:swp52'] = '44:38:39:12:34:56'; \
+lock['tunnel_ip'] = '127.0.0.9'; \
+json.dump(lock, open(sys.argv[1], 'w'))" "$ID_DIR/ids.lock"
+python3 ./topology_converter.py topology.dot -p libvirt -i random --id-lock "$ID_DIR/ids.lock"
+grep -q ":libvirt__tunnel_ip => '127.0.0.9'" Vagrantfile
+# A locked MAC is only used once, the other interface gets a new one
+grep 'leaf01,swp51,44:38:39:12:34:56' dhcp_mac_map
+if grep 'leaf01,swp52,44:38:39:12:34:56' dhcp_mac_map; then
+    exit 1
+fi
+grep -q '"leaf01:swp52": "44:38:39:' "$ID_DIR/ids.lock"
+
+# Network IDs range from 1 to the port gap
+cp ./examples/2switch.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --stable-ids --port-gap 4
+if python3 ./topology_converter.py topology.dot -p libvirt --stable-ids --port-gap 3; then
+    exit 1
+fi
@@ -0,0 +1,73 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT"' EXIT
+
+# The inventory is built from slotted records which behave like dicts
+python3 - <<'PYTHON'
+import pickle
+import sys
+
+from topology_converter.api import convert
+from topology_converter.model import Device, Interface, plain
+
+DOT = 'graph vx {\n' \
+      ' "leaf01" [function="leaf" memory="1024" ssh_port="2222"]\n' \
+      ' "leaf02" [function="leaf"]\n' \
+      ' "leaf01":"swp1" -- "leaf02":"swp1" [mtu="9000"]\n' \
+      '}\n'
+
+result = convert(DOT, {'provider': 'libvirt'})
+leaf01 = result.inventory['leaf01']
+assert isinstance(leaf01, Device)
+assert not hasattr(leaf01, '__dict__')
+assert leaf01['memory'] == 1024 and leaf01['os'] == 'CumulusCommunity/cumulus-vx'
+assert leaf01['ssh_port'] == '2222' and leaf01.get('missing') is None
+assert 'ssh_port' in leaf01 and 'mgmt_ip' not in leaf01
+
+swp1 = leaf01['interfaces'][0]
+assert isinstance(swp1, Interface)
+assert swp1['local_port'] == 8001 and swp1['remote_port'] == 9001
+assert swp1['mtu'] == '9000' and swp1['remote_device'] == 'leaf02'
+assert swp1['remote_device'] is result.inventory['leaf02']['hostname']
+assert swp1['local_ip'] is result.inventory['leaf02']['interfaces'][0]['local_ip']
+assert 'v.memory = 1024' in result.files['Vagrantfile']
+assert ':libvirt__tunnel_local_port => "#{ 8001 + offset }"' in result.files['Vagrantfile']
+
+# Dict operations
+record = Interface(mac='44:38:39:00:00:01', custom='x')
+record['pxebootinterface'] = 'True'
+del record['pxebootinterface']
+assert list(record) == ['mac', 'custom'] and len(record) == 2
+assert record == {'mac': '44:38:39:00:00:01', 'custom': 'x'}
+try:
+    del record['network']
+    raise AssertionError('deleting a missing key must raise KeyError')
+except KeyError:
+    pass
+assert pickle.loads(pickle.dumps(leaf01)) == leaf01
+assert isinstance(plain(result.devices)[0], dict)
+PYTHON
+
+# Templates see the records like dicts, including passthrough attributes
+cat > "$OUTPUT/custom.j2" <<'TEMPLATE'
+{% for device in devices %}{{ device.hostname }} {{ device['memory'] }} {{ device.ssh_port }}
+{% for link in device.interfaces %}  {{ link.local_interface }} {{ link.mtu }} {{ link.mac is defined }} {{ link.network is defined }}
+{% endfor %}{% endfor %}
+TEMPLATE
+cat > "$OUTPUT/topology.dot" <<'DOT'
+graph vx {
+ "leaf01" [function="leaf" memory="1024" ssh_port="2222"]
+ "leaf02" [function="leaf"]
+ "leaf01":"swp1" -- "leaf02":"swp1" [mtu="9000"]
+}
+DOT
+python3 ./topology_converter.py "$OUTPUT/topology.dot" -p libvirt \
+    -t "$OUTPUT/custom.j2" "$OUTPUT/custom.txt" > /dev/null
+grep -q "^leaf01 1024 2222$" "$OUTPUT/custom.txt"
+grep -q "^  swp1 9000 True False$" "$OUTPUT/custom.txt"
+
+# Printing the datastructures shows plain dicts
+python3 ./topology_converter.py "$OUTPUT/topology.dot" -dd > "$OUTPUT/datastructures"
+grep -q "'memory': 1024" "$OUTPUT/datastructures"
@@ -0,0 +1,75 @@
+#!/usr/bin/env bash
+set -e
+
+STUB_DIR=$(mktemp -d)
+trap 'rm -rf "$STUB_DIR"' EXIT
+export STUB_DIR
+
+# Stub vagrant: logs every call and how many VMs boot at the same time. leaf02 fails once and
+# $FAIL_VM always fails
+cat > "$STUB_DIR/vagrant" <<'EOF'
+#!/usr/bin/env bash
+name=${@: -1}
+echo "start $name $*" >> "$STUB_DIR/calls"
+touch "$STUB_DIR/running.$name"
+ls "$STUB_DIR" | grep -c '^running\.' >> "$STUB_DIR/concurrency"
+sleep 0.2
+rm "$STUB_DIR/running.$name"
+if [ "$name" = "leaf02" ] && [ ! -e "$STUB_DIR/retried" ]; then
+    touch "$STUB_DIR/retried"
+    echo "leaf02 did not boot"
+    exit 1
+fi
+if [ "$name" = "$FAIL_VM" ]; then
+    echo "$name is broken"
+    exit 1
+fi
+echo "end $name" >> "$STUB_DIR/calls"
+EOF
+chmod +x "$STUB_DIR/vagrant"
+
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --up --vagrant-binary "$STUB_DIR/vagrant" \
+    --up-jobs 2 --up-memory 100000 --up-log "$STUB_DIR/up.json" > "$STUB_DIR/out"
+cat "$STUB_DIR/out"
+grep "start oob-mgmt-server up --provider=libvirt oob-mgmt-server" "$STUB_DIR/calls"
+grep -q "16 of 16 VMs up" "$STUB_DIR/out"
+
+# Waves: oob-server, oob-switch, exit, spine, leaf, host
+line() { grep -n "$1" "$STUB_DIR/calls" | cut -d: -f1 | $2 -n1; }
+test $(line "end oob-mgmt-server" tail) -lt $(line "start oob-mgmt-switch" head)
+test $(line "end oob-mgmt-switch" tail) -lt $(line "start exit" head)
+test $(line "end spine" tail) -lt $(line "start leaf" head)
+test $(line "end leaf" tail) -lt $(line "start server" head)
+
+# Bounded concurrency and retries
+test $(sort -n "$STUB_DIR/concurrency" | tail -n1) -le 2
+test $(grep -c "start leaf02" "$STUB_DIR/calls") -eq 2
+grep "leaf02" "$STUB_DIR/out" | grep "UP" | grep -q " 2 "
+python3 -c "import json, sys; report = json.load(open(sys.argv[1])); \
+assert report['waves'][0] == ['oob-mgmt-server'] and report['jobs'] == 2; \
+assert [len(vm['attempts']) for vm in report['vms'] if vm['hostname'] == 'leaf02'] == [2]" \
+    "$STUB_DIR/up.json"
+
+# The memory budget limits the VMs booting at the same time
+rm -f "$STUB_DIR/calls" "$STUB_DIR/concurrency"
+python3 ./topology_converter.py topology.dot -p libvirt --up --vagrant-binary "$STUB_DIR/vagrant" \
+    --up-jobs 4 --up-memory 1000 > "$STUB_DIR/out"
+test $(sort -n "$STUB_DIR/concurrency" | tail -n1) -eq 1
+
+# A VM which does not come up stops the following waves
+rm -f "$STUB_DIR/calls"
+set +e
+FAIL_VM=spine01 python3 ./topology_converter.py topology.dot -p libvirt --up \
+    --vagrant-binary "$STUB_DIR/vagrant" --up-jobs 2 --up-memory 100000 --up-retries 1 \
+    > "$STUB_DIR/out"
+RC=$?
+set -e
+cat "$STUB_DIR/out"
+test $RC -eq 1
+test $(grep -c "start spine01" "$STUB_DIR/calls") -eq 2
+if grep "start leaf" "$STUB_DIR/calls"; then
+    exit 1
+fi
+grep "leaf01" "$STUB_DIR/out" | grep -q "SKIPPED"
+grep -q "spine01 is broken" "$STUB_DIR/out"
@@ -0,0 +1,36 @@
+#!/usr/bin/env bash
+set -e
+
+MANIFEST=$(mktemp)
+trap 'rm -f "$MANIFEST" ansible.cfg helper_scripts/empty_playbook.yml' EXIT
+OUTPUTS="Vagrantfile dhcp_mac_map ansible.cfg helper_scripts/auto_mgmt_network"
+
+# Reproducible conversions of the same topology produce identical files
+cp ./examples/2switch_auto_mgmt.dot topology.dot
+python3 ./topology_converter.py topology.dot -c -a --reproducible --manifest $MANIFEST --render-workers 2
+BEFORE=$(find $OUTPUTS -type f | sort | xargs md5sum)
+grep '"Vagrantfile"' $MANIFEST
+grep '"./dhcp_mac_map"' $MANIFEST
+grep 'auto_mgmt_network/dhcpd.conf"' $MANIFEST
+
+# Unchanged outputs are not replaced, even when rendered by several workers
+find $OUTPUTS -type f | xargs touch -d '2000-01-01'
+python3 ./topology_converter.py topology.dot -c -a --reproducible --manifest $MANIFEST --render-workers 2
+if [ "$BEFORE" != "$(find $OUTPUTS -type f | sort | xargs md5sum)" ]; then
+    exit 1
+fi
+if [ -n "$(find $OUTPUTS -type f -newermt '2000-01-02')" ]; then
+    exit 1
+fi
+python3 -c "import json, sys; assert json.load(open(sys.argv[1]))['changed'] == []" $MANIFEST
+
+# SOURCE_DATE_EPOCH pins the simulation ID and only the changed file is replaced
+SOURCE_DATE_EPOCH=1234 python3 ./topology_converter.py topology.dot -c -a --reproducible \
+    --manifest $MANIFEST --render-workers 2
+grep "simid = 1234" Vagrantfile
+python3 -c "import json, sys; assert json.load(open(sys.argv[1]))['changed'] == ['Vagrantfile']" $MANIFEST
+
+# No temporary files are left behind
+if ls -A . helper_scripts/auto_mgmt_network | grep -E '^\.(Vagrantfile|dhcp_mac_map|dhcpd)'; then
+    exit 1
+fi
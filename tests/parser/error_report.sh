@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+set -e
+
+cp ./examples/cldemo.dot topology.dot
+sed -i '/^ "leaf02"/s/memory="768"/memory="abc"/' topology.dot
+sed -i 's/"leaf04":"swp52" -- "spine02":"swp4"/"leaf04":"swp52" -- "spine09":"swp4"/' topology.dot
+sed -i 's/"leaf01":"swp50" -- "leaf02":"swp50"/"leaf01":"swp49" -- "leaf02":"swp50"/' topology.dot
+if python3 ./topology_converter.py topology.dot > output.txt; then
+    exit 1
+fi
+cat output.txt
+grep '3 problems found in the topology' output.txt
+grep 'Line 3: There is something wrong with the memory definition on leaf02' output.txt
+grep 'Line 26: device spine09 is referred to' output.txt
+grep 'Line 29: Interface swp49 Already used on device: leaf01' output.txt
+rm output.txt
+
+# Compressed topology files are read transparently
+cp ./examples/cldemo.dot topology.dot
+gzip -f topology.dot
+python3 ./topology_converter.py topology.dot.gz -p libvirt
+grep 'DEFINE VM for leaf01' Vagrantfile
+rm topology.dot.gz
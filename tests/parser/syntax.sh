@@ -0,0 +1,23 @@
+#!/usr/bin/env bash
+set -e
+
+cat > topology.dot <<'DOT'
+/* block comment
+   spanning lines */
+graph "dc1" {
+ leaf1 [function="leaf", version="4.0.0"];
+ "leaf2" [function="leaf"] // trailing comment
+# preprocessor style comment
+ leaf1:swp1 -- "leaf2":"swp1"; leaf1:swp2 -- leaf2:swp2
+}
+DOT
+python3 ./topology_converter.py topology.dot -p libvirt
+grep 'DEFINE VM for leaf1' Vagrantfile
+grep 'DEFINE VM for leaf2' Vagrantfile
+grep 'link for swp1 --> leaf2:swp1' Vagrantfile
+grep 'link for swp2 --> leaf1:swp2' Vagrantfile
+
+# Compass points are not handled by the native parser and fall back to pydotplus
+sed -i 's/leaf1:swp1 -- "leaf2":"swp1";/leaf1:swp1:e -- "leaf2":"swp1"/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -v | grep 'falling back to pydotplus'
+grep 'link for swp1 --> leaf2:swp1' Vagrantfile
@@ -0,0 +1,80 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT"' EXIT
+
+cat > "$OUTPUT/topology.dot" <<'DOT'
+graph vx {
+ "leaf01" [function="leaf" os="CumulusCommunity/cumulus-vx" ports="8"]
+ "leaf02" [function="leaf" os="CumulusCommunity/cumulus-vx"]
+ "server01" [function="host" os="generic/ubuntu1804"]
+ "leaf01":"swp1" -- "leaf02":"swp1"
+ "leaf01":"swp2" -- "server01":"eth1"
+}
+DOT
+
+python3 ./topology_converter.py "$OUTPUT/topology.dot" -p libvirt -c --cache-dir "$OUTPUT/cache" \
+    --profile "$OUTPUT/profile/profile.json" --profile-prometheus "$OUTPUT/profile/tc.prom" \
+    --profile-pstats "$OUTPUT/profile/tc.pstats" > /dev/null
+
+# Phases, templates and counters are recorded in the JSON profile
+python3 - "$OUTPUT/profile/profile.json" <<'PYTHON'
+import json
+import sys
+
+with open(sys.argv[1]) as infile:
+    profile = json.load(infile)
+assert profile['wall_seconds'] > 0 and profile['cpu_seconds'] > 0 and profile['peak_bytes'] > 0
+for phase in ('parse', 'nodes', 'edges', 'mgmt_network', 'ports', 'populate',
+              'render:Vagrantfile.j2', 'render:dhcpd.hosts.j2'):
+    assert set(profile['phases'][phase]) == {'wall_seconds', 'cpu_seconds', 'peak_bytes'}, phase
+# The peak of the conversion covers every phase, not only the last one
+largest = max(phase['peak_bytes'] for phase in profile['phases'].values())
+assert profile['peak_bytes'] >= largest, (profile['peak_bytes'], largest)
+counters = profile['counters']
+assert counters['nodes'] == 3, counters
+assert counters['edges'] == 2, counters
+assert counters['generated_ports'] == 6, counters
+assert counters['auto_ips'] == 4, counters
+assert counters['auto_macs'] > 10, counters
+assert counters['warnings'] == 0, counters
+PYTHON
+
+# A phase which allocates a lot early on still counts towards the peak of the conversion
+python3 - <<'PYTHON'
+from topology_converter.phase_timer import PhaseTimer
+from topology_converter.profiling import Profiler
+
+timer = PhaseTimer()
+with Profiler(timer=timer) as profiler:
+    with timer.phase('large'):
+        data = bytearray(32 * 1024 * 1024)
+        del data
+    with timer.phase('small'):
+        data = bytearray(1024)
+largest = max(phase['peak_bytes'] for phase in timer.phases().values())
+assert largest >= 32 * 1024 * 1024, largest
+assert profiler.peak_bytes >= largest, (profiler.peak_bytes, largest)
+PYTHON
+
+# The Prometheus textfile is labelled with the topology and phase
+grep -q "^# TYPE topology_converter_phase_wall_seconds gauge$" "$OUTPUT/profile/tc.prom"
+grep -q "^topology_converter_phase_cpu_seconds{topology=\"$OUTPUT/topology.dot\",phase=\"edges\"} " \
+    "$OUTPUT/profile/tc.prom"
+grep -q "^topology_converter_generated_ports{topology=\"$OUTPUT/topology.dot\"} 6$" \
+    "$OUTPUT/profile/tc.prom"
+if grep -v "^#" "$OUTPUT/profile/tc.prom" | grep -vqE "^topology_converter_[a-z_]+\{[^}]*\} [0-9.e+-]+$"; then
+    echo "invalid Prometheus sample"
+    exit 1
+fi
+
+python3 -c "import pstats, sys; pstats.Stats(sys.argv[1])" "$OUTPUT/profile/tc.pstats"
+
+# Profiled conversions are not restored from the cache
+test ! -e "$OUTPUT/cache" || test -z "$(ls -A "$OUTPUT/cache")"
+
+# Without profiling options nothing is profiled
+rm -rf "$OUTPUT/profile"
+python3 ./topology_converter.py "$OUTPUT/topology.dot" -p libvirt > /dev/null
+test ! -e "$OUTPUT/profile"
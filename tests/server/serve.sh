@@ -0,0 +1,66 @@
+#!/usr/bin/env bash
+set -e
+
+WORKDIR=$(mktemp -d)
+SOCKET=$WORKDIR/tc.sock
+python3 ./topology_converter.py --serve $SOCKET --serve-workers 2 &
+SERVER=$!
+trap 'kill $SERVER 2>/dev/null || true; rm -rf "$WORKDIR"' EXIT
+
+for _ in $(seq 50); do
+    [ -S $SOCKET ] && break
+    sleep 0.2
+done
+
+# Conversions are answered by the warm server over the Unix socket
+python3 - $SOCKET $WORKDIR <<'PYTHON'
+import io
+import json
+import sys
+import tarfile
+
+from topology_converter.server import request
+
+socket_path, workdir = sys.argv[1:]
+with open('./examples/2switch_auto_mgmt.dot') as dot:
+    topology = dot.read()
+
+status, _, body = request(socket_path)
+assert status == 200 and json.loads(body.decode())['workers'] == 2
+
+payload = {'topology': topology, 'options': {'provider': 'libvirt', 'create_mgmt_network': True}}
+status, content_type, body = request(socket_path, 'POST', '/convert', payload)
+assert status == 200 and content_type == 'application/json'
+response = json.loads(body.decode())
+assert 'DEFINE VM for leaf1' in response['files']['Vagrantfile']
+assert 'helper_scripts/auto_mgmt_network/dhcpd.hosts' in response['files']
+assert response['summary']['devices'] == 4
+
+payload['format'] = 'tar'
+status, content_type, body = request(socket_path, 'POST', '/convert', payload)
+assert status == 200 and content_type == 'application/gzip'
+with tarfile.open(fileobj=io.BytesIO(body)) as tar:
+    vagrantfile = tar.extractfile('Vagrantfile').read().decode()
+assert vagrantfile == response['files']['Vagrantfile']
+
+# Bad topologies and options are reported without stopping the server
+status, _, body = request(socket_path, 'POST', '/convert',
+                          {'topology': 'graph dc1 {\n "leaf1":"swp1" -- "leaf2":"swp1"\n}\n'})
+assert status == 400 and json.loads(body.decode())['error']
+status, _, body = request(socket_path, 'POST', '/convert',
+                          {'topology': topology, 'options': {'template': [['x.j2', 'x']]}})
+assert status == 400 and 'template' in json.loads(body.decode())['error']
+assert request(socket_path)[0] == 200
+PYTHON
+
+# The socket is removed when the server is stopped
+kill $SERVER
+wait $SERVER || true
+if [ -e $SOCKET ]; then
+    exit 1
+fi
+
+# Only loopback addresses are accepted
+if python3 ./topology_converter.py --serve 192.0.2.1:8080; then
+    exit 1
+fi
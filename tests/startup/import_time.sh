@@ -0,0 +1,49 @@
+#!/usr/bin/env bash
+set -e
+
+# Cumulative import time budget of the command line in microseconds (best of 5 runs). Timings
+# depend on the machine, so the budget is only enforced when it is set explicitly
+BUDGET=${TC_IMPORT_BUDGET_US:-}
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT"' EXIT
+
+HEAVY=" (jinja2|pydotplus|pyparsing|http.server|concurrent.futures.process)$"
+
+# --version, argument errors and --help do not import the subsystems
+for args in "--version" "--no-such-option" "--help"; do
+    python3 -X importtime ./topology_converter.py $args > /dev/null 2> "$OUTPUT/importtime" || true
+    if grep -E "$HEAVY" "$OUTPUT/importtime"; then
+        echo "$args imported a subsystem it does not use"
+        exit 1
+    fi
+done
+python3 -m topology_converter --version | grep -q "Converter version is v"
+
+# A topology which the native parser handles does not import pydotplus
+rm -f Vagrantfile
+python3 -X importtime ./topology_converter.py ./examples/2switch.dot > /dev/null \
+    2> "$OUTPUT/importtime"
+grep -q " jinja2$" "$OUTPUT/importtime"
+if grep -E " (pydotplus|pyparsing)$" "$OUTPUT/importtime"; then
+    echo "pydotplus was imported although the native parser handles the topology"
+    exit 1
+fi
+
+# The package and the command line import within the budget
+best=""
+for _ in 1 2 3 4 5; do
+    cumulative=$(python3 -X importtime -c "import topology_converter.cli" 2>&1 | \
+                 grep -E "\| topology_converter.cli$" | cut -d'|' -f2 | tr -d ' ')
+    if [ -z "$best" ] || [ "$cumulative" -lt "$best" ]; then
+        best=$cumulative
+    fi
+done
+echo "import topology_converter.cli: ${best}us"
+if [ -n "$BUDGET" ]; then
+    echo "budget: ${BUDGET}us"
+    test "$best" -le "$BUDGET"
+fi
+
+# Submodules are still reachable as attributes of the package
+python3 -c "import topology_converter; assert topology_converter.api.VERSION"
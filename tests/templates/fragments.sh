@@ -0,0 +1,43 @@
+#!/usr/bin/env bash
+set -e
+
+FRAGMENTS=$(mktemp -d)
+trap 'rm -rf "$FRAGMENTS"' EXIT
+
+# Every VM is written to its own fragment which the Vagrantfile loads
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --fragments-dir $FRAGMENTS
+grep "Every VM is defined in its own fragment" Vagrantfile
+if grep "DEFINE VM for leaf01" Vagrantfile; then
+    exit 1
+fi
+grep "DEFINE VM for leaf01" $FRAGMENTS/leaf01.rb
+BEFORE=$(md5sum $FRAGMENTS/*.rb)
+
+# Fragments of unchanged devices are not rewritten
+touch -d '2000-01-01' $FRAGMENTS/*.rb
+python3 ./topology_converter.py topology.dot -p libvirt --fragments-dir $FRAGMENTS -vv | grep "rendered 0 of 16 VM fragments"
+if [ -n "$(find $FRAGMENTS -name '*.rb' -newermt '2000-01-02')" ]; then
+    exit 1
+fi
+
+# Changing a link only rewrites the fragments of its two devices
+sed -i 's/"leaf01":"swp45" -- "leaf01":"swp46"/"leaf01":"swp45" -- "leaf02":"swp44"/' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --fragments-dir $FRAGMENTS -vv | grep "rendered 2 of 16 VM fragments"
+if [ $(find $FRAGMENTS -name '*.rb' -newermt '2000-01-02' | wc -l) -ne 2 ]; then
+    exit 1
+fi
+
+# Fragments of removed devices are deleted
+sed -i '/server04/d' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --fragments-dir $FRAGMENTS
+if [ -e $FRAGMENTS/server04.rb ]; then
+    exit 1
+fi
+
+# The ansible groups are not part of the fragments, so removing a device with stable IDs only
+# rewrites the fragments of its peers
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --stable-ids --fragments-dir $FRAGMENTS
+sed -i '/server04/d' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt --stable-ids --fragments-dir $FRAGMENTS -vv | grep "rendered 3 of 15 VM fragments"
@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+set -e
+
+OUTPUT=$(mktemp -d)
+trap 'rm -rf "$OUTPUT" broken.j2 broken.txt' EXIT
+
+# Rendering in worker processes produces the same files as rendering serially
+cp ./examples/cldemo.dot topology.dot
+sed -i '/oob-mgmt-switch/d' topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt -c --render-workers 1
+mkdir $OUTPUT/serial
+cp Vagrantfile helper_scripts/auto_mgmt_network/* $OUTPUT/serial/
+python3 ./topology_converter.py topology.dot -p libvirt -c --render-workers 4
+mkdir $OUTPUT/parallel
+cp Vagrantfile helper_scripts/auto_mgmt_network/* $OUTPUT/parallel/
+sed -i '/built with the following args/d' $OUTPUT/serial/Vagrantfile $OUTPUT/parallel/Vagrantfile
+diff -r $OUTPUT/serial $OUTPUT/parallel
+
+# Template errors are reported as a conversion failure
+printf '{%% for device in devices %%}{{ device.hostname }\n' > broken.j2
+python3 ./topology_converter.py topology.dot -p libvirt -c --render-workers 4 -t broken.j2 broken.txt > $OUTPUT/broken.log && exit 1
+grep "Could not render broken.j2" $OUTPUT/broken.log
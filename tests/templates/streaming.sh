@@ -0,0 +1,20 @@
+#!/usr/bin/env bash
+set -e
+
+# Templates streamed to disk match the in-memory renders of write_files=False
+cp ./examples/cldemo.dot topology.dot
+python3 ./topology_converter.py topology.dot -p libvirt
+python3 - <<'PYTHON'
+from topology_converter.parse_topology import parse_topology
+from topology_converter.renderer import Renderer
+from topology_converter.tc_config import TcConfig
+
+config = TcConfig(topology_file='topology.dot', provider='libvirt', version='4.7.1',
+                  arg_string='./topology_converter.py topology.dot -p libvirt')
+renderer = Renderer(config)
+devices = renderer.populate_data_structures(parse_topology('topology.dot', config))
+rendered = renderer.render_jinja_templates(devices, write_files=False)
+with open('Vagrantfile') as vagrantfile:
+    assert rendered[config.templates[0][0]] == vagrantfile.read()
+assert renderer.render_jinja_templates(devices) == {}
+PYTHON
@@ -0,0 +1,22 @@
+#!/usr/bin/env bash
+set -e
+
+CACHE=$(mktemp -d)
+trap 'rm -rf "$CACHE" extra.j2 extra.txt' EXIT
+
+# Bundled templates can be compiled ahead of time
+python3 ./topology_converter.py --warm-template-cache --template-cache-dir $CACHE
+if [ $(ls $CACHE | wc -l) -ne 10 ]; then
+    exit 1
+fi
+
+# Extra templates are rendered next to the Vagrantfile and compiled into the same cache
+cp ./examples/2switch.dot topology.dot
+printf '{%% for device in devices %%}{{ device.hostname }}\n{%% endfor %%}' > extra.j2
+timeout 60 python3 ./topology_converter.py topology.dot -t extra.j2 extra.txt --template-cache-dir $CACHE
+grep "leaf1" extra.txt
+grep "leaf2" extra.txt
+grep "DEFINE VM for leaf1" Vagrantfile
+if [ $(ls $CACHE | wc -l) -ne 11 ]; then
+    exit 1
+fi
@@ -1,9 +1,20 @@
 """
 Exports lib modules
+
+The modules are imported on first access (ie. topology_converter.renderer) rather than when the
+package is imported, so that using one subsystem does not pay for importing all of the others.
 """
-from . import parse_topology
-from . import renderer
-from . import styles
-from . import tc_config
-from . import tc_error
-from . import warning_messages
+import importlib
+
+__all__ = ['api', 'batch', 'cache', 'capacity', 'cli', 'diff', 'dot_parser', 'ip_pool',
+           'mac_allocator', 'model', 'orchestrator', 'output', 'parse_topology', 'phase_timer',
+           'port_planner', 'profiling', 'renderer', 'server', 'sharding', 'stable_ids', 'styles',
+           'tc_config', 'tc_error', 'version', 'warning_messages']
+
+def __getattr__(name):
+    if name in __all__:
+        return importlib.import_module('.' + name, __name__)
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
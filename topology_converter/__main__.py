@@ -0,0 +1,9 @@
+"""
+Runs Topology Converter with `python3 -m topology_converter`
+"""
+
+import sys
+
+from .cli import main
+
+sys.exit(main())
@@ -0,0 +1,267 @@
+"""
+Converts topologies in-process.
+
+Every conversion works on its own TcConfig which holds all of its state (warnings, MAC map,
+function groups and the files it wrote). Conversions therefore do not affect each other and can be
+run many times, one after the other, in the same interpreter. They are not safe to run
+concurrently from several threads: relative paths (./helper_scripts, the dhcp_mac_map and
+ansible.cfg destinations and the customer name) are resolved against the working directory of
+the process and profiling uses the process-wide tracemalloc and cProfile. Run concurrent
+conversions in separate processes, as the conversion server and batch mode do.
+
+Usage:
+>>> from topology_converter.api import convert
+>>> result = convert('./topology.dot', {'provider': 'libvirt'})
+>>> result.files['Vagrantfile']
+'# Created by Topology-Converter v4.7.1...'
+>>> result = convert(dot_text, {'create_mgmt_network': True}, output_dir='/tmp/simulation')
+"""
+# pylint: disable=print-function,too-few-public-methods
+
+import collections
+import os
+
+from .output import OutputWriter, output_path
+from .tc_config import TcConfig
+from .tc_error import TcError
+from .version import VERSION
+
+# This file is generated to store the mapping between macs and interfaces
+DHCP_MAC_FILE = './dhcp_mac_map'
+
+ANSIBLE_PLAYBOOK = '''---
+- hosts: all
+  user: vagrant
+  gather_facts: no
+  tasks:
+    - command: "uname -a"
+'''
+
+ANSIBLE_CFG = '''[defaults]
+inventory = ./.vagrant/provisioners/ansible/inventory/vagrant_ansible_inventory
+hostfile= ./.vagrant/provisioners/ansible/inventory/vagrant_ansible_inventory
+host_key_checking=False
+callback_whitelist = profile_tasks
+jinja2_extensions=jinja2.ext.do'''
+
+class ConversionResult:
+    """
+    The outcome of a conversion
+
+    Attributes:
+    config (TcConfig) - Configuration and state of the conversion
+    inventory (dict) - Parsed topology
+    devices (list) - Devices passed to the templates
+    files (dict) - {destination: content} of every generated file. The content is None for files
+                   which were written to disk
+    warnings (list) - Warnings of the conversion
+    """
+    def __init__(self, config, inventory, devices):
+        self.config = config
+        self.inventory = inventory
+        self.devices = devices
+        self.files = collections.OrderedDict()
+        self.warnings = config.warnings.warnings
+
+    def summary(self):
+        """
+        Returns:
+        dict - Hostnames, device and link counts, total memory, shards and warnings of the
+               conversion
+        """
+        link_ends = sum(1 for device in self.devices for interface in device['interfaces']
+                        if interface.get('remote_device'))
+        return {'hostnames': [self.inventory[device]['hostname'] for device in self.inventory],
+                'devices': len(self.devices),
+                'links': (link_ends + 1) // 2,
+                'total_memory': self.config.total_memory,
+                'shards': self.config.shard_map,
+                'warnings': list(self.warnings)}
+
+def build_config(options=None, **kwargs):
+    """
+    Creates the TcConfig of a conversion and applies the settings which depend on other settings,
+    the same way the command line does
+
+    Arguments:
+    options [dict] - Conversion options, named like the long command line options with dashes
+                     replaced by underscores (ie. {'provider': 'libvirt', 'start_port': 9000})
+    kwargs - Further options which override `options`
+
+    Returns:
+    TcConfig
+
+    Raises TcError if the options are not valid
+    """
+    options = dict(options or {}, **kwargs)
+    options.setdefault('version', VERSION)
+    config = TcConfig(**options)
+
+    # Determine whether local or global helper_scripts will be used.
+    if 'script_storage' not in options:
+        if os.path.isdir('./helper_scripts'):
+            config.script_storage = './helper_scripts'
+        else:
+            config.script_storage = config.relpath_to_me + '/helper_scripts'
+
+    if config.create_mgmt_device or config.create_mgmt_configs_only:
+        config.vagrant = 'vagrant'
+
+    if config.create_mgmt_network:
+        config.vagrant = 'vagrant'
+        config.create_mgmt_device = True
+
+    if config.id_lock:
+        config.stable_ids = True
+
+    if config.mgmt_fanout < 1:
+        raise TcError('mgmt fanout must be at least 1.', print_on_create=False)
+
+    if config.up_jobs is not None and config.up_jobs < 1:
+        raise TcError('up jobs must be at least 1.', print_on_create=False)
+
+    if config.up_retries < 0:
+        raise TcError('up retries must not be negative.', print_on_create=False)
+
+    for templatefile, _ in config.extra_templates:
+        if not os.path.isfile(templatefile):
+            raise TcError('provided template file-- "%s" does not exist!' % templatefile,
+                          print_on_create=False)
+
+    if config.tunnel_ip:
+        import ipaddress # pylint: disable=import-outside-toplevel
+
+        if config.provider != 'libvirt':
+            raise TcError('tunnel IP was specified but provider is not libvirt.',
+                          print_on_create=False)
+        if config.tunnel_ip != 'random':
+            try:
+                ipaddress.ip_address(config.tunnel_ip)
+            except ValueError as err:
+                raise TcError(str(err) + '. Specify \'random\' to use a random localhost IPv4 '
+                              'address.', print_on_create=False)
+
+    config.output = OutputWriter(config.verbose)
+    return config
+
+def dhcp_mac_map(mac_map):
+    """ Returns the content of the DHCP MAC mapping file """
+    lines = sorted(mac_map[mac] + ',' + mac for mac in mac_map if mac)
+    return ''.join(line + '\n' for line in lines)
+
+def ansible_files(config):
+    """ Returns {destination: content} of the empty playbook and ansible.cfg """
+    return collections.OrderedDict([(config.script_storage + '/empty_playbook.yml',
+                                     ANSIBLE_PLAYBOOK),
+                                    ('./ansible.cfg', ANSIBLE_CFG)])
+
+def write_dhcp_mac_file(config):
+    """
+    Generates the DHCP MAC mapping file
+    """
+    if config.verbose > 2:
+        print('GENERATING DHCP MAC FILE...')
+    config.output.write(output_path(config, DHCP_MAC_FILE), dhcp_mac_map(config.mac_map))
+
+def write_ansible_files(config):
+    """
+    Generates an empty playbook and ansible.cfg
+    """
+    if not config.ansible_hostfile:
+        return
+
+    if config.verbose > 2:
+        print('Generating Ansible Files...')
+
+    for destination, content in ansible_files(config).items():
+        config.output.write(output_path(config, destination), content)
+
+def run_conversion(config, dot_data=None, write_files=True):
+    """
+    Converts the topology of a TcConfig created by build_config()
+
+    Arguments:
+    config (TcConfig) - TcConfig instance. It must not be reused for another conversion
+    dot_data [str] - Topology in DOT format, used instead of config.topology_file
+    write_files [bool] - If True, the files are written to config.output_dir (or the current
+                         directory), otherwise they are only returned in the result
+
+    Returns:
+    ConversionResult
+
+    Raises TcError (or RenderError) if the topology cannot be converted
+    """
+    from .profiling import profiled # pylint: disable=import-outside-toplevel
+
+    with profiled(config):
+        return _run_conversion(config, dot_data, write_files)
+
+def _run_conversion(config, dot_data, write_files):
+    """ Implements run_conversion() """
+    # The parser and the renderer (with jinja2) are only imported once a conversion really runs,
+    # which keeps cache hits and the other cheap paths of the command line fast
+    # pylint: disable=import-outside-toplevel
+    from .parse_topology import parse_topology
+    from .renderer import Renderer
+    from .stable_ids import lock_content
+
+    inventory = parse_topology(config.topology_file, config, dot_data, print_errors=False)
+    renderer = Renderer(config)
+    devices = renderer.populate_data_structures(inventory)
+    result = ConversionResult(config, inventory, devices)
+
+    if config.display_datastructures:
+        renderer.render_jinja_templates(devices)
+        return result
+
+    if write_files:
+        if config.output_dir:
+            os.makedirs(config.output_dir, exist_ok=True)
+        renderer.render_jinja_templates(devices)
+        renderer.render_shards(devices)
+        renderer.render_mgmt_bridges(devices)
+        write_dhcp_mac_file(config)
+        write_ansible_files(config)
+        if config.id_lock:
+            config.output.write(config.id_lock, lock_content(config))
+        result.files.update((destination, None) for destination in config.output.records)
+        return result
+
+    rendered = renderer.render_jinja_templates(devices, write_files=False)
+    for templatefile, destination in config.templates:
+        result.files[destination] = rendered[templatefile]
+    result.files.update(renderer.render_shards(devices, write_files=False))
+    result.files.update(renderer.render_mgmt_bridges(devices, write_files=False))
+    result.files[output_path(config, DHCP_MAC_FILE)] = dhcp_mac_map(config.mac_map)
+    if config.id_lock:
+        result.files[config.id_lock] = lock_content(config)
+    if config.ansible_hostfile:
+        for destination, content in ansible_files(config).items():
+            result.files[output_path(config, destination)] = content
+    return result
+
+def convert(topology, options=None, output_dir=None, **kwargs):
+    """
+    Converts a topology
+
+    Arguments:
+    topology (str) - Path to a DOT file or the topology itself in DOT format
+    options [dict] - Conversion options, see build_config()
+    output_dir [str] - Directory the files are written to. If not given the files are not written
+                       and only returned in the result
+    kwargs - Further options which override `options`
+
+    Returns:
+    ConversionResult
+
+    Raises TcError (or RenderError) if the topology cannot be converted
+    """
+    options = dict(options or {}, **kwargs)
+    dot_data = None
+    if '{' in topology:
+        dot_data = topology
+    else:
+        options['topology_file'] = topology
+    options['output_dir'] = output_dir
+    config = build_config(options)
+    return run_conversion(config, dot_data, write_files=output_dir is not None)
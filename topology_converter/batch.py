@@ -0,0 +1,142 @@
+"""
+Converts many topologies in one run.
+
+Topology files (or every .dot file in a directory) are converted in a pool of worker processes
+which are forked after the templates are compiled, so imports and template compilation are shared
+by all conversions. Every topology is written to its own output directory and a failing topology
+does not stop the others. The run ends with a summary table.
+"""
+# pylint: disable=print-function
+
+import collections
+import concurrent.futures
+import contextlib
+import io
+import os
+import time
+
+from .api import convert
+from .renderer import warm_template_cache
+from .styles import styles
+from .tc_config import TcConfig
+from .tc_error import TcError
+
+# Options of the command line which do not apply to the conversion of a single topology
+BATCH_ONLY_OPTIONS = ('batch', 'batch_output', 'batch_workers', 'cache_dir', 'diff', 'id_lock',
+                      'manifest', 'parser', 'profile', 'profile_prometheus', 'profile_pstats',
+                      'serve', 'serve_workers', 'snapshot', 'topology_file', 'up', 'up_jobs',
+                      'up_log', 'up_memory', 'up_retries', 'vagrant_binary',
+                      'warm_template_cache')
+
+def collect_topologies(paths):
+    """
+    Finds the topologies to convert
+
+    Arguments:
+    paths (list) - Topology files and directories. Directories are searched recursively for
+                   .dot files
+
+    Returns:
+    list - (topology_file, name) tuples where name is unique and used for the output directory
+
+    Raises TcError if a path does not exist
+    """
+    topologies = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file.endswith('.dot'):
+                        topology_file = os.path.join(root, file)
+                        topologies.append((topology_file, os.path.relpath(topology_file, path)))
+        elif os.path.isfile(path):
+            topologies.append((path, os.path.basename(path)))
+        else:
+            raise TcError('Topology file or directory %s does not exist' % path,
+                          print_on_create=False)
+
+    names = collections.Counter()
+    unique = []
+    for topology_file, name in topologies:
+        name = os.path.splitext(name)[0]
+        names[name] += 1
+        if names[name] > 1:
+            name = '%s-%s' % (name, names[name])
+        unique.append((topology_file, name))
+    return unique
+
+def convert_topology(topology_file, options, output_dir):
+    """
+    Converts one topology of the batch. Runs in the worker processes and never raises.
+
+    Returns:
+    dict - topology, output_dir, passed, error, warnings, devices, links and seconds
+    """
+    record = {'topology': topology_file, 'output_dir': output_dir, 'passed': False,
+              'error': None, 'warnings': 0, 'devices': 0, 'links': 0}
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            result = convert(topology_file, options, output_dir)
+        summary = result.summary()
+        record.update(passed=True, warnings=len(summary['warnings']), devices=summary['devices'],
+                      links=summary['links'])
+    except TcError as err:
+        record['error'] = err.message.strip()
+    except Exception as err: # pylint: disable=broad-except
+        record['error'] = '%s: %s' % (type(err).__name__, err)
+    record['seconds'] = time.perf_counter() - start
+    return record
+
+def run_batch(paths, options=None, output_root='batch_output', workers=0):
+    """
+    Converts every topology found in paths
+
+    Arguments:
+    paths (list) - Topology files and directories
+    options [dict] - Conversion options applied to every topology, see api.build_config()
+    output_root [str] - Every topology is written to output_root/<name>
+    workers [int] - Number of worker processes (0 uses one per CPU)
+
+    Returns:
+    list - Records of convert_topology() in the order of the topologies
+
+    Raises TcError if a path does not exist
+    """
+    options = {key: value for key, value in (options or {}).items()
+               if key not in BATCH_ONLY_OPTIONS}
+    topologies = collect_topologies(paths)
+
+    # Compile the templates before the workers are forked so that every worker starts warm
+    config = TcConfig()
+    warm_template_cache(config.template_storage, config.template_cache_dir)
+
+    workers = min(workers or os.cpu_count() or 1, max(1, len(topologies)))
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = [pool.submit(convert_topology, topology_file, options,
+                               os.path.join(output_root, name))
+                   for topology_file, name in topologies]
+        return [future.result() for future in futures]
+
+def print_batch_summary(records, seconds):
+    """ Prints a table of the results of run_batch() """
+    width = max([len('TOPOLOGY')] + [len(record['topology']) for record in records])
+    row = '  %-' + str(width) + 's  %-6s  %8s  %7s  %5s  %7s'
+    print(styles.BOLD + '\n############\nBATCH SUMMARY\n############' + styles.ENDC)
+    print(row % ('TOPOLOGY', 'RESULT', 'WARNINGS', 'DEVICES', 'LINKS', 'SECONDS'))
+    for record in records:
+        color = styles.GREEN if record['passed'] else styles.FAIL
+        print(color + row % (record['topology'], 'PASS' if record['passed'] else 'FAIL',
+                             record['warnings'], record['devices'], record['links'],
+                             '%.2f' % record['seconds']) + styles.ENDC)
+
+    failed = [record for record in records if not record['passed']]
+    for record in failed:
+        print(styles.FAIL + styles.BOLD + '\n  %s:' % record['topology'] + styles.ENDC)
+        for line in record['error'].splitlines():
+            print('    ' + line)
+
+    color = styles.FAIL if failed else styles.GREEN
+    print(color + styles.BOLD + '\n  %s passed, %s failed in %.2f seconds'
+          % (len(records) - len(failed), len(failed), seconds) + styles.ENDC)
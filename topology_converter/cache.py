@@ -0,0 +1,176 @@
+"""
+Provides a content-addressed cache of conversion outputs.
+
+A conversion is a pure function of the topology file, the templates, the command line options and
+the version of Topology Converter. When none of those have changed, the files produced by a
+previous conversion can be restored from the cache instead of parsing and rendering again.
+"""
+# pylint: disable=print-function
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from .dot_parser import open_topology_file
+from .tc_config import pinned_epoch_time
+
+MANIFEST = 'manifest.json'
+
+class ConversionCache:
+    """
+    A directory of previous conversion outputs keyed by a hash of their inputs. The directory may
+    live on a shared volume; entries are written atomically and the least recently used entries are
+    evicted once the total size of the cache exceeds `max_size` bytes.
+    """
+    def __init__(self, cache_dir, max_size=512 * 1024 * 1024, verbose=0):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.verbose = verbose
+
+    def key(self, config):
+        """
+        Computes the cache key for a conversion
+
+        Arguments:
+        config (TcConfig) - TcConfig instance
+
+        Returns:
+        str - Hex digest identifying the conversion inputs
+        """
+        digest = hashlib.sha256()
+
+        def update(label, data):
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            digest.update(label.encode('utf-8') + b'\0' + data + b'\0')
+
+        update('version', config.version)
+        update('arg_string', config.arg_string)
+        update('customer', config.prefix or os.path.basename(os.path.dirname(os.getcwd())))
+        # Paths rendered into the outputs and the destinations depend on where the conversion runs
+        update('cwd', os.getcwd())
+        update('output_dir', os.path.abspath(config.output_dir) if config.output_dir else '')
+        update('script_storage', config.script_storage)
+        update('relpath_to_me', config.relpath_to_me)
+        if config.reproducible:
+            # The simulation ID is rendered instead of the current time
+            update('epoch_time', pinned_epoch_time(config))
+
+        with open_topology_file(config.topology_file) as lines:
+            for line in lines:
+                digest.update(line.encode('utf-8'))
+
+        if config.id_lock and os.path.isfile(config.id_lock):
+            with open(config.id_lock, 'rb') as lock:
+                update('id_lock', lock.read())
+
+        template_files = []
+        for root, _, files in os.walk(config.template_storage):
+            for file in files:
+                if file.endswith('.j2'):
+                    template_files.append(os.path.join(root, file))
+        template_files.extend(templatefile for templatefile, _ in config.templates)
+
+        for templatefile in sorted(set(template_files)):
+            with open(templatefile, 'rb') as template:
+                update(templatefile, template.read())
+
+        return digest.hexdigest()
+
+    def entry_path(self, key):
+        """ Returns the directory holding the cache entry for a key """
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def restore(self, key, output=None):
+        """
+        Restores the outputs of a cached conversion to their original destinations
+
+        Arguments:
+        key (str) - Cache key
+        output [OutputWriter] - Writer used for the restored outputs, so that unchanged
+                                destinations are left untouched
+
+        Returns:
+        dict - The metadata stored alongside the outputs, or None on a cache miss
+        """
+        entry = self.entry_path(key)
+        try:
+            with open(os.path.join(entry, MANIFEST), 'r') as manifest_file:
+                manifest = json.load(manifest_file)
+        except (OSError, ValueError):
+            if self.verbose > 1:
+                print('  INFO: conversion cache miss (%s)' % key)
+            return None
+
+        for index, destination in enumerate(manifest['outputs']):
+            directory = os.path.dirname(destination)
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            if output is None:
+                shutil.copyfile(os.path.join(entry, str(index)), destination)
+                continue
+            with open(os.path.join(entry, str(index)), 'rb') as cached, \
+                    output.open(destination, 'wb') as outfile:
+                shutil.copyfileobj(cached, outfile)
+
+        # Mark the entry as recently used so that it survives eviction
+        os.utime(os.path.join(entry, MANIFEST), None)
+
+        if self.verbose > 1:
+            print('  INFO: conversion cache hit (%s)' % key)
+        return manifest['metadata']
+
+    def store(self, key, outputs, metadata=None):
+        """
+        Stores the outputs of a conversion
+
+        Arguments:
+        key (str) - Cache key
+        outputs (list) - Paths of the files produced by the conversion
+        metadata [dict] - JSON serializable data to return on a cache hit
+        """
+        entry = self.entry_path(key)
+        if os.path.isdir(entry):
+            return
+
+        parent = os.path.dirname(entry)
+        if not os.path.isdir(parent):
+            os.makedirs(parent, exist_ok=True)
+
+        staging = tempfile.mkdtemp(prefix='.' + key[:8], dir=parent)
+        outputs = [output for output in outputs if os.path.isfile(output)]
+        for index, output in enumerate(outputs):
+            shutil.copyfile(output, os.path.join(staging, str(index)))
+        with open(os.path.join(staging, MANIFEST), 'w') as manifest_file:
+            json.dump({'created': int(time.time()), 'outputs': outputs,
+                       'metadata': metadata or {}}, manifest_file)
+
+        try:
+            os.rename(staging, entry)
+        except OSError:
+            # Another process stored the same entry first
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self.evict()
+
+    def evict(self):
+        """ Removes the least recently used entries until the cache fits in `max_size` bytes """
+        entries = []
+        total_size = 0
+        for root, _, files in os.walk(self.cache_dir):
+            if MANIFEST not in files or os.path.basename(root).startswith('.'):
+                continue
+            size = sum(os.path.getsize(os.path.join(root, file)) for file in files)
+            entries.append((os.path.getmtime(os.path.join(root, MANIFEST)), size, root))
+            total_size += size
+
+        for _, size, root in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if self.verbose > 1:
+                print('  INFO: evicting conversion cache entry %s' % root)
+            shutil.rmtree(root, ignore_errors=True)
+            total_size -= size
@@ -0,0 +1,196 @@
+"""
+Compares the resources needed by a topology with the resources of the host running it.
+
+The host is profiled from /proc and /sys (both can be pointed elsewhere so that the profiler can be
+run against fixture files). The report contains an overcommit verdict and a recommendation for the
+number of VMs that can safely be booted at the same time.
+"""
+# pylint: disable=print-function
+
+import os
+
+from .sharding import device_demand
+from .styles import styles
+
+# Estimated hypervisor overhead in MB per VM and per NIC on top of the guest memory
+PROVIDER_OVERHEAD = {
+    'libvirt': {'vm': 64, 'nic': 1},
+    'virtualbox': {'vm': 128, 'nic': 2},
+}
+
+# Host CPUs needed per booting VM to avoid starving the VMs which are already running
+CPUS_PER_BOOT = 2
+
+# vCPU to host CPU ratio above which the CPU is considered overcommitted
+MAX_CPU_RATIO = 4
+
+# Fraction of the available memory that may be used before the host is considered tight
+TIGHT_RATIO = 0.9
+
+def read_file(path):
+    """ Returns the contents of a file or None if it cannot be read """
+    try:
+        with open(path, 'r') as proc_file:
+            return proc_file.read()
+    except OSError:
+        return None
+
+def read_meminfo(proc_root='/proc'):
+    """
+    Parses /proc/meminfo
+
+    Returns:
+    dict - {field: value} where sizes are in kB and counts are plain integers
+    """
+    meminfo = {}
+    for line in (read_file(os.path.join(proc_root, 'meminfo')) or '').splitlines():
+        key, _, value = line.partition(':')
+        fields = value.split()
+        if fields and fields[0].isdigit():
+            meminfo[key.strip()] = int(fields[0])
+    return meminfo
+
+def read_cpu_count(proc_root='/proc'):
+    """ Counts the processors listed in /proc/cpuinfo, falling back to os.cpu_count() """
+    cpuinfo = read_file(os.path.join(proc_root, 'cpuinfo'))
+    if cpuinfo:
+        count = sum(1 for line in cpuinfo.splitlines() if line.startswith('processor'))
+        if count:
+            return count
+    return os.cpu_count() or 1
+
+def read_ksm(sys_root='/sys'):
+    """
+    Reads the state of Kernel Samepage Merging
+
+    Returns:
+    dict - {'enabled': bool, 'pages_sharing': int}
+    """
+    ksm_dir = os.path.join(sys_root, 'kernel', 'mm', 'ksm')
+    run = (read_file(os.path.join(ksm_dir, 'run')) or '0').strip()
+    sharing = (read_file(os.path.join(ksm_dir, 'pages_sharing')) or '0').strip()
+    return {'enabled': run == '1', 'pages_sharing': int(sharing) if sharing.isdigit() else 0}
+
+def read_transparent_hugepages(sys_root='/sys'):
+    """ Returns the selected transparent hugepage mode (ie. 'madvise') or None """
+    enabled = read_file(os.path.join(sys_root, 'kernel', 'mm', 'transparent_hugepage',
+                                     'enabled'))
+    if enabled and '[' in enabled:
+        return enabled.split('[', 1)[1].split(']', 1)[0]
+    return None
+
+def profile_host(proc_root='/proc', sys_root='/sys'):
+    """
+    Profiles the resources of the host
+
+    Arguments:
+    proc_root [str] - Location of /proc
+    sys_root [str] - Location of /sys
+
+    Returns:
+    dict - Memory (MB), CPU, KSM and hugepage information of the host
+    """
+    meminfo = read_meminfo(proc_root)
+    hugepage_size = meminfo.get('Hugepagesize', 0)
+    return {
+        'memory_total': meminfo.get('MemTotal', 0) // 1024,
+        'memory_available': meminfo.get('MemAvailable', meminfo.get('MemFree', 0)) // 1024,
+        'cpus': read_cpu_count(proc_root),
+        'ksm': read_ksm(sys_root),
+        'hugepages_total': meminfo.get('HugePages_Total', 0) * hugepage_size // 1024,
+        'hugepages_free': meminfo.get('HugePages_Free', 0) * hugepage_size // 1024,
+        'transparent_hugepages': read_transparent_hugepages(sys_root),
+    }
+
+def vm_overhead(device, provider):
+    """ Returns the estimated hypervisor overhead in MB of the VM of a device """
+    overhead = PROVIDER_OVERHEAD.get(provider, PROVIDER_OVERHEAD['libvirt'])
+    return overhead['vm'] + overhead['nic'] * len(device['interfaces'])
+
+def topology_demand(inventory, provider):
+    """
+    Adds up the resources needed by the devices of the inventory
+
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    provider (str) - 'libvirt' or 'virtualbox'
+
+    Returns:
+    dict - Device count, guest memory, overhead (MB), vCPUs, NICs and the largest guest
+    """
+    demand = {'devices': 0, 'memory': 0, 'overhead': 0, 'cpus': 0, 'nics': 0,
+              'largest_memory': 0}
+    for device in inventory.values():
+        if device['function'] == 'fake':
+            continue
+        memory, cpus = device_demand(device)
+        nics = len(device['interfaces'])
+        demand['devices'] += 1
+        demand['memory'] += memory
+        demand['overhead'] += vm_overhead(device, provider)
+        demand['cpus'] += cpus
+        demand['nics'] += nics
+        demand['largest_memory'] = max(demand['largest_memory'], memory)
+    return demand
+
+def capacity_report(inventory, config):
+    """
+    Builds the capacity report of a topology on this host
+
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    config (TcConfig) - TcConfig instance
+
+    Returns:
+    dict - Host profile, topology demand, verdict ('ok', 'tight' or 'overcommitted'), vCPU ratio
+           and the recommended number of concurrent VM boots
+    """
+    host = profile_host(config.proc_root, config.sys_root)
+    demand = topology_demand(inventory, config.provider)
+    required = demand['memory'] + demand['overhead']
+    cpu_ratio = float(demand['cpus']) / host['cpus']
+
+    if required > host['memory_available']:
+        verdict = 'overcommitted'
+    elif required > host['memory_available'] * TIGHT_RATIO or cpu_ratio > MAX_CPU_RATIO:
+        verdict = 'tight'
+    else:
+        verdict = 'ok'
+
+    concurrency = max(1, host['cpus'] // CPUS_PER_BOOT)
+    if verdict == 'tight':
+        concurrency = max(1, concurrency // 2)
+    elif verdict == 'overcommitted':
+        concurrency = 1
+    concurrency = min(concurrency, max(1, demand['devices']))
+
+    return {'host': host, 'demand': demand, 'required_memory': required,
+            'cpu_ratio': round(cpu_ratio, 2), 'verdict': verdict,
+            'recommended_concurrency': concurrency}
+
+def print_capacity_report(report):
+    """ Prints a report built by capacity_report() """
+    host = report['host']
+    demand = report['demand']
+    print(styles.BOLD + '\n############\nCAPACITY REPORT\n############' + styles.ENDC)
+    print('  Host:     %s MB memory (%s MB available), %s CPUs'
+          % (host['memory_total'], host['memory_available'], host['cpus']))
+    print('            KSM %s (%s pages shared), transparent hugepages: %s, '
+          'hugepages: %s MB (%s MB free)'
+          % ('enabled' if host['ksm']['enabled'] else 'disabled', host['ksm']['pages_sharing'],
+             host['transparent_hugepages'] or 'unknown', host['hugepages_total'],
+             host['hugepages_free']))
+    print('  Topology: %s devices, %s MB guest memory + %s MB overhead, %s vCPUs, %s NICs'
+          % (demand['devices'], demand['memory'], demand['overhead'], demand['cpus'],
+             demand['nics']))
+    print('  vCPU to CPU ratio: %s' % report['cpu_ratio'])
+
+    color = {'ok': styles.GREEN, 'tight': styles.WARNING}.get(report['verdict'], styles.FAIL)
+    print(color + styles.BOLD + '  Verdict: %s (%s MB required, %s MB available)'
+          % (report['verdict'].upper(), report['required_memory'], host['memory_available']) +
+          styles.ENDC)
+    if report['verdict'] == 'overcommitted' and host['ksm']['enabled']:
+        print('  KSM is enabled and may recover some memory from identical guests.')
+    if host['hugepages_total'] and host['hugepages_free'] < report['required_memory']:
+        print('  There are not enough free hugepages to back every guest with hugepages.')
+    print('  Recommended concurrent VM boots: %s' % report['recommended_concurrency'])
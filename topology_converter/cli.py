@@ -0,0 +1,427 @@
+"""
+Command line interface of Topology Converter
+"""
+# pylint: disable=print-function
+
+import argparse
+import sys
+import time
+
+from .api import build_config, run_conversion, write_ansible_files
+from .styles import styles
+from .tc_error import RenderError, TcError
+from .version import VERSION
+
+def build_parser():
+    """
+    Builds the command line parser
+
+    Returns:
+    argparse.ArgumentParser
+    """
+    parser = argparse.ArgumentParser(description='Topology Converter -- Convert \
+                                     topology.dot files into Vagrantfiles')
+    parser.add_argument('topology_file', nargs='?',
+                        help='provide a topology file as input')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='increases logging verbosity (repeat for more verbosity (3 max))')
+    parser.add_argument('-p', '--provider', choices=['libvirt', 'virtualbox'],
+                        help='specifies the provider to be used in the Vagrantfile, \
+                        script supports "virtualbox" or "libvirt", default is virtualbox.')
+    parser.add_argument('-a', '--ansible-hostfile', action='store_true',
+                        help='When specified, ansible hostfile will be generated \
+                        from a dummy playbook run.')
+    parser.add_argument('-c', '--create-mgmt-network', action='store_true',
+                        help='When specified, a mgmt switch and server will be created. \
+                        A /24 is assumed for the mgmt network. mgmt_ip=X.X.X.X will be \
+                        read from each device to create a Static DHCP mapping for \
+                        the oob-mgmt-server.')
+    parser.add_argument('-cco', '--create-mgmt-configs-only', action='store_true',
+                        help='Calling this option does NOT regenerate the Vagrantfile \
+                        but it DOES regenerate the configuration files that come \
+                        packaged with the mgmt-server in the "-c" option. This option \
+                        is typically used after the "-c" has been called to generate \
+                        a Vagrantfile with an oob-mgmt-server and oob-mgmt-switch to \
+                        modify the configuraiton files placed on the oob-mgmt-server \
+                        device. Useful when you do not want to regenerate the \
+                        vagrantfile but you do want to make changes to the \
+                        OOB-mgmt-server configuration templates.')
+    parser.add_argument('-cmd', '--create-mgmt-device', action='store_true',
+                        help='Calling this option creates the mgmt device and runs the \
+                        auto_mgmt_network template engine to load configurations on to \
+                        the mgmt device but it does not create the OOB-MGMT-SWITCH or \
+                        associated connections. Useful when you are manually specifying \
+                        the construction of the management network but still want to have \
+                        the OOB-mgmt-server created automatically.')
+    parser.add_argument('-t', '--template', action='append', nargs=2,
+                        help='Specify an additional jinja2 template and a destination \
+                        for that file to be rendered to.')
+    parser.add_argument('-i', '--tunnel-ip',
+                        help='FOR LIBVIRT PROVIDER: this option overrides the tunnel_ip \
+                        setting for all nodes. This option provides another method of \
+                        udp port control in that all ports are bound to the specified \
+                        ip address. Specify "random" to use a random localhost IP.')
+    parser.add_argument('-s', '--start-port', type=int,
+                        help='FOR LIBVIRT PROVIDER: this option overrides \
+                        the default starting-port 8000 with a new value. \
+                        Use ports over 1024 to avoid permissions issues. If using \
+                        this option with the virtualbox provider it will be ignored.')
+    parser.add_argument('-g', '--port-gap', type=int,
+                        help='FOR LIBVIRT PROVIDER: this option overrides the \
+                        default port-gap of 1000 with a new value. This number \
+                        is added to the start-port value to determine the port \
+                        to be used by the remote-side. Port-gap also defines the \
+                        max number of links that can exist in the topology. EX. \
+                        If start-port is 8000 and port-gap is 1000 the first link \
+                        will use ports 8001 and 9001 for the construction of the \
+                        UDP tunnel. The port-gap is grown automatically when the \
+                        topology has more links. If using this option with the \
+                        virtualbox provider it will be ignored.')
+    parser.add_argument('--stable-ids', action='store_true',
+                        help='Derive the MAC address, network and tunnel ports of every \
+                        automatically addressed interface from the names of its link endpoints \
+                        (and --tunnel-ip random from the libvirt prefix or directory), so that \
+                        editing the topology does not change the addresses of other links.')
+    parser.add_argument('--id-lock', metavar='FILE',
+                        help='Keep the MAC addresses, networks and tunnel IP assigned with \
+                        --stable-ids in this JSON file and reuse them on the next conversion. \
+                        Implies --stable-ids.')
+    parser.add_argument('--port-probe', dest='probe_ports', action='store_true',
+                        help='FOR LIBVIRT PROVIDER: skip the UDP ports that are currently \
+                        bound on this host when planning tunnel ports. Links whose ports are in \
+                        use are moved to free ports, so do not use this option while the \
+                        simulation of the topology is running.')
+    # Probing used to be the default
+    parser.add_argument('--no-port-probe', dest='probe_ports', action='store_false',
+                        help=argparse.SUPPRESS)
+    parser.add_argument('-dd', '--display-datastructures', action='store_true',
+                        help='When specified, the datastructures which are passed \
+                        to the template are displayed to screen. Note: Using \
+                        this option does not write a Vagrantfile and \
+                        supercedes other options.')
+    parser.add_argument('--synced-folder', action='store_true',
+                        help='Using this option enables the default Vagrant \
+                        synced folder which we disable by default. \
+                        See: https://www.vagrantup.com/docs/synced-folders/basic_usage.html')
+    parser.add_argument('--version', action='version', version='Topology \
+                        Converter version is v%s' % VERSION,
+                        help='Using this option displays the version of Topology Converter')
+    parser.add_argument('--prefix', help='Specify a prefix to be used for machines in libvirt. \
+                        By default the name of the current folder is used.')
+    parser.add_argument('--mac-pool', help='Specify the pool of MAC addresses that are \
+                        automatically assigned to interfaces without a left_mac/right_mac \
+                        attribute as START[-END], for example \
+                        44:38:39:00:00:01-44:38:39:ff:ff:ff (the default).')
+    parser.add_argument('--mgmt-dhcp-range', help='Specify the DHCP range of the automatically \
+                        created management network as START-STOP. START and STOP are either \
+                        offsets into the management subnet or addresses in it (default 10-50).')
+    parser.add_argument('--mgmt-fanout', type=int, help='Specify the number of devices that are \
+                        connected to one switch of the automatically created management network \
+                        (default 126). Larger topologies get a two-tier management network of \
+                        oob leaf switches uplinked to the oob-mgmt-switch.')
+    parser.add_argument('--shard', action='append', metavar='HOST_IP[:MEMORY[:CPUS]]',
+                        help='FOR LIBVIRT PROVIDER: split the topology across several \
+                        hypervisors. Specify once per hypervisor with its IP address and \
+                        optionally its memory (MB) and CPU budget. Devices are placed to \
+                        minimize the number of links between hypervisors and a \
+                        Vagrantfile-HOST_IP is written for every hypervisor.')
+    parser.add_argument('--capacity-report', action='store_true',
+                        help='Compare the memory, CPUs and NICs needed by the topology with the \
+                        resources of this host and recommend how many VMs to boot at the same \
+                        time. No files are generated.')
+    parser.add_argument('--proc-root', help='Read host information from this directory instead \
+                        of /proc.')
+    parser.add_argument('--sys-root', help='Read host information from this directory instead \
+                        of /sys.')
+    parser.add_argument('--template-cache-dir', help='Keep compiled templates in this directory \
+                        (default ~/.cache/topology_converter/jinja2). Templates are only compiled \
+                        again when they change.')
+    parser.add_argument('--fragments-dir', help='Write the definition of every VM to its own \
+                        file in this directory and generate a Vagrantfile which loads them. A VM \
+                        file is only rewritten when the VM changes.')
+    parser.add_argument('--render-workers', type=int,
+                        help='Render the templates in this many worker processes (default 1). \
+                        Use 0 to use one worker per CPU.')
+    parser.add_argument('--warm-template-cache', action='store_true',
+                        help='Compile all bundled templates into the template cache and exit. \
+                        Useful at install time.')
+    parser.add_argument('--manifest', help='Write a JSON manifest of every generated file, its \
+                        sha256 and whether it changed to this file. Generated files are only \
+                        replaced when their content changes.')
+    parser.add_argument('--reproducible', action='store_true',
+                        help='Pin values which otherwise change on every run (ie. the simulation \
+                        ID derived from the current time) so that converting the same topology \
+                        again produces identical files. SOURCE_DATE_EPOCH is used as simulation \
+                        ID if set.')
+    parser.add_argument('--serve', metavar='ADDRESS',
+                        help='Run a conversion server on a Unix socket (a path) or a loopback \
+                        HOST:PORT instead of converting a topology file. The server keeps \
+                        everything imported and the templates compiled and converts the \
+                        topologies posted to /convert in a pool of worker processes.')
+    parser.add_argument('--serve-workers', type=int, default=0,
+                        help='Number of worker processes of the conversion server (default is \
+                        one per CPU).')
+    parser.add_argument('--batch', nargs='+', metavar='PATH',
+                        help='Convert many topologies instead of a single topology file. PATH \
+                        is a topology file or a directory which is searched for .dot files. \
+                        Every topology is written to its own directory below --batch-output \
+                        and a summary of all conversions is printed.')
+    parser.add_argument('--batch-output', default='batch_output',
+                        help='Directory for the outputs of --batch (default ./batch_output).')
+    parser.add_argument('--batch-workers', type=int, default=0,
+                        help='Number of worker processes used by --batch (default is one per \
+                        CPU).')
+    parser.add_argument('--cache-dir', help='Cache conversion outputs in this directory. When the \
+                        topology file, templates, options and version are unchanged the outputs \
+                        are restored from the cache instead of being regenerated.')
+    parser.add_argument('--cache-max-size', type=int,
+                        help='Maximum size of the conversion cache in MB (default 512). The least \
+                        recently used entries are evicted once it is exceeded.')
+    parser.add_argument('--profile', metavar='FILE',
+                        help='Write a JSON profile of the conversion to this file: wall clock \
+                        time, CPU time and peak memory of the conversion, of every phase and of \
+                        every template, and counters of the nodes, edges, generated ports, \
+                        assigned MAC and IP addresses and warnings. The conversion cache is not \
+                        used while profiling.')
+    parser.add_argument('--profile-prometheus', metavar='FILE',
+                        help='Write the profile as a Prometheus textfile (ie. for the textfile \
+                        collector of the node exporter).')
+    parser.add_argument('--profile-pstats', metavar='FILE',
+                        help='Run the conversion under cProfile and write the statistics in \
+                        pstats format to this file.')
+    parser.add_argument('--up', action='store_true',
+                        help='After the conversion bring the VMs up in boot waves: the \
+                        oob-mgmt-server, then the oob switches and then the other devices in \
+                        the order of the Vagrantfile (exit, superspine, spine, leaf, tor, host). \
+                        Every VM is started with its own "vagrant up", several at the same time \
+                        within the memory budget. The conversion cache is not used.')
+    parser.add_argument('--up-memory', type=int, metavar='MB',
+                        help='Memory budget in MB of the VMs booting at the same time with --up \
+                        (default is the available memory of this host).')
+    parser.add_argument('--up-jobs', type=int,
+                        help='Maximum number of VMs booting at the same time with --up (default \
+                        is one per two CPUs).')
+    parser.add_argument('--up-retries', type=int,
+                        help='Number of times a VM which fails to come up is retried with --up \
+                        (default 2).')
+    parser.add_argument('--up-log', metavar='FILE',
+                        help='Write the waves and the timing of every "vagrant up" attempt of \
+                        --up to this JSON file.')
+    parser.add_argument('--vagrant-binary', metavar='COMMAND',
+                        help='Vagrant command used by --up (default vagrant).')
+    parser.add_argument('--snapshot', metavar='FILE',
+                        help='Write the parsed topology with the assigned MAC addresses, networks \
+                        and tunnel ports to this JSON file, to compare later versions of the \
+                        topology with --diff. The conversion cache is not used.')
+    parser.add_argument('--diff', metavar='OLD',
+                        help='Compare the topology file with an older version of it (a topology \
+                        file or a --snapshot), list the devices and links which were added, \
+                        removed or changed and print the vagrant commands which recreate or \
+                        provision only the affected VMs. No files are generated.')
+    return parser
+
+
+def write_manifest(config):
+    """
+    Writes the manifest of the generated files if requested
+    """
+    if config.manifest:
+        config.output.write_manifest(config.manifest)
+    if config.verbose > 0:
+        print('  INFO: %s of %s generated files changed' % (len(config.output.changed()),
+                                                            len(config.output.records)))
+
+
+def print_summary(config, summary):
+    """
+    Prints the result of a successful conversion
+
+    Arguments:
+    config (TcConfig) - TcConfig instance
+    summary (dict) - Hostnames, device count and total memory of the conversion
+    """
+    if config.create_mgmt_configs_only:
+        print(styles.GREEN + styles.BOLD + '\n############\nSUCCESS: MGMT Network Templates have \
+              been regenerated!\n############' + styles.ENDC)
+    else:
+        print(styles.GREEN + styles.BOLD +
+              '\n############\nSUCCESS: Vagrantfile has been generated!\n############' +
+              styles.ENDC)
+        print(styles.GREEN + styles.BOLD +
+              '\n            %s devices under simulation.' % (summary['devices']) +
+              styles.ENDC)
+
+        for hostname in summary['hostnames']:
+            print(styles.GREEN + styles.BOLD +
+                  '                %s' % (hostname) +
+                  styles.ENDC)
+        print(styles.GREEN + styles.BOLD +
+              '\n            Requiring at least %s MBs of memory.' % (summary['total_memory']) +
+              styles.ENDC)
+
+        for host_ip, hostnames in summary.get('shards', {}).items():
+            print(styles.GREEN + styles.BOLD +
+                  '\n            Vagrantfile-%s: %s devices.' % (host_ip, len(hostnames)) +
+                  styles.ENDC)
+
+
+def main(argv=None):
+    """
+    Runs Topology Converter
+
+    Arguments:
+    argv [list] - Command line arguments (default is sys.argv[1:])
+
+    Returns:
+    int - Exit code
+    """
+    # The subsystems are imported when they are used so that --version, --help, argument errors
+    # and cache hits do not pay for importing the parser, jinja2 or the server
+    # pylint: disable=import-outside-toplevel
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not (args.topology_file or args.warm_template_cache or args.serve or args.batch):
+        parser.error('the following arguments are required: topology_file')
+
+    options = dict(args.__dict__, parser=parser)
+    if argv is not None:
+        options['arg_string'] = ' '.join([sys.argv[0]] + list(argv))
+    try:
+        config = build_config(options)
+    except TcError as err:
+        err.print_error()
+        return 1
+
+    if config.verbose > 2:
+        print('Arguments:')
+        print(args)
+        print('relpath_to_me: {}'.format(config.relpath_to_me))
+
+    print(styles.HEADER + '\n######################################')
+    print(styles.HEADER + '          Topology Converter')
+    print(styles.HEADER + '######################################')
+    print(styles.BLUE + '           originally written by Eric Pulvino')
+
+    if args.warm_template_cache:
+        from .renderer import warm_template_cache
+
+        names = warm_template_cache(config.template_storage, config.template_cache_dir)
+        print(styles.GREEN + styles.BOLD + '\n    Compiled %s templates.' % len(names) +
+              styles.ENDC)
+        print('\nDONE!\n')
+        return 0
+
+    if args.serve:
+        from .server import serve
+
+        try:
+            serve(args.serve, args.serve_workers, config.verbose)
+        except (OSError, TcError) as err:
+            print(styles.FAIL + styles.BOLD + ' ### ERROR: %s' % err + styles.ENDC)
+            return 1
+        print('\nDONE!\n')
+        return 0
+
+    if args.batch:
+        from .batch import print_batch_summary, run_batch
+
+        start = time.perf_counter()
+        try:
+            records = run_batch(args.batch, options, args.batch_output, args.batch_workers)
+        except TcError as err:
+            err.print_error()
+            return 1
+        print_batch_summary(records, time.perf_counter() - start)
+        print('\nDONE!\n')
+        return 0 if all(record['passed'] for record in records) else 1
+
+    cache = None
+    profiling = config.profile or config.profile_prometheus or config.profile_pstats
+    # Virtualbox Vagrantfiles (and custom templates) may render the time of the conversion as simid
+    time_based = not config.reproducible and (config.provider != 'libvirt' or
+                                              config.extra_templates)
+    if config.cache_dir and not (config.display_datastructures or config.capacity_report or
+                                 profiling or config.up or config.snapshot or config.diff or
+                                 config.probe_ports or time_based):
+        from .cache import ConversionCache
+
+        cache = ConversionCache(config.cache_dir, config.cache_max_size * 1024 * 1024,
+                                config.verbose)
+        cache_key = cache.key(config)
+        summary = cache.restore(cache_key, config.output)
+        if summary is not None:
+            write_ansible_files(config)
+            write_manifest(config)
+            print_summary(config, summary)
+            for warning in summary['warnings']:
+                print(warning)
+            print('\nDONE!\n')
+            return 0
+
+    if config.capacity_report:
+        from .capacity import capacity_report, print_capacity_report
+        from .parse_topology import parse_topology
+
+        try:
+            inventory = parse_topology(config.topology_file, config)
+        except TcError:
+            return 1
+        print_capacity_report(capacity_report(inventory, config))
+        config.warnings.print_warnings()
+        print('\nDONE!\n')
+        return 0
+
+    if config.diff:
+        from .diff import diff_inventories, load_inventory, print_diff
+
+        try:
+            report = diff_inventories(load_inventory(config.diff, options),
+                                      load_inventory(config.topology_file, options))
+        except TcError as err:
+            err.print_error()
+            return 1
+        print_diff(report, config.provider)
+        print('\nDONE!\n')
+        return 0
+
+    try:
+        result = run_conversion(config)
+    except RenderError as err:
+        print(styles.FAIL + styles.BOLD + str(err.message) + styles.ENDC)
+        return 1
+    except TcError as err:
+        err.print_error()
+        return 1
+    if config.display_datastructures:
+        return 0
+
+    write_manifest(config)
+    if config.snapshot:
+        from .diff import write_snapshot
+
+        write_snapshot(result.inventory, config)
+
+    summary = result.summary()
+    print_summary(config, summary)
+    if config.verbose > 1:
+        print('\n  INFO: time spent per phase:')
+        config.timings.print_timings()
+
+    if cache:
+        cache.store(cache_key, list(config.output.records), summary)
+
+    config.warnings.print_warnings()
+
+    if config.up:
+        from .orchestrator import bring_up, print_up_summary, write_up_log
+
+        print(styles.BOLD + '\n############\nBRINGING UP THE VMS\n############' + styles.ENDC)
+        report = bring_up(result.devices, config)
+        if config.up_log:
+            write_up_log(report, config.up_log)
+        print_up_summary(report)
+        print('\nDONE!\n')
+        return 0 if all(record['passed'] for record in report['vms']) else 1
+
+    print('\nDONE!\n')
+    return 0
@@ -0,0 +1,278 @@
+"""
+Compares two versions of a topology and determines which VMs have to be rebuilt.
+
+Topologies are compared as parsed inventories, ie. with the MAC addresses, networks and tunnel
+ports which were assigned automatically, because those end up in the Vagrantfile. The old version
+is either a topology file or an inventory snapshot written by a conversion with --snapshot.
+
+Every VM falls into one of three groups:
+* recreate - the VM is new or its definition changed (box, memory, CPUs, interfaces, ...)
+* provision - only settings applied by the provisioners changed (config, playbook, mgmt_ip, ...)
+* untouched - nothing changed, or only the names of the peers of its links
+"""
+# pylint: disable=print-function
+
+import json
+
+from .model import json_default, plain
+from .output import AtomicFile
+from .renderer import get_key_devices
+from .styles import styles
+from .tc_error import TcError
+from .version import VERSION
+
+SNAPSHOT_FORMAT = 1
+
+# Device attributes which are part of the definition of the VM. Changes of any other attribute
+# only require the VM to be provisioned again
+RECREATE_ATTRIBUTES = frozenset(('cpu', 'function', 'legacy', 'memory', 'os', 'pxehost',
+                                 'ssh_port', 'tunnel_ip', 'version'))
+
+# Interface attributes which only name the other end of a link. The NIC of an interface whose MAC,
+# network and tunnel are unchanged stays the same when only they change (ie. the peer was renamed)
+LABEL_ATTRIBUTES = frozenset(('remote_device', 'remote_interface'))
+
+# Device attributes which are rendered into the files of the oob-mgmt-server
+MGMT_ATTRIBUTES = frozenset(('function', 'mgmt_ip', 'ssh_user'))
+
+def snapshot(inventory):
+    """
+    Converts an inventory to the plain form which is compared and stored in snapshots
+
+    Arguments:
+    inventory (dict) - Parsed inventory. Interfaces may be a dict (as returned by parse_topology())
+                       or a list (after Renderer.populate_data_structures())
+
+    Returns:
+    dict - {device: {attribute: value, 'interfaces': {interface: {attribute: value}}}} without
+           fake devices
+    """
+    devices = {}
+    for name, device in inventory.items():
+        if device.get('function') == 'fake':
+            continue
+        attributes = {key: plain(value) for key, value in device.items()
+                      if key not in ('hostname', 'interfaces')}
+        interfaces = device['interfaces']
+        if isinstance(interfaces, list):
+            interfaces = {interface['local_interface']: interface for interface in interfaces}
+        attributes['interfaces'] = {interface: {key: value for key, value in attrs.items()
+                                                if key != 'local_interface'}
+                                    for interface, attrs in interfaces.items()}
+        devices[name] = attributes
+    # Values go through JSON so that a fresh inventory compares equal to a loaded snapshot
+    return json.loads(json.dumps(devices, default=json_default))
+
+def write_snapshot(inventory, config):
+    """
+    Writes the inventory snapshot of a conversion to config.snapshot
+
+    Arguments:
+    inventory (dict) - Parsed inventory
+    config (TcConfig) - TcConfig instance of the conversion
+    """
+    with AtomicFile(config.snapshot) as outfile:
+        json.dump({'format': SNAPSHOT_FORMAT, 'version': VERSION,
+                   'topology_file': config.topology_file, 'provider': config.provider,
+                   'inventory': snapshot(inventory)}, outfile, indent=2, sort_keys=True)
+        outfile.write('\n')
+
+def load_inventory(path, options):
+    """
+    Loads a version of a topology
+
+    Arguments:
+    path (str) - Topology file or snapshot (.json) written with --snapshot
+    options (dict) - Conversion options used to parse a topology file, see api.build_config()
+
+    Returns:
+    dict - Inventory as returned by snapshot()
+
+    Raises TcError if the topology or snapshot cannot be read
+    """
+    # pylint: disable=import-outside-toplevel
+    from .api import build_config
+    from .parse_topology import parse_topology
+
+    if path.endswith('.json'):
+        try:
+            with open(path, 'r') as snapshot_file:
+                data = json.load(snapshot_file)
+        except (OSError, ValueError) as err:
+            raise TcError('Cannot read the snapshot %s: %s' % (path, err), print_on_create=False)
+        if not isinstance(data, dict) or data.get('format') != SNAPSHOT_FORMAT:
+            raise TcError('%s is not a topology snapshot' % path, print_on_create=False)
+        return data['inventory']
+
+    config = build_config(dict(options, topology_file=path))
+    return snapshot(parse_topology(path, config, print_errors=False))
+
+def compare(old, new, prefix=''):
+    """
+    Compares two attribute dicts
+
+    Returns:
+    list - (attribute, old value, new value) of every attribute which differs. Nested dicts are
+           compared attribute by attribute and reported as parent.attribute. Missing attributes
+           are None
+    """
+    changes = []
+    for key in sorted(set(old) | set(new)):
+        old_value, new_value = old.get(key), new.get(key)
+        if old_value == new_value:
+            continue
+        if isinstance(old_value, dict) and isinstance(new_value, dict):
+            changes += compare(old_value, new_value, prefix + key + '.')
+        else:
+            changes.append((prefix + key, old_value, new_value))
+    return changes
+
+def links(inventory):
+    """
+    Returns:
+    dict - {link: {endpoint: interface attributes}} of every link of the inventory. A link is
+           identified by the sorted tuple of its 'device:interface' endpoints
+    """
+    found = {}
+    for name, device in inventory.items():
+        for interface, attributes in device['interfaces'].items():
+            endpoint = '%s:%s' % (name, interface)
+            remote = '%s:%s' % (attributes.get('remote_device'), attributes.get('remote_interface'))
+            link = tuple(sorted((endpoint, remote)))
+            found.setdefault(link, {})[endpoint] = attributes
+    return found
+
+def boot_order(names, inventory):
+    """ Sorts hostnames in the order their VMs are defined in the Vagrantfile """
+    position = {name: index for index, name in enumerate(inventory)}
+    return sorted(names, key=lambda name: (get_key_devices(inventory[name]),
+                                           position.get(name, 0)))
+
+def diff_inventories(old, new):
+    """
+    Compares two versions of a topology
+
+    Arguments:
+    old (dict) - Old inventory, as returned by snapshot() or load_inventory()
+    new (dict) - New inventory
+
+    Returns:
+    dict - added, removed and changed ({device: changes}) devices and links, where changes are
+           (attribute, old value, new value), the VMs to recreate, provision and leave untouched
+           ({device: reason}) and the names of the VMs to destroy before the new topology is
+           converted and to bring up afterwards
+    """
+    old_links, new_links = links(old), links(new)
+    report = {
+        'devices': {'added': [name for name in new if name not in old],
+                    'removed': [name for name in old if name not in new],
+                    'changed': {}},
+        'links': {'added': [' -- '.join(link) for link in new_links if link not in old_links],
+                  'removed': [' -- '.join(link) for link in old_links if link not in new_links],
+                  'changed': {}},
+        'recreate': {}, 'provision': {}, 'untouched': []}
+
+    for link in new_links:
+        if link in old_links:
+            changes = compare(old_links[link], new_links[link])
+            if changes:
+                report['links']['changed'][' -- '.join(link)] = changes
+
+    mgmt_changed = bool(report['devices']['added'] or report['devices']['removed'])
+    for name in report['devices']['added']:
+        report['recreate'][name] = 'added'
+
+    for name in new:
+        if name not in old:
+            continue
+        changes = compare(old[name], new[name])
+        if not changes:
+            continue
+        report['devices']['changed'][name] = changes
+        attributes = [attribute.split('.')[0] for attribute, _, _ in changes
+                      if attribute.split('.')[-1] not in LABEL_ATTRIBUTES or
+                      attribute.count('.') != 2]
+        recreate = sorted(set(attribute for attribute in attributes
+                              if attribute in RECREATE_ATTRIBUTES or attribute == 'interfaces'))
+        if recreate:
+            report['recreate'][name] = 'changed: ' + ', '.join(recreate)
+        elif attributes:
+            report['provision'][name] = 'changed: ' + ', '.join(sorted(set(attributes)))
+        if MGMT_ATTRIBUTES.intersection(attributes) or \
+                any(attribute.startswith('interfaces.eth0.mac') for attribute, _, _ in changes):
+            mgmt_changed = True
+
+    # The oob-mgmt-server holds DHCP, hosts and Ansible files describing every device
+    if mgmt_changed:
+        for name in new:
+            if new[name].get('function') == 'oob-server' and name in old and \
+                    name not in report['recreate'] and name not in report['provision']:
+                report['provision'][name] = 'management network files changed'
+
+    report['untouched'] = [name for name in new if name in old and
+                           name not in report['recreate'] and name not in report['provision']]
+    report['destroy'] = [name for name in report['devices']['removed']] + \
+        boot_order([name for name in report['recreate'] if name in old], old)
+    report['up'] = boot_order(list(report['recreate']), new)
+    report['provision'] = {name: report['provision'][name]
+                           for name in boot_order(list(report['provision']), new)}
+    return report
+
+def diff_commands(report, provider):
+    """
+    Returns:
+    list - Shell commands which apply a diff report, with comment lines saying when to run them
+    """
+    commands = []
+    if report['destroy']:
+        commands.append('# Before converting the new topology (the VMs are defined by the '
+                        'current Vagrantfile):')
+        commands.append('vagrant destroy -f ' + ' '.join(report['destroy']))
+    if report['up'] or report['provision']:
+        commands.append('# After converting the new topology:')
+    if report['up']:
+        commands.append('vagrant up --provider=%s %s' % (provider, ' '.join(report['up'])))
+    if report['provision']:
+        commands.append('vagrant provision ' + ' '.join(report['provision']))
+    return commands
+
+def print_diff(report, provider):
+    """ Prints a diff report and the commands which apply it """
+    def value(item):
+        return '-' if item is None else json.dumps(item, default=json_default)
+
+    print(styles.BOLD + '\n############\nTOPOLOGY DIFF\n############' + styles.ENDC)
+    for kind in ('devices', 'links'):
+        for name in report[kind]['added']:
+            print(styles.GREEN + '  + %s %s' % (kind[:-1], name) + styles.ENDC)
+        for name in report[kind]['removed']:
+            print(styles.FAIL + '  - %s %s' % (kind[:-1], name) + styles.ENDC)
+        for name, changes in report[kind]['changed'].items():
+            print(styles.WARNING + '  ~ %s %s' % (kind[:-1], name) + styles.ENDC)
+            interfaces = []
+            for attribute, old_value, new_value in changes:
+                # The changes of the interfaces of a device are listed with its links
+                if kind == 'devices' and attribute.startswith('interfaces.'):
+                    interface = attribute.split('.')[1]
+                    if interface not in interfaces:
+                        interfaces.append(interface)
+                    continue
+                print('        %s: %s -> %s' % (attribute, value(old_value), value(new_value)))
+            if interfaces:
+                print('        interfaces: %s' % ', '.join(interfaces))
+
+    print(styles.BOLD + '\n  Recreate:  %s VMs' % len(report['recreate']) + styles.ENDC)
+    for name, reason in report['recreate'].items():
+        print('    %s (%s)' % (name, reason))
+    print(styles.BOLD + '  Provision: %s VMs' % len(report['provision']) + styles.ENDC)
+    for name, reason in report['provision'].items():
+        print('    %s (%s)' % (name, reason))
+    print(styles.BOLD + '  Untouched: %s VMs' % len(report['untouched']) + styles.ENDC)
+
+    commands = diff_commands(report, provider)
+    if commands:
+        print(styles.BOLD + '\n  Commands:' + styles.ENDC)
+        for command in commands:
+            print(command)
+    else:
+        print(styles.GREEN + styles.BOLD + '\n  The topologies are identical.' + styles.ENDC)
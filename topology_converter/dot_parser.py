@@ -0,0 +1,342 @@
+"""
+A purpose-built, streaming parser for the subset of the DOT language used by topology files.
+
+Topology files only ever use a small part of DOT: a single graph containing node statements with
+attribute lists and "device":"interface" -- "device":"interface" edge statements. This module
+tokenizes its input one line at a time and builds lightweight node and edge objects that mimic the
+parts of the pydotplus API that parse_topology relies on. This avoids building a pyparsing tree and
+a full pydot object graph, which dominate conversion time and memory on large topologies.
+
+Anything outside of the supported subset (subgraphs, default attribute statements, HTML strings,
+etc.) raises a DotSyntaxError so that the caller can fall back to pydotplus.
+"""
+# pylint: disable=too-few-public-methods
+
+import contextlib
+import gzip
+import io
+import mmap
+import os
+import re
+
+from .tc_error import TcError
+
+TOKEN_RE = re.compile(r'''
+    \s*(?:
+        (?P<string>"[^"]*")          |
+        (?P<id>[\w.]+)               |
+        (?P<edgeop>--|->)            |
+        (?P<punct>[{}\[\]=;,:])      |
+        (?P<comment>//.*)            |
+        (?P<block>/\*)               |
+        (?P<other>\S)
+    )''', re.VERBOSE)
+
+KEYWORDS = ('strict', 'graph', 'digraph', 'node', 'edge', 'subgraph')
+
+# Files at least this large are memory-mapped instead of read through a buffered file object
+MMAP_THRESHOLD = 1024 * 1024
+
+class DotSyntaxError(TcError):
+    """ Raised when the input uses DOT syntax which is not supported by the native parser """
+    def __init__(self, message, line=None):
+        self.line = line
+        if line is not None:
+            message = 'Line %s: %s' % (line, message)
+        super().__init__(message, print_on_create=False)
+
+class DotNode:
+    """
+    A node statement. Provides the subset of the pydotplus.Node API used by parse_topology
+    """
+    __slots__ = ('name', 'attributes', 'line')
+
+    def __init__(self, name, attributes, line=None):
+        self.name = name
+        self.attributes = attributes
+        self.line = line
+
+    def get_name(self):
+        """ Returns the raw node name (including any quotes) """
+        return self.name
+
+    def get_attributes(self):
+        """ Returns a dict of raw attribute values (including any quotes) """
+        return self.attributes
+
+    def get(self, name):
+        """ Returns the raw value of an attribute or None """
+        return self.attributes.get(name)
+
+class DotEdge:
+    """
+    An edge statement. Provides the subset of the pydotplus.Edge API used by parse_topology
+    """
+    __slots__ = ('source', 'destination', 'attributes', 'line')
+
+    def __init__(self, source, destination, attributes, line=None):
+        self.source = source
+        self.destination = destination
+        self.attributes = attributes
+        self.line = line
+
+    def get_source(self):
+        """ Returns the raw source endpoint, ie. '"leaf01":"swp1"' """
+        return self.source
+
+    def get_destination(self):
+        """ Returns the raw destination endpoint, ie. '"spine01":"swp1"' """
+        return self.destination
+
+    def get_attributes(self):
+        """ Returns a dict of raw attribute values (including any quotes) """
+        return self.attributes
+
+    def get(self, name):
+        """ Returns the raw value of an attribute or None """
+        return self.attributes.get(name)
+
+class DotGraph:
+    """
+    Holds the nodes and edges of a parsed graph. Like pydotplus, statements which refer to the
+    same node (or the same pair of endpoints) are grouped together in order of first appearance.
+    """
+    def __init__(self, name=None):
+        self.name = name
+        self.nodes = {}
+        self.edges = {}
+
+    def add_node(self, node):
+        """ Adds a DotNode to the graph """
+        self.nodes.setdefault(node.name, []).append(node)
+
+    def add_edge(self, edge):
+        """ Adds a DotEdge to the graph """
+        self.edges.setdefault((edge.source, edge.destination), []).append(edge)
+
+    def get_node_list(self):
+        """ Returns a list of all DotNodes """
+        return [node for node_group in self.nodes.values() for node in node_group]
+
+    def get_edge_list(self):
+        """ Returns a list of all DotEdges """
+        return [edge for edge_group in self.edges.values() for edge in edge_group]
+
+def tokenize(lines):
+    """
+    Generates (kind, text, line_number) tuples from an iterable of lines
+
+    Arguments:
+    lines (iterable) - Lines of DOT text, ie. an open file
+
+    Raises DotSyntaxError on unsupported input
+    """
+    in_block_comment = False
+    for line_number, line in enumerate(lines, 1):
+        pos = 0
+        if in_block_comment:
+            end = line.find('*/')
+            if end == -1:
+                continue
+            in_block_comment = False
+            pos = end + 2
+        elif line.lstrip().startswith('#'):
+            continue
+
+        while True:
+            match = TOKEN_RE.match(line, pos)
+            if not match or match.end() == pos:
+                break
+            pos = match.end()
+            kind = match.lastgroup
+            text = match.group(kind)
+            if kind == 'comment':
+                break
+            if kind == 'block':
+                end = line.find('*/', pos)
+                if end == -1:
+                    in_block_comment = True
+                    break
+                pos = end + 2
+                continue
+            if kind == 'other':
+                raise DotSyntaxError('Unsupported character "%s"' % text, line_number)
+            if kind == 'punct':
+                kind = text
+            elif kind == 'id' and text.lower() in KEYWORDS:
+                kind = text.lower()
+            yield kind, text, line_number
+
+    if in_block_comment:
+        raise DotSyntaxError('Unterminated block comment')
+
+class _Parser:
+    """ Recursive descent parser over a token stream """
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.token = None
+        self.advance()
+
+    def advance(self):
+        """ Moves to the next token """
+        self.token = next(self.tokens, (None, None, None))
+
+    def expect(self, *kinds):
+        """ Consumes and returns the current token if it is one of the given kinds """
+        kind, text, line = self.token
+        if kind not in kinds:
+            raise DotSyntaxError('Expected %s but found "%s"' % (' or '.join(kinds), text), line)
+        self.advance()
+        return text
+
+    def accept(self, kind):
+        """ Consumes the current token if it is of the given kind """
+        if self.token[0] == kind:
+            self.advance()
+            return True
+        return False
+
+    def parse_graph(self):
+        """ graph := ['strict'] ('graph' | 'digraph') [ID] '{' stmt* '}' """
+        self.accept('strict')
+        edge_op = '->' if self.expect('graph', 'digraph').lower() == 'digraph' else '--'
+        name = None
+        if self.token[0] in ('id', 'string'):
+            name = self.token[1]
+            self.advance()
+        graph = DotGraph(name)
+        self.expect('{')
+        while not self.accept('}'):
+            self.parse_statement(graph, edge_op)
+        if self.token[0] is not None:
+            raise DotSyntaxError('Unexpected content after the end of the graph', self.token[2])
+        return graph
+
+    def parse_id(self):
+        """ ID := unquoted identifier | "quoted string" """
+        return self.expect('id', 'string')
+
+    def parse_endpoint(self):
+        """ endpoint := ID [':' ID] """
+        endpoint = self.parse_id()
+        if self.accept(':'):
+            endpoint += ':' + self.parse_id()
+            if self.token[0] == ':':
+                raise DotSyntaxError('Compass points are not supported', self.token[2])
+        return endpoint
+
+    def parse_attributes(self):
+        """ attr_list := '[' (ID '=' ID [','])* ']' """
+        attributes = {}
+        if not self.accept('['):
+            return attributes
+        while not self.accept(']'):
+            kind, key, line = self.token
+            if kind != 'id':
+                raise DotSyntaxError('Unsupported attribute name "%s"' % key, line)
+            self.advance()
+            self.expect('=')
+            attributes[key] = self.parse_id()
+            self.accept(',')
+        if self.token[0] == '[':
+            raise DotSyntaxError('Multiple attribute lists are not supported', self.token[2])
+        return attributes
+
+    def parse_statement(self, graph, edge_op):
+        """ stmt := ID '=' ID | endpoint [attr_list] | endpoint (edgeop endpoint)+ [attr_list] """
+        kind, text, line = self.token
+        if kind not in ('id', 'string'):
+            raise DotSyntaxError('Unsupported statement starting with "%s"' % text, line)
+
+        endpoint = self.parse_endpoint()
+        if self.accept('='):
+            # Graph level attribute, not needed for building the inventory
+            self.parse_id()
+        elif self.token[0] == 'edgeop':
+            endpoints = [endpoint]
+            while self.token[0] == 'edgeop':
+                if self.token[1] != edge_op:
+                    raise DotSyntaxError('Edge operator "%s" does not match the graph type'
+                                         % self.token[1], self.token[2])
+                self.advance()
+                endpoints.append(self.parse_endpoint())
+            attributes = self.parse_attributes()
+            for source, destination in zip(endpoints, endpoints[1:]):
+                graph.add_edge(DotEdge(source, destination, dict(attributes), line))
+        else:
+            if ':' in endpoint:
+                raise DotSyntaxError('Ports are not supported in node statements', line)
+            graph.add_node(DotNode(endpoint, self.parse_attributes(), line))
+        self.accept(';')
+
+@contextlib.contextmanager
+def open_topology_file(dot_file):
+    """
+    Opens a DOT file and provides an iterator over its lines. Gzip compressed files (*.gz) are
+    decompressed transparently and large files are memory-mapped.
+
+    Arguments:
+    dot_file (str) - Path to the DOT file
+
+    Usage:
+    >>> with open_topology_file('./topology.dot.gz') as lines:
+    ...     graph = parse_dot_lines(lines)
+    """
+    if dot_file.endswith('.gz'):
+        with gzip.open(dot_file, 'rt') as dot:
+            yield dot
+    elif os.path.getsize(dot_file) >= MMAP_THRESHOLD:
+        with open(dot_file, 'rb') as dot, \
+                mmap.mmap(dot.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            yield (line.decode('utf-8', 'replace') for line in iter(mapped.readline, b''))
+    else:
+        with open(dot_file, 'r') as dot:
+            yield dot
+
+def read_topology_file(dot_file):
+    """ Returns the full text of a (possibly compressed) DOT file """
+    with open_topology_file(dot_file) as lines:
+        return ''.join(lines)
+
+def parse_dot_lines(lines):
+    """
+    Parses an iterable of DOT lines
+
+    Arguments:
+    lines (iterable) - Lines of DOT text
+
+    Returns:
+    DotGraph - Parsed graph
+
+    Raises DotSyntaxError if unsupported syntax is encountered
+    """
+    return _Parser(tokenize(lines)).parse_graph()
+
+def parse_dot_file(dot_file):
+    """
+    Parses a DOT file one line at a time
+
+    Arguments:
+    dot_file (str) - Path to the DOT file
+
+    Returns:
+    DotGraph - Parsed graph
+
+    Raises DotSyntaxError if unsupported syntax is encountered
+    """
+    with open_topology_file(dot_file) as lines:
+        return parse_dot_lines(lines)
+
+def parse_dot_data(dot_data):
+    """
+    Parses a string in DOT format
+
+    Arguments:
+    dot_data (str) - DOT text
+
+    Returns:
+    DotGraph - Parsed graph
+
+    Raises DotSyntaxError if unsupported syntax is encountered
+    """
+    return parse_dot_lines(io.StringIO(dot_data))
@@ -0,0 +1,130 @@
+"""
+Provides address allocation for the automatically built management network.
+
+The free addresses of a subnet are stored as a sorted list of non-overlapping integer intervals
+instead of a list of every host address. This keeps memory constant for large subnets.
+"""
+
+import bisect
+import ipaddress
+
+from . import tc_error
+
+# Default DHCP range of the management network, as offsets into the subnet
+DEFAULT_DHCP_RANGE = (10, 50)
+
+class AddressPool:
+    """
+    A pool of free host addresses in an IPv4 network. Reservations and allocations locate the
+    affected interval with a binary search.
+    """
+    def __init__(self, network):
+        self.network = ipaddress.IPv4Network(network, strict=False)
+        first = int(self.network.network_address)
+        last = int(self.network.broadcast_address)
+        if self.network.prefixlen < 31:
+            # Skip the network and broadcast addresses
+            first, last = first + 1, last - 1
+        self.starts = [first]
+        self.ends = [last]
+
+    def __contains__(self, address):
+        value = int(ipaddress.IPv4Address(address))
+        index = bisect.bisect_right(self.starts, value) - 1
+        return index >= 0 and value <= self.ends[index]
+
+    def __iter__(self):
+        """ Lazily yields every free address in ascending order """
+        for start, end in zip(list(self.starts), list(self.ends)):
+            for value in range(start, end + 1):
+                yield ipaddress.IPv4Address(value)
+
+    def __len__(self):
+        return sum(end - start + 1 for start, end in zip(self.starts, self.ends))
+
+    def reserve(self, address):
+        """
+        Removes a single address from the pool
+
+        Arguments:
+        address (str or ipaddress.IPv4Address) - Address to reserve
+
+        Returns:
+        bool - False if the address was not free
+        """
+        value = int(ipaddress.IPv4Address(address))
+        index = bisect.bisect_right(self.starts, value) - 1
+        if index < 0 or value > self.ends[index]:
+            return False
+
+        start, end = self.starts[index], self.ends[index]
+        if start == end:
+            del self.starts[index]
+            del self.ends[index]
+        elif value == start:
+            self.starts[index] = value + 1
+        elif value == end:
+            self.ends[index] = value - 1
+        else:
+            self.ends[index] = value - 1
+            self.starts.insert(index + 1, value + 1)
+            self.ends.insert(index + 1, end)
+        return True
+
+    def allocate(self):
+        """
+        Removes and returns the lowest free address
+
+        Raises TcError if the pool is empty
+        """
+        if not self.starts:
+            raise tc_error.TcError('There are no free addresses left in the management '
+                                   'network %s' % self.network, print_on_create=False)
+        value = self.starts[0]
+        if value == self.ends[0]:
+            del self.starts[0]
+            del self.ends[0]
+        else:
+            self.starts[0] = value + 1
+        return ipaddress.IPv4Address(value)
+
+def dhcp_range(network, mgmt_dhcp_range=None):
+    """
+    Determines the DHCP range of the management network
+
+    Arguments:
+    network (ipaddress.IPv4Network) - Management network
+    mgmt_dhcp_range [str] - Range as START-STOP where START and STOP are either offsets into the
+                            network (ie. '10-50') or addresses in the network
+
+    Returns:
+    tuple - (start, stop) addresses
+
+    Raises TcError if the range is not valid for the network
+    """
+    if not mgmt_dhcp_range:
+        start, stop = DEFAULT_DHCP_RANGE
+        try:
+            return network[start], network[stop]
+        except IndexError:
+            msg = 'Prefix Length on the Out Of Band Server is not big enough to support usage ' + \
+                  'of the %sth-%sth IP addresses being used for DHCP' % (start, stop)
+            raise tc_error.TcError(msg, print_on_create=False)
+
+    bounds = []
+    for bound in mgmt_dhcp_range.split('-', 1) if '-' in mgmt_dhcp_range else [mgmt_dhcp_range]:
+        bound = bound.strip()
+        try:
+            if bound.isdigit():
+                bounds.append(network[int(bound)])
+            else:
+                bounds.append(ipaddress.IPv4Address(bound))
+        except (IndexError, ValueError):
+            bounds = []
+            break
+
+    if len(bounds) != 2 or bounds[0] > bounds[1] or any(bound not in network for bound in bounds):
+        msg = 'The management DHCP range "%s" is not a valid range in the management network %s' \
+            % (mgmt_dhcp_range, network)
+        raise tc_error.TcError(msg, print_on_create=False)
+    return bounds[0], bounds[1]
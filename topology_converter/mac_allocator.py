@@ -0,0 +1,119 @@
+"""
+Provides MAC address allocation for interfaces which do not have an explicit MAC address.
+
+Addresses are handled as integers. Explicit MAC addresses from the topology are reserved before
+any address is handed out so that an automatically assigned address can never collide with one
+that was requested in the topology file.
+"""
+# pylint: disable=print-function
+
+import re
+
+from . import tc_error
+
+# Cumulus Range ( 44:38:39:00:00:01 - 44:38:39:ff:ff:ff )
+DEFAULT_POOL_START = 0x443839000001
+DEFAULT_POOL_END = 0x443839ffffff
+
+MAC_RE = re.compile(r'^[0-9a-f]{12}$')
+
+def mac_to_int(mac_address):
+    """
+    Converts a MAC address string (with or without colons) into an integer
+
+    Raises ValueError if the string is not a valid MAC address
+
+    Usage:
+    >>> mac_to_int('44:38:39:00:00:01')
+    75008265158657
+    """
+    mac = mac_address.replace('"', '').replace(':', '').replace('-', '').lower()
+    if not MAC_RE.match(mac):
+        raise ValueError('"%s" is not a valid MAC address' % mac_address)
+    return int(mac, 16)
+
+def int_to_mac(mac_int):
+    """
+    Converts an integer into a colon formatted MAC address string
+
+    Usage:
+    >>> int_to_mac(75008265158657)
+    '44:38:39:00:00:01'
+    """
+    mac = '%012x' % mac_int
+    return ':'.join(mac[i:i + 2] for i in range(0, 12, 2))
+
+def parse_mac_pool(mac_pool):
+    """
+    Parses a MAC pool specification of the form START[-END]
+
+    Arguments:
+    mac_pool (str) - ie. '44:38:39:00:00:01-44:38:39:ff:ff:ff'
+
+    Returns:
+    tuple - (first, last) MAC addresses of the pool as integers
+
+    Raises TcError if the specification is not valid
+    """
+    start, _, end = mac_pool.partition('-')
+    try:
+        first = mac_to_int(start)
+        last = mac_to_int(end) if end else DEFAULT_POOL_END
+    except ValueError as err:
+        raise tc_error.TcError('Invalid MAC pool "%s": %s' % (mac_pool, err),
+                               print_on_create=False)
+    if last < first:
+        raise tc_error.TcError('Invalid MAC pool "%s": the end of the pool is before the start'
+                               % mac_pool, print_on_create=False)
+    return first, last
+
+class MacAllocator:
+    """
+    Hands out MAC addresses from a pool in ascending order, skipping any reserved addresses.
+    Only reserved addresses are stored, so allocation is O(1) regardless of the pool size.
+    """
+    def __init__(self, first=DEFAULT_POOL_START, last=DEFAULT_POOL_END):
+        self.first = first
+        self.last = last
+        self.next_mac = first
+        self.reserved = set()
+        self.allocated = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """
+        Builds an allocator from a TcConfig instance. The pool is taken from `mac_pool` if set,
+        otherwise it starts right after `start_mac`.
+        """
+        if config.mac_pool:
+            return cls(*parse_mac_pool(config.mac_pool))
+        return cls(int(config.start_mac, 16) + 1)
+
+    def reserve(self, mac_int):
+        """
+        Marks an address as used so that it is never handed out
+
+        Returns:
+        bool - False if the address was already reserved
+        """
+        if mac_int in self.reserved:
+            return False
+        self.reserved.add(mac_int)
+        return True
+
+    def allocate(self):
+        """
+        Returns the next free address in the pool as an integer
+
+        Raises TcError if the pool is exhausted
+        """
+        mac_int = self.next_mac
+        while mac_int in self.reserved:
+            mac_int += 1
+        if mac_int > self.last:
+            msg = 'The MAC address pool (%s - %s) is exhausted. Use a larger --mac-pool.' \
+                % (int_to_mac(self.first), int_to_mac(self.last))
+            raise tc_error.TcError(msg, print_on_create=False)
+        self.next_mac = mac_int + 1
+        self.allocated += 1
+        return mac_int
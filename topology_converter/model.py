@@ -0,0 +1,138 @@
+"""
+Compact model of a parsed topology.
+
+parse_topology() builds the inventory from Device and Interface records instead of plain dicts.
+Their well-known keys are stored in __slots__, so a record does not carry a dict of its own, and
+the strings which repeat across the topology (device and interface names, OS names, functions,
+tunnel IPs, 'NOTHING') are interned so that every device and interface shares one copy. Memory,
+CPUs and tunnel ports are stored as integers.
+
+Records behave like the dicts they replace: inventory[device]['interfaces'][name]['mac'], `in`,
+del, get(), items() and templates (device.os or device['os']) work unchanged. Keys which are not
+well-known (ie. passthrough attributes) are kept in a dict that is only created when needed.
+"""
+
+import collections.abc
+import sys
+
+class Record(collections.abc.MutableMapping):
+    """
+    A mapping whose well-known keys (FIELDS) are stored in slots. Iterating a record yields the
+    set FIELDS in FIELDS order, followed by the other keys in insertion order.
+    """
+    __slots__ = ('_extra',)
+
+    # Well-known keys, values of INTEGER_FIELDS are converted to int and of INTERNED_FIELDS
+    # interned. Subclasses list FIELDS in their __slots__.
+    FIELDS = ()
+    INTEGER_FIELDS = frozenset()
+    INTERNED_FIELDS = frozenset()
+    _field_set = frozenset()
+
+    def __init__(self, *args, **kwargs):
+        self._extra = None
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, key):
+        if key in self._field_set:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_set:
+            if key in self.INTEGER_FIELDS:
+                try:
+                    value = int(value)
+                except (TypeError, ValueError):
+                    pass # Kept as given, so that the caller can report the invalid value
+            if key in self.INTERNED_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            setattr(self, key, value)
+            return
+        if self._extra is None:
+            self._extra = {}
+        self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_set:
+            try:
+                delattr(self, key)
+            except AttributeError:
+                raise KeyError(key) from None
+            return
+        if self._extra is None or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __contains__(self, key):
+        if key in self._field_set:
+            return hasattr(self, key)
+        return self._extra is not None and key in self._extra
+
+    def __iter__(self):
+        for key in self.FIELDS:
+            if hasattr(self, key):
+                yield key
+        if self._extra is not None:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return '%s(%r)' % (type(self).__name__, dict(self))
+
+    def __getstate__(self):
+        return dict(self)
+
+    def __setstate__(self, state):
+        self._extra = None
+        self.update(state)
+
+class Interface(Record):
+    """ An interface of a device. `interfaces` of a Device maps interface names to Interfaces """
+    FIELDS = ('mac', 'network', 'remote_interface', 'remote_device', 'local_ip', 'remote_ip',
+              'local_port', 'remote_port', 'local_interface', 'pxebootinterface')
+    INTEGER_FIELDS = frozenset(('local_port', 'remote_port'))
+    INTERNED_FIELDS = frozenset(('remote_interface', 'remote_device', 'local_ip', 'remote_ip',
+                                 'local_interface', 'pxebootinterface'))
+    __slots__ = FIELDS
+    _field_set = frozenset(FIELDS)
+
+class Device(Record):
+    """ A device (node) of the topology """
+    FIELDS = ('interfaces', 'os', 'memory', 'cpu', 'config', 'function', 'version', 'vagrant',
+              'tunnel_ip', 'mgmt_ip', 'hostname')
+    INTEGER_FIELDS = frozenset(('memory', 'cpu'))
+    INTERNED_FIELDS = frozenset(('os', 'config', 'function', 'version', 'vagrant', 'tunnel_ip',
+                                 'hostname'))
+    __slots__ = FIELDS
+    _field_set = frozenset(FIELDS)
+
+    def __init__(self, *args, **kwargs):
+        self.interfaces = {}
+        super().__init__(*args, **kwargs)
+
+def plain(value):
+    """
+    Converts records (also when nested in dicts and lists) to plain dicts, ie. for printing
+
+    Returns:
+    The value with every Record replaced by a dict
+    """
+    if isinstance(value, collections.abc.Mapping):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [plain(item) for item in value]
+    return value
+
+def json_default(value):
+    """ Serializes records for json.dump(default=json_default), other values as str() """
+    if isinstance(value, Record):
+        return dict(value)
+    return str(value)
@@ -0,0 +1,224 @@
+"""
+Brings up the VMs of a converted topology in boot waves.
+
+The oob-mgmt-server boots first, then the oob switches and then the other devices in the order of
+the Vagrantfile (exit, superspine, spine, leaf, tor, host and all other functions), so that the
+management network and its DHCP server are running before the devices which depend on them boot.
+Within a wave every VM is started by its own `vagrant up <name>`, as many at the same time as the
+memory budget and the job limit allow. A VM which fails to come up is retried and every attempt is
+timed. The vagrant executable can be replaced (ie. by a stub for testing).
+"""
+# pylint: disable=print-function
+
+import concurrent.futures
+import json
+import shlex
+import subprocess
+import threading
+import time
+
+from .capacity import CPUS_PER_BOOT, profile_host, vm_overhead
+from .output import AtomicFile
+from .renderer import get_key_devices
+from .sharding import device_demand
+from .styles import styles
+
+# Lines of the vagrant output kept for a VM which failed to come up
+OUTPUT_TAIL = 20
+
+def boot_waves(devices):
+    """
+    Groups devices into boot waves
+
+    Arguments:
+    devices (list) - Devices as returned by Renderer.populate_data_structures()
+
+    Returns:
+    list - Lists of devices, in boot order
+    """
+    waves = {}
+    for device in devices:
+        waves.setdefault(get_key_devices(device), []).append(device)
+    return [waves[key] for key in sorted(waves)]
+
+def vm_memory(device, provider):
+    """ Returns the memory in MB that a booting VM takes, including the hypervisor overhead """
+    return device_demand(device)[0] + vm_overhead(device, provider)
+
+def up_limits(config):
+    """
+    Determines how many VMs may boot at the same time
+
+    Arguments:
+    config (TcConfig) - TcConfig instance
+
+    Returns:
+    tuple - (memory budget in MB, maximum number of concurrent `vagrant up`). Unless configured,
+            the budget is the available memory of the host and the job limit is derived from its
+            CPUs like the recommendation of the capacity report
+    """
+    memory, jobs = config.up_memory, config.up_jobs
+    if not memory or not jobs:
+        host = profile_host(config.proc_root, config.sys_root)
+        memory = memory or host['memory_available']
+        jobs = jobs or max(1, host['cpus'] // CPUS_PER_BOOT)
+    return memory, jobs
+
+class UpLog:
+    """ Prints the progress of a bring-up from several threads """
+    def __init__(self, start):
+        self.start = start
+        self.lock = threading.Lock()
+
+    def __call__(self, message, color=''):
+        with self.lock:
+            print(color + '  [%8.2f s] %s' % (time.perf_counter() - self.start, message) +
+                  (styles.ENDC if color else ''))
+
+def vagrant_up(command, device, wave, retries, cwd, log):
+    """
+    Brings up one VM, retrying on failure. Runs in a thread of the wave.
+
+    Arguments:
+    command (list) - vagrant command, the hostname is appended
+    device (dict) - Device to bring up
+    wave (int) - Number of the boot wave
+    retries (int) - Number of retries after a failed attempt
+    cwd (str) - Directory holding the Vagrantfile
+    log (UpLog) - Progress log
+
+    Returns:
+    dict - hostname, wave, passed, attempts (returncode, start and seconds of every attempt) and
+           the tail of the output of the last attempt
+    """
+    hostname = device['hostname']
+    record = {'hostname': hostname, 'wave': wave, 'passed': False, 'attempts': [], 'output': ''}
+    for attempt in range(1, retries + 2):
+        log('wave %s: %s: vagrant up (attempt %s)' % (wave, hostname, attempt))
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(command + [hostname], cwd=cwd, stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT, universal_newlines=True,
+                                     check=False)
+            returncode, output = process.returncode, process.stdout
+        except OSError as err:
+            returncode, output = None, str(err)
+        seconds = time.perf_counter() - start
+        record['attempts'].append({'returncode': returncode, 'start': start - log.start,
+                                   'seconds': seconds})
+        record['output'] = '\n'.join(output.splitlines()[-OUTPUT_TAIL:])
+
+        if returncode == 0:
+            record['passed'] = True
+            log('wave %s: %s: up in %.2f s' % (wave, hostname, seconds), styles.GREEN)
+            break
+        log('wave %s: %s: attempt %s failed (exit code %s) after %.2f s'
+            % (wave, hostname, attempt, returncode, seconds), styles.WARNING)
+        if returncode is None:
+            break
+    return record
+
+def run_wave(devices, wave, config, command, limits, log):
+    """
+    Brings up the VMs of a wave, starting them in order while the memory budget and the job limit
+    allow. A VM which needs more memory than the whole budget is started when nothing else runs.
+
+    Returns:
+    list - Records of vagrant_up() in the order of the devices
+    """
+    memory_budget, jobs = limits
+    pending = list(devices)
+    running = {}
+    records = {}
+    with concurrent.futures.ThreadPoolExecutor(jobs) as pool:
+        while pending or running:
+            while pending and len(running) < jobs:
+                memory = vm_memory(pending[0], config.provider)
+                if running and sum(running.values()) + memory > memory_budget:
+                    break
+                future = pool.submit(vagrant_up, command, pending.pop(0), wave, config.up_retries,
+                                     config.output_dir or '.', log)
+                running[future] = memory
+
+            done, _ = concurrent.futures.wait(running,
+                                              return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                del running[future]
+                record = future.result()
+                records[record['hostname']] = record
+    return [records[device['hostname']] for device in devices]
+
+def bring_up(devices, config):
+    """
+    Brings up the VMs of a converted topology wave by wave. When a VM of a wave does not come up,
+    the wave is completed but the following waves are not started.
+
+    Arguments:
+    devices (list) - Devices as returned by Renderer.populate_data_structures()
+    config (TcConfig) - TcConfig instance of the conversion
+
+    Returns:
+    dict - waves (hostnames per wave), vms (records of vagrant_up(), VMs which were not started
+           are recorded with no attempts), memory_budget, jobs and seconds
+    """
+    command = shlex.split(config.vagrant_binary) + ['up', '--provider=' + config.provider]
+    limits = up_limits(config)
+    waves = boot_waves(devices)
+    start = time.perf_counter()
+    log = UpLog(start)
+    log('%s VMs in %s waves, %s MB memory budget, at most %s at a time'
+        % (len(devices), len(waves), limits[0], limits[1]))
+
+    records = []
+    failed = False
+    for number, wave in enumerate(waves, 1):
+        if failed:
+            records += [{'hostname': device['hostname'], 'wave': number, 'passed': False,
+                         'attempts': [], 'output': ''} for device in wave]
+            continue
+        log('wave %s: %s' % (number, ' '.join(device['hostname'] for device in wave)),
+            styles.BOLD)
+        wave_records = run_wave(wave, number, config, command, limits, log)
+        records += wave_records
+        failed = not all(record['passed'] for record in wave_records)
+
+    return {'waves': [[device['hostname'] for device in wave] for wave in waves],
+            'vms': records,
+            'memory_budget': limits[0],
+            'jobs': limits[1],
+            'seconds': time.perf_counter() - start}
+
+def write_up_log(report, path):
+    """ Writes the report of bring_up() as JSON """
+    with AtomicFile(path) as outfile:
+        json.dump(report, outfile, indent=2)
+        outfile.write('\n')
+
+def print_up_summary(report):
+    """ Prints a table of the VMs brought up by bring_up() """
+    records = report['vms']
+    width = max([len('VM')] + [len(record['hostname']) for record in records])
+    row = '  %-' + str(width) + 's  %4s  %-7s  %8s  %7s'
+    print(styles.BOLD + '\n############\nBRING-UP SUMMARY\n############' + styles.ENDC)
+    print(row % ('VM', 'WAVE', 'RESULT', 'ATTEMPTS', 'SECONDS'))
+    for record in records:
+        if record['passed']:
+            color, result = styles.GREEN, 'UP'
+        elif record['attempts']:
+            color, result = styles.FAIL, 'FAILED'
+        else:
+            color, result = styles.WARNING, 'SKIPPED'
+        print(color + row % (record['hostname'], record['wave'], result, len(record['attempts']),
+                             '%.2f' % sum(attempt['seconds'] for attempt in record['attempts'])) +
+              styles.ENDC)
+
+    failed = [record for record in records if record['attempts'] and not record['passed']]
+    for record in failed:
+        print(styles.FAIL + styles.BOLD + '\n  %s:' % record['hostname'] + styles.ENDC)
+        for line in record['output'].splitlines():
+            print('    ' + line)
+
+    passed = sum(1 for record in records if record['passed'])
+    color = styles.GREEN if passed == len(records) else styles.FAIL
+    print(color + styles.BOLD + '\n  %s of %s VMs up in %.2f seconds'
+          % (passed, len(records), report['seconds']) + styles.ENDC)
@@ -0,0 +1,134 @@
+"""
+Writes the files produced by a conversion.
+
+Every output is written to a temporary file next to its destination. When the new content hashes
+the same as the existing file the temporary file is discarded and the destination is left
+untouched, otherwise the temporary file atomically replaces the destination. Readers therefore
+never see a partially written file and file watchers only see outputs which really changed. Every
+output is recorded so that a manifest of the conversion can be written.
+"""
+# pylint: disable=print-function
+
+import collections
+import contextlib
+import hashlib
+import json
+import os
+import tempfile
+
+# Permissions of newly created outputs, as if they had been created with open()
+UMASK = os.umask(0)
+os.umask(UMASK)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def output_path(config, path):
+    """ Returns the location of an output, which is relative to config.output_dir if set """
+    if config.output_dir:
+        return os.path.join(config.output_dir, path)
+    return path
+
+def file_digest(path):
+    """ Returns the sha256 hex digest of a file or None if it cannot be read """
+    digest = hashlib.sha256()
+    try:
+        with open(path, 'rb') as infile:
+            for chunk in iter(lambda: infile.read(HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+class AtomicFile:
+    """
+    A context manager which writes to a temporary file and, on a successful exit, replaces the
+    destination with it if the content changed. After the exit `digest` holds the sha256 of the
+    content and `changed` tells whether the destination was replaced. On an exception the
+    temporary file is removed and the destination is left untouched.
+    """
+    def __init__(self, path, mode='w', buffering=-1):
+        self.path = path
+        self.mode = mode
+        self.buffering = buffering
+        self.temp_path = None
+        self.file = None
+        self.digest = None
+        self.changed = False
+
+    def __enter__(self):
+        directory = os.path.dirname(self.path) or '.'
+        handle, self.temp_path = tempfile.mkstemp(prefix='.%s.' % os.path.basename(self.path),
+                                                  dir=directory)
+        self.file = os.fdopen(handle, self.mode, buffering=self.buffering)
+        return self.file
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.file.close()
+        if exc_type is not None:
+            os.remove(self.temp_path)
+            return False
+
+        self.digest = file_digest(self.temp_path)
+        if self.digest == file_digest(self.path):
+            os.remove(self.temp_path)
+            return False
+
+        if os.path.exists(self.path):
+            mode = os.stat(self.path).st_mode & 0o7777
+        else:
+            mode = 0o666 & ~UMASK
+        os.chmod(self.temp_path, mode)
+        os.replace(self.temp_path, self.path)
+        self.changed = True
+        return False
+
+class OutputWriter:
+    """
+    Writes outputs through AtomicFile and records them for the manifest
+    """
+    def __init__(self, verbose=0):
+        self.verbose = verbose
+        self.records = collections.OrderedDict()
+
+    @contextlib.contextmanager
+    def open(self, path, mode='w', buffering=-1):
+        """ Opens an output for writing, see AtomicFile """
+        atomic = AtomicFile(path, mode, buffering)
+        with atomic as outfile:
+            yield outfile
+        self.record(path, atomic.digest, atomic.changed)
+
+    def write(self, path, content):
+        """
+        Writes an output
+
+        Arguments:
+        path (str) - Destination
+        content (str) - Content of the output
+
+        Returns:
+        bool - True if the destination changed
+        """
+        with self.open(path) as outfile:
+            outfile.write(content)
+        return self.records[path]['changed']
+
+    def record(self, path, digest, changed):
+        """ Records an output which was written elsewhere (ie. by a render worker) """
+        self.records[path] = {'path': path, 'sha256': digest, 'changed': changed}
+        if self.verbose > 2:
+            print('    %s %s' % ('Updated:' if changed else 'Unchanged:', path))
+
+    def changed(self):
+        """ Returns the paths of the outputs which changed """
+        return [path for path, record in self.records.items() if record['changed']]
+
+    def write_manifest(self, path):
+        """
+        Writes a JSON manifest of every recorded output. The manifest itself is only replaced when
+        its content changes.
+        """
+        manifest = {'outputs': list(self.records.values()), 'changed': self.changed()}
+        with AtomicFile(path) as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+            manifest_file.write('\n')
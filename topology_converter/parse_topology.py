@@ -10,18 +10,76 @@ The main functionality of this module is provided by the parse_topology function
 
 import ipaddress
 import os
-import pprint
-import random
 import re
+import sys
 
-import pydotplus
-
+from . import dot_parser
+from . import ip_pool
+from . import port_planner
+from . import sharding
+from . import stable_ids
 from . import tc_error # pylint: disable=no-name-in-module
-from .warning_messages import WarningMessages
+from .mac_allocator import MacAllocator, int_to_mac, mac_to_int
+from .model import Device, Interface, plain
 from .styles import styles
 
-WARNING = WarningMessages()
-PP = pprint.PrettyPrinter(depth=6)
+def lint_line(line):
+    """
+    Lints a single line of a topology DOT file
+
+    Arguments:
+    line (str) - Line of DOT text
+
+    Returns:
+    list - Problems found on the line (empty if the line is clean)
+    """
+    problems = []
+    # Try to encode into ascii
+    try:
+        line.encode('ascii', 'ignore')
+    except UnicodeDecodeError:
+        msg = '\n %s\n         --> "%s" \n' % (line, re.sub(r'[^\x00-\x7F]+', '?', line))
+        msg += 'Has hidden unicode characters in it which prevent it from being ' + \
+               'converted to ASCII cleanly. Try manually typing it instead of ' + \
+               'copying and pasting.'
+        problems.append(msg)
+        return problems
+
+    if line.lstrip().startswith('//') or line.lstrip().startswith('#'):
+        return problems
+
+    if line.count('"') % 2 == 1:
+        msg = 'Has an odd number of quotation characters (").\n'
+        msg += '     %s\n' % line
+        problems.append(msg)
+
+    if line.count('\'') % 2 == 1:
+        msg = 'Has an odd number of quotation characters (\').\n     %s\n' % line
+        problems.append(msg)
+
+    if line.count(':') == 2:
+        if ' -- ' not in line:
+            msg = 'Does not contain the following sequence " -- " '
+            msg += 'to seperate the different ends of the link.\n     %s\n' % line
+            problems.append(msg)
+
+    return problems
+
+
+def linted_lines(lines, errors):
+    """
+    Passes lines through unchanged while linting them, so that linting can share a single read of
+    the topology file with the parser.
+
+    Arguments:
+    lines (iterable) - Lines of DOT text
+    errors (list) - Any problems found are appended to this list as (line_number, message)
+    """
+    for line_number, line in enumerate(lines, 1):
+        for problem in lint_line(line):
+            errors.append((line_number, problem))
+        yield line
+
 
 def lint_topo_file(topology_file):
     """
@@ -30,77 +88,132 @@ def lint_topo_file(topology_file):
     Arguments:
     topology_file (str) - Path to the topology DOT file
 
-    Raises TcError if any issues are found during linting
+    Raises LintError containing every issue found during linting
     """
-    with open(topology_file, 'r') as topo_file:
-        line_list = topo_file.readlines()
-        count = 0
+    errors = []
+    with dot_parser.open_topology_file(topology_file) as lines:
+        for _ in linted_lines(lines, errors):
+            pass
 
-        for line in line_list:
-            count += 1
-            # Try to encode into ascii
-            try:
-                line.encode('ascii', 'ignore')
-            except UnicodeDecodeError as err:
-                msg = 'Line %s:\n %s\n         --> "%s" \n' \
-                    % (count, line, re.sub(r'[^\x00-\x7F]+', '?', line))
-                msg += 'Has hidden unicode characters in it which prevent it from being ' + \
-                       'converted to ASCII cleanly. Try manually typing it instead of ' + \
-                       'copying and pasting.'
-                raise tc_error.LintError(msg)
-
-            if line.lstrip().startswith('//') or line.lstrip().startswith('#'):
-                continue
-
-            if line.count('"') % 2 == 1:
-                msg = 'Line %s: Has an odd number of quotation characters (").\n' % count
-                msg += '     %s\n' % line
-                raise tc_error.LintError(msg)
-
-            if line.count('\'') % 2 == 1:
-                msg = 'Line %s: Has an odd number of quotation characters (\').\n     %s\n' \
-                    % (count, line)
-                raise tc_error.LintError(msg)
-
-            if line.count(':') == 2:
-                if ' -- ' not in line:
-                    msg = 'Line %s: Does not contain the following sequence " -- " ' % count
-                    msg += 'to seperate the different ends of the link.\n     %s\n' % line
-                    raise tc_error.LintError(msg)
+    if errors:
+        raise tc_error.LintError(str(tc_error.TopologyErrors(errors, print_on_create=False)))
 
 
 def get_random_localhost_ip():
     """ Returns a random IP address in the 127.0.0.0/8 subnet """
+    import random # pylint: disable=import-outside-toplevel
+
     subnet = ipaddress.IPv4Network('127.0.0.0/8')
     bits = random.getrandbits(subnet.max_prefixlen - subnet.prefixlen)
     addr = ipaddress.IPv4Address(subnet.network_address + bits)
     return str(addr)
 
 
-def mac_fetch(hostname, interface, config): # pylint: disable=unused-argument
+def load_topology(topology_file, dot_data=None, errors=None, verbose=0):
+    """
+    Loads a DOT file or string into a graph object which provides get_node_list() and
+    get_edge_list(). The native streaming parser is tried first; pydotplus is used as a fallback
+    for any syntax the native parser does not support. Topology files are linted in the same pass.
+
+    Arguments:
+    topology_file (str) - Path to DOT file (or None if using the `dot_data` argument)
+    dot_data (str) - String in DOT format representing the topology
+    errors [list] - Lint problems are appended to this list as (line_number, message)
+    verbose [int] - Logging verbosity
+
+    Returns:
+    DotGraph or pydotplus.Dot - Parsed graph
+
+    Raises TcError if the topology cannot be parsed
+    """
+    if errors is None:
+        errors = []
+
+    try:
+        if topology_file:
+            with dot_parser.open_topology_file(topology_file) as lines:
+                return dot_parser.parse_dot_lines(linted_lines(lines, errors))
+        return dot_parser.parse_dot_data(dot_data)
+    except dot_parser.DotSyntaxError as err:
+        if verbose > 0:
+            print('  INFO: falling back to pydotplus for parsing (%s)' % err)
+
+    if topology_file:
+        # The native parser stopped early, so lint and read the whole file again
+        del errors[:]
+        dot_data = dot_parser.read_topology_file(topology_file)
+        for _ in linted_lines(dot_data.splitlines(True), errors):
+            pass
+        msg = 'Cannot parse the provided topology.dot file (%s)\n' % topology_file
+        msg += '     There is probably a syntax error of some kind, ' + \
+            'common causes include failing to close quotation marks and hidden ' + \
+            'characters from copy/pasting device names into the topology file.'
+    else:
+        msg = 'Cannot parse the provided DOT data\n'
+        msg += '\tThere is probably a syntax error of some kind, '
+        msg += 'common causes include failing to close quotation marks and hidden '
+        msg += 'characters from copy/pasting device names into the topology data.'
+
+    # pydotplus (and pyparsing) take longer to import than most conversions take, so they are only
+    # imported when the native parser cannot handle the topology
+    import pydotplus # pylint: disable=import-outside-toplevel
+
+    try:
+        topology = pydotplus.graphviz.graph_from_dot_data(dot_data)
+    except Exception: # pylint: disable=broad-except
+        topology = None
+    if topology is None:
+        errors.append((None, msg))
+        raise tc_error.TopologyErrors(errors, print_on_create=False)
+    return topology
+
+
+def mac_fetch(hostname, interface, config):
     """
-    Returns the next MAC address in a sequence. Calling this function mutates/increments
-    the `start_mac` variable of the provided TcConfig instance
+    Returns the next free MAC address from the MAC pool of the provided TcConfig instance, or with
+    stable IDs the address derived from the hostname and interface. Addresses reserved via
+    reserve_explicit_macs() are never returned.
 
     Arguments:
-    hostname (str) - Not used
-    interface (str) - Interface name (used for logging)
+    hostname (str) - Device name
+    interface (str) - Interface name
     config (TcConfig) - TcConfig instance
+
+    Raises TcError if the MAC pool is exhausted
     """
-    new_mac = ('%x' % (int(config.start_mac, 16) + 1)).lower()
-    while new_mac in config.mac_map:
-        WARNING.append(styles.WARNING + styles.BOLD +
-                       '    WARNING: MF MAC Address Collision -- tried to use ' +
-                       new_mac + ' (on ' + interface + ') but it was already in use.' +
-                       styles.ENDC)
-        config.start_mac = new_mac
-        new_mac = ('%x' % (int(config.start_mac, 16) + 1)).lower()
-    config.start_mac = new_mac
+    if config.mac_allocator is None:
+        config.mac_allocator = MacAllocator.from_config(config)
+    if config.stable_ids:
+        new_mac = int_to_mac(config.mac_allocator.allocate('%s:%s' % (hostname, interface)))
+    else:
+        new_mac = int_to_mac(config.mac_allocator.allocate())
+    config.counters['auto_macs'] += 1
 
     if config.verbose > 2:
-        print('    Fetched new MAC ADDRESS: "%s"' % new_mac)
+        print('    Fetched new MAC ADDRESS: "%s" (on %s)' % (new_mac, interface))
+
+    return new_mac
 
-    return add_mac_colon(new_mac, config)
+
+def reserve_explicit_macs(edges, config):
+    """
+    Reserves every MAC address set with the left_mac/right_mac link attributes so that they are
+    never handed out by mac_fetch()
+
+    Arguments:
+    edges (list) - DotEdges or pydotplus.Edges of the topology
+    config (TcConfig) - TcConfig instance
+    """
+    if config.mac_allocator is None:
+        config.mac_allocator = MacAllocator.from_config(config)
+    for edge in edges:
+        for attribute in ('left_mac', 'right_mac'):
+            if edge.get(attribute):
+                try:
+                    config.mac_allocator.reserve(mac_to_int(edge.get(attribute)))
+                except ValueError:
+                    # Passed through as-is, collisions are detected when the link is added
+                    continue
 
 
 def add_mac_colon(mac_address, config):
@@ -141,96 +254,122 @@ def add_link(inventory, left_device, right_device, left_interface,
 
     Raises TcError if a fatal error occurs
     """
+    if config.network_ids is not None:
+        net_number = config.network_ids.allocate(
+            stable_ids.link_name(left_device, left_interface, right_device, right_interface))
     network_string = 'net' + str(net_number)
-    port_a = str(config.start_port + net_number)
-    port_b = str(config.start_port + config.port_gap + net_number)
-
-    if int(port_a) > int(config.start_port + config.port_gap) and config.provider == 'libvirt':
-        msg = 'Configured Port_Gap: (' + str(config.port_gap) + ') ' + \
-              'exceeds the number of links in the topology. Read the help options to fix.\n\n'
-        config.parser.print_help()
-        raise tc_error.TcError(msg)
+    left_device, right_device = sys.intern(left_device), sys.intern(right_device)
+    left_interface, right_interface = sys.intern(left_interface), sys.intern(right_interface)
 
     # Add a Link to the Inventory for both switches
+    left_interfaces = inventory[left_device]['interfaces']
+    right_interfaces = None if right_device == 'NOTHING' else inventory[right_device]['interfaces']
 
     # Add left host switchport to inventory
-    if left_interface not in inventory[left_device]['interfaces']:
-        inventory[left_device]['interfaces'][left_interface] = {}
-        inventory[left_device]['interfaces'][left_interface]['mac'] = left_mac_address
+    if left_interface not in left_interfaces:
+        left = left_interfaces[left_interface] = Interface()
+        left.mac = left_mac_address
 
         if left_mac_address in config.mac_map:
             msg = 'MAC Address Collision - tried to use ' + \
                   left_mac_address + ' on ' + left_device + ':' + left_interface + \
                   '\n                 but it is already in use. Check your Topology File!'
-            raise tc_error.TcError(msg)
+            raise tc_error.TcError(msg, print_on_create=False)
 
         config.mac_map[left_mac_address] = left_device + ',' + left_interface
 
         if config.provider == 'virtualbox':
-            inventory[left_device]['interfaces'][left_interface]['network'] = network_string
+            left.network = network_string
 
-        elif config.provider == 'libvirt':
-            inventory[left_device]['interfaces'][left_interface]['local_port'] = port_a
-            inventory[left_device]['interfaces'][left_interface]['remote_port'] = port_b
 
     else:
         msg = 'Interface ' + left_interface + ' Already used on device: ' + left_device
-        raise tc_error.TcError(msg)
+        raise tc_error.TcError(msg, print_on_create=False)
 
     # Add right host switchport to inventory
     if right_device == 'NOTHING':
-        pass
+        right = None
 
-    elif right_interface not in inventory[right_device]['interfaces']:
-        inventory[right_device]['interfaces'][right_interface] = {}
-        inventory[right_device]['interfaces'][right_interface]['mac'] = right_mac_address
+    elif right_interface not in right_interfaces:
+        right = right_interfaces[right_interface] = Interface()
+        right.mac = right_mac_address
 
         if right_mac_address in config.mac_map:
             msg = 'MAC Address Collision - tried to use ' + \
                   right_mac_address + ' on ' + right_device + ':' + right_interface + \
                   '\n                 but it is already in use. Check your Topology File!'
-            raise tc_error.TcError(msg)
+            raise tc_error.TcError(msg, print_on_create=False)
 
         config.mac_map[right_mac_address] = right_device + ',' + right_interface
 
         if config.provider == 'virtualbox':
-            inventory[right_device]['interfaces'][right_interface]['network'] = network_string
+            right.network = network_string
 
-        elif config.provider == 'libvirt':
-            inventory[right_device]['interfaces'][right_interface]['local_port'] = port_b
-            inventory[right_device]['interfaces'][right_interface]['remote_port'] = port_a
 
     else:
         msg = 'Interface ' + right_interface + ' Already used on device: ' + right_device
-        raise tc_error.TcError(msg)
+        raise tc_error.TcError(msg, print_on_create=False)
 
-    inventory[left_device]['interfaces'][left_interface]['remote_interface'] = right_interface
-    inventory[left_device]['interfaces'][left_interface]['remote_device'] = right_device
+    left.remote_interface = right_interface
+    left.remote_device = right_device
 
-    if right_device != 'NOTHING':
-        inventory[right_device]['interfaces'][right_interface]['remote_interface'] = left_interface
-        inventory[right_device]['interfaces'][right_interface]['remote_device'] = left_device
+    if right is not None:
+        right.remote_interface = left_interface
+        right.remote_device = left_device
 
     if config.provider == 'libvirt':
-        if right_device != 'NOTHING':
-            inventory[left_device]['interfaces'][left_interface]['local_ip'] = \
-                inventory[left_device]['tunnel_ip']
-            inventory[left_device]['interfaces'][left_interface]['remote_ip'] = \
-                inventory[right_device]['tunnel_ip']
-            inventory[right_device]['interfaces'][right_interface]['local_ip'] = \
-                inventory[right_device]['tunnel_ip']
-            inventory[right_device]['interfaces'][right_interface]['remote_ip'] = \
-                inventory[left_device]['tunnel_ip']
-        elif right_device == 'NOTHING':
-            if config.tunnel_ip:
-                inventory[left_device]['interfaces'][left_interface]['local_ip'] = config.tunnel_ip
-                inventory[left_device]['interfaces'][left_interface]['remote_ip'] = config.tunnel_ip
+        # Ports are assigned by the port planner once all links are known
+        config.links.append(port_planner.Link(net_number, left, right, '%s:%s -- %s:%s' % (
+            left_device, left_interface, right_device, right_interface)))
+
+        if right is not None:
+            left.local_ip = right.remote_ip = inventory[left_device]['tunnel_ip']
+            left.remote_ip = right.local_ip = inventory[right_device]['tunnel_ip']
+        elif config.tunnel_ip:
+            left.local_ip = left.remote_ip = config.tunnel_ip
+        else:
+            left.local_ip = left.remote_ip = '127.0.0.1'
+
+
+def mgmt_racks(devices, inventory, fanout):
+    """
+    Places the devices of a two-tier management network on oob leaf switches. Devices are grouped
+    by function and by hostname without its trailing number (ie. leaf01-leaf04 or server01-server04)
+    and a group is kept on one oob leaf switch whenever it fits.
+
+    Arguments:
+    devices (list) - Names of the devices to connect, in inventory order
+    inventory (dict) - Dict of parsed inventory
+    fanout (int) - Number of devices connected to one oob leaf switch
+
+    Returns:
+    list - Lists of device names, one per oob leaf switch
+    """
+    groups = {}
+    for device in devices:
+        key = (inventory[device]['function'], re.sub('[0-9]+$', '', device))
+        groups.setdefault(key, []).append(device)
+
+    racks = []
+    for group in groups.values():
+        if len(group) <= fanout:
+            # Keep the group together on the first switch it fits on
+            for rack in racks:
+                if len(rack) + len(group) <= fanout:
+                    rack.extend(group)
+                    break
             else:
-                inventory[left_device]['interfaces'][left_interface]['local_ip'] = '127.0.0.1'
-                inventory[left_device]['interfaces'][left_interface]['remote_ip'] = '127.0.0.1'
+                racks.append(list(group))
+            continue
 
+        # Groups larger than a switch fill up the last switch and continue on new ones
+        for device in group:
+            if not racks or len(racks[-1]) == fanout:
+                racks.append([])
+            racks[-1].append(device)
+    return racks
 
-def parse_topology(topology_file, config, dot_data=None):
+def parse_topology(topology_file, config, dot_data=None, print_errors=True):
     """
     Parses a topology file or string in DOT format and serializes it into a dict that contains all
     defined nodes and their links. Note: only topologies parsed from a file will be linted.
@@ -239,6 +378,7 @@ def parse_topology(topology_file, config, dot_data=None):
     topology_file (str) - Path to DOT file (or None if using the `dot_data` argument)
     config (TcConfig) - TcConfig instance
     topology_dot (str) - String in DOT format representing the topology
+    print_errors [bool] - If False, errors are only raised and not printed
 
     Returns:
     dict - Serialized topology
@@ -262,314 +402,350 @@ def parse_topology(topology_file, config, dot_data=None):
               'function': 'leaf', 'mgmt_ip': '192.168.200.3', 'vagrant': 'eth0'},
     ...etc...
     """
-    provider = config.provider
-    verbose = config.verbose
-    tunnel_ip = config.tunnel_ip
-    if not topology_file and not dot_data:
-        raise tc_error.TcError('Must pass either the topology_file or dot_data argument')
-    if topology_file:
-        lint_topo_file(topology_file)
-        try:
-            topology = pydotplus.graphviz.graph_from_dot_file(topology_file)
-        except Exception as err:
-            msg = 'Cannot parse the provided topology.dot file (%s)\n' % topology
-            msg += '     There is probably a syntax error of some kind, ' + \
-                'common causes include failing to close quotation marks and hidden ' + \
-                'characters from copy/pasting device names into the topology file.'
-            raise tc_error.TcError(msg)
-    else:
-        try:
-            topology = pydotplus.graphviz.graph_from_dot_data(dot_data)
-        except Exception as err:
-            msg = 'Cannot parse the provided DOT data\n'
-            msg += '\tThere is probably a syntax error of some kind, '
-            msg += 'common causes include failing to close quotation marks and hidden '
-            msg += 'characters from copy/pasting device names into the topology data.'
-            raise tc_error.TcError(msg)
-
-    inventory = {}
+    try:
+        return _parse_topology(topology_file, config, dot_data)
+    except tc_error.TcError as err:
+        if print_errors:
+            err.print_error()
+        raise
 
-    # Generate a random localhost IP for libvirt tunnels (if needed)
-    if tunnel_ip == 'random':
-        tunnel_ip = get_random_localhost_ip()
 
-    try:
-        nodes = topology.get_node_list()
+def add_node(inventory, node, config, tunnel_ip):
+    """
+    Adds a node (device) to the inventory, applying functional defaults and validating its name
+    and attributes. This function mutates the provided inventory dict.
 
-    except Exception as err:
-        print(err)
-        if topology_file:
-            print(styles.FAIL + styles.BOLD +
-                  ' ### ERROR: There is a syntax error in your topology file \
-                  (%s). Read the error output above for any clues as to the source.'
-                  % (topology_file) + styles.ENDC)
-        raise tc_error.TcError('There is a syntax error in your topology file: ' + str(err),
-                               print_on_create=False)
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    node (DotNode or pydotplus.Node) - Node to add
+    config (TcConfig) - TcConfig instance
+    tunnel_ip (str) - Tunnel IP to apply to all devices (or None)
 
-    try:
-        edges = topology.get_edge_list()
+    Raises TcError if the node is not valid
+    """
+    provider = config.provider
+    node_name = node.get_name().replace('"', '')
 
-    except Exception as err:
-        print(err)
-        if topology_file:
-            print(styles.FAIL + styles.BOLD +
-                  ' ### ERROR: There is a syntax error in your topology file \
-                  (%s). Read the error output above for any clues as to the source.'
-                  % (topology_file) + styles.ENDC)
-        raise tc_error.TcError('There is a syntax error in your topology file: ' + str(err),
-                               print_on_create=False)
+    if node_name.startswith('.') or node_name.startswith('-'):
+        msg = 'Node name cannot start with a hyphen or period. "%s" is not valid!\n' % node_name
+        raise tc_error.TcError(msg, print_on_create=False)
 
-    # Add Nodes to inventory
-    for node in nodes:
+    reg = re.compile(r'^[A-Za-z0-9\.-]+$')
 
-        node_name = node.get_name().replace('"', '')
+    if not reg.match(node_name):
+        msg = 'Node name for the VM should only contain letters, numbers, hyphens or dots. ' + \
+              'It cannot start with a hyphen or dot. "%s" is not valid!\n' % node_name
+        raise tc_error.TcError(msg, print_on_create=False)
 
-        if node_name.startswith('.') or node_name.startswith('-'):
-            msg = 'Node name cannot start with a hyphen or period. "%s" is not valid!\n' % node_name
-            raise tc_error.TcError(msg)
+    # Try to encode into ascii
+    try:
+        node_name.encode('ascii', 'ignore')
+
+    except UnicodeDecodeError:
+        msg = 'Node name "%s" --> "%s" has hidden unicode characters in it ' \
+            % (node_name, re.sub(r'[^\x00-\x7F]+', ' ', node_name))
+        msg += 'which prevent it from being converted to Ascii cleanly. ' + \
+               'Try manually typing it instead of copying and pasting.'
+        raise tc_error.TcError(msg, print_on_create=False)
+
+    node_name = sys.intern(node_name)
+    if node_name not in inventory:
+        inventory[node_name] = Device()
+    device = inventory[node_name]
+
+    node_attr_list = node.get_attributes()
+
+    # Define Functional Defaults
+    if 'function' in node_attr_list:
+        value = node.get('function')
+
+        if value.startswith('"') or value.startswith('\''):
+            value = value[1:].lower()
+
+        if value.endswith('"') or value.endswith('\''):
+            value = value[:-1].lower()
+
+        if value == 'fake':
+            device['os'] = 'None'
+            device['memory'] = '1'
+
+        if value == 'oob-server':
+            device['os'] = 'generic/ubuntu2004'
+            device['memory'] = '1024'
+
+        if value == 'oob-switch':
+            device['os'] = 'CumulusCommunity/cumulus-vx'
+            device['memory'] = '768'
+            device['config'] = config.script_storage+'/oob_switch_config.sh'
+
+        elif value in config.network_functions:
+            device['os'] = 'CumulusCommunity/cumulus-vx'
+            device['memory'] = '768'
+
+        elif value == 'host':
+            device['os'] = 'generic/ubuntu1804'
+            device['memory'] = '512'
+
+    if provider == 'libvirt' and 'pxehost' in node_attr_list:
+        if node.get('pxehost').replace('"', '') == 'True':
+            device['os'] = 'N/A (PXEBOOT)'
+
+    # Add attributes to node inventory
+    for attribute in node_attr_list:
+
+        if config.verbose > 2:
+            print(attribute + ' = ' + node.get(attribute))
+
+        value = node.get(attribute)
+
+        if value.startswith('"') or value.startswith('\''):
+            value = value[1:]
+
+        if value.endswith('"') or value.endswith('\''):
+            value = value[:-1]
+
+        device[attribute] = value
+
+        if (attribute == 'config') and (not os.path.isfile(value)):
+            config.warnings.append(styles.WARNING + styles.BOLD +
+                           '    WARNING: Node "' + node_name + '" \
+                           Config file for device does not exist' + styles.ENDC)
+
+    # pylint: disable=line-too-long
+    if provider == 'libvirt':
+        if 'os' in device:
+            if device['os'] == 'boxcutter/ubuntu1604' or device['os'] == 'bento/ubuntu-16.04' or device['os'] == 'ubuntu/xenial64':
+                msg = 'device ' + node_name + ' -- Incompatible OS for libvirt provider.'
+                msg += '              Do not attempt to use a mutated image for Ubuntu16.04 on Libvirt'
+                msg += '              use an ubuntu1604 image which is natively built for libvirt'
+                msg += '              like generic/ubuntu18.04.'
+                msg += '              See https://github.com/CumulusNetworks/topology_converter/tree/master/documentation#vagrant-box-selection'
+                msg += '              See https://github.com/vagrant-libvirt/vagrant-libvirt/issues/607'
+                msg += '              See https://github.com/vagrant-libvirt/vagrant-libvirt/issues/609'
+                raise tc_error.TcError(msg, print_on_create=False)
+    # pylint: enable=line-too-long
+
+    # Make sure mandatory attributes are present.
+    mandatory_attributes = ['os', ]
+    for attribute in mandatory_attributes:
+        if attribute not in device:
+            msg = 'MANDATORY DEVICE ATTRIBUTE "' + attribute + '" not specified for ' + \
+                  node_name
+            raise tc_error.TcError(msg, print_on_create=False)
+
+    # Extra Massaging for specific attributes.
+    # light sanity checking.
+    if 'function' not in device:
+        device['function'] = 'Unknown'
+
+    if 'memory' in device:
+        try:
+            memory = int(device['memory'])
+        except ValueError:
+            memory = None
+        if memory is None:
+            msg = 'There is something wrong with the memory definition on ' + node_name
+            raise tc_error.TcError(msg, print_on_create=False)
+        if memory <= 0:
+            msg = 'Memory must be greater than 0mb on ' + node_name
+            raise tc_error.TcError(msg, print_on_create=False)
+
+    if provider == 'libvirt':
+        if tunnel_ip:
+            device['tunnel_ip'] = tunnel_ip
+        elif 'tunnel_ip' not in device:
+            device['tunnel_ip'] = '127.0.0.1'
+
+    if 'vagrant' not in device:
+        device['vagrant'] = config.vagrant
+
+
+def add_edge(inventory, edge, net_number, config):
+    """
+    Adds an edge (link) between two devices to the inventory, including any link-based
+    passthrough attributes. This function mutates the provided inventory dict.
 
-        reg = re.compile(r'^[A-Za-z0-9\.-]+$')
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    edge (DotEdge or pydotplus.Edge) - Edge to add
+    net_number (int) - Network number
+    config (TcConfig) - TcConfig instance
 
-        if not reg.match(node_name):
-            msg = 'Node name for the VM should only contain letters, numbers, hyphens or dots. ' + \
-                  'It cannot start with a hyphen or dot. "%s" is not valid!\n' % node_name
-            raise tc_error.TcError(msg)
+    Raises TcError if the edge is not valid
+    """
+    # Set Devices/interfaces/MAC Addresses
+    left_device = edge.get_source().split(':')[0].replace('"', '')
+    left_interface = edge.get_source().split(':')[1].replace('"', '')
+
+    if '/' in left_interface:
+        new_left_interface = left_interface.replace('/', '-')
+        config.warnings.append(styles.WARNING + styles.BOLD +
+                       '    WARNING: Device %s interface %s has bad \
+                       characters altering to this %s.'
+                       % (left_device, left_interface, new_left_interface) +
+                       styles.ENDC)
+        left_interface = new_left_interface
+
+    right_device = edge.get_destination().split(':')[0].replace('"', '')
+    right_interface = edge.get_destination().split(':')[1].replace('"', '')
+    if '/' in right_interface:
+        new_right_interface = right_interface.replace('/', '-')
+        config.warnings.append(styles.WARNING + styles.BOLD +
+                       '    WARNING: Device %s interface %s has bad \
+                       characters altering to this %s.'
+                       % (right_device, right_interface, new_right_interface) +
+                       styles.ENDC)
+        right_interface = new_right_interface
 
+    for value in [left_device, left_interface, right_device, right_interface]:
         # Try to encode into ascii
         try:
-            node_name.encode('ascii', 'ignore')
-
-        except UnicodeDecodeError as err:
-            msg = 'Node name "%s" --> "%s" has hidden unicode characters in it ' \
-                % (node_name, re.sub(r'[^\x00-\x7F]+', ' ', node_name))
+            value.encode('ascii', 'ignore')
+        except UnicodeDecodeError:
+            msg = 'in line --> "%s":"%s" -- "%s":"%s"\n        ' \
+                % (left_device, left_interface, right_device, right_interface)
+            msg += 'Link component: "%s" has hidden unicode characters in it ' \
+                % re.sub(r'[^\x00-\x7F]+', ' ', value)
             msg += 'which prevent it from being converted to Ascii cleanly. ' + \
                    'Try manually typing it instead of copying and pasting.'
-            raise tc_error.TcError(msg)
-
-        if node_name not in inventory:
-            inventory[node_name] = {}
-            inventory[node_name]['interfaces'] = {}
+            raise tc_error.TcError(msg, print_on_create=False)
 
-        node_attr_list = node.get_attributes()
+    left_mac_address = ''
 
-        # Define Functional Defaults
-        if 'function' in node_attr_list:
-            value = node.get('function')
+    if edge.get('left_mac'):
+        temp_left_mac = edge.get('left_mac').replace('"', '').replace(':', '').lower()
+        left_mac_address = add_mac_colon(temp_left_mac, config)
 
-            if value.startswith('"') or value.startswith('\''):
-                value = value[1:].lower()
-
-            if value.endswith('"') or value.endswith('\''):
-                value = value[:-1].lower()
-
-            if value == 'fake':
-                inventory[node_name]['os'] = 'None'
-                inventory[node_name]['memory'] = '1'
+    else:
+        left_mac_address = mac_fetch(left_device, left_interface, config)
 
-            if value == 'oob-server':
-                inventory[node_name]['os'] = 'generic/ubuntu2004'
-                inventory[node_name]['memory'] = '1024'
+    right_mac_address = ''
 
-            if value == 'oob-switch':
-                inventory[node_name]['os'] = 'CumulusCommunity/cumulus-vx'
-                inventory[node_name]['memory'] = '768'
-                inventory[node_name]['config'] = config.script_storage+'/oob_switch_config.sh'
+    if edge.get('right_mac'):
+        temp_right_mac = edge.get('right_mac').replace('"', '').replace(':', '').lower()
+        right_mac_address = add_mac_colon(temp_right_mac, config)
 
-            elif value in config.network_functions:
-                inventory[node_name]['os'] = 'CumulusCommunity/cumulus-vx'
-                inventory[node_name]['memory'] = '768'
+    else:
+        right_mac_address = mac_fetch(right_device, right_interface, config)
+
+    # Check to make sure each device in the edge already exists in inventory
+    if left_device not in inventory:
+        msg = 'device ' + left_device + ' is referred to in list of edges/links ' + \
+              'but not defined as a node.'
+        raise tc_error.TcError(msg, print_on_create=False)
+
+    if right_device not in inventory:
+        msg = 'device ' + right_device + ' is referred to in list of edges/links but ' + \
+              'not defined as a node.'
+        raise tc_error.TcError(msg, print_on_create=False)
+
+    # Adds link to inventory datastructure
+    add_link(inventory,
+             left_device,
+             right_device,
+             left_interface,
+             right_interface,
+             left_mac_address,
+             right_mac_address,
+             net_number,
+             config)
+
+    # Handle Link-based Passthrough Attributes
+    for attribute in edge.get_attributes():
+        if attribute in ('left_mac', 'right_mac'):
+            continue
 
-            elif value == 'host':
-                inventory[node_name]['os'] = 'generic/ubuntu1804'
-                inventory[node_name]['memory'] = '512'
+        value = edge.get(attribute)
 
-        if provider == 'libvirt' and 'pxehost' in node_attr_list:
-            if node.get('pxehost').replace('"', '') == 'True':
-                inventory[node_name]['os'] = 'N/A (PXEBOOT)'
+        if value.startswith('"') or value.startswith('\''):
+            value = value[1:]
 
-        # Add attributes to node inventory
-        for attribute in node_attr_list:
+        if value.endswith('"') or value.endswith('\''):
+            value = value[:-1]
 
-            if verbose > 2:
-                print(attribute + ' = ' + node.get(attribute))
-
-            value = node.get(attribute)
-
-            if value.startswith('"') or value.startswith('\''):
-                value = value[1:]
-
-            if value.endswith('"') or value.endswith('\''):
-                value = value[:-1]
-
-            inventory[node_name][attribute] = value
-
-            if (attribute == 'config') and (not os.path.isfile(value)):
-                WARNING.append(styles.WARNING + styles.BOLD +
-                               '    WARNING: Node "' + node_name + '" \
-                               Config file for device does not exist' + styles.ENDC)
-
-        # pylint: disable=line-too-long
-        if provider == 'libvirt':
-            if 'os' in inventory[node_name]:
-                if inventory[node_name]['os'] == 'boxcutter/ubuntu1604' or inventory[node_name]['os'] == 'bento/ubuntu-16.04' or inventory[node_name]['os'] == 'ubuntu/xenial64':
-                    msg = 'device ' + node_name + ' -- Incompatible OS for libvirt provider.'
-                    msg += '              Do not attempt to use a mutated image for Ubuntu16.04 on Libvirt'
-                    msg += '              use an ubuntu1604 image which is natively built for libvirt'
-                    msg += '              like generic/ubuntu18.04.'
-                    msg += '              See https://github.com/CumulusNetworks/topology_converter/tree/master/documentation#vagrant-box-selection'
-                    msg += '              See https://github.com/vagrant-libvirt/vagrant-libvirt/issues/607'
-                    msg += '              See https://github.com/vagrant-libvirt/vagrant-libvirt/issues/609'
-                    raise tc_error.TcError(msg)
-        # pylint: enable=line-too-long
-
-        # Make sure mandatory attributes are present.
-        mandatory_attributes = ['os', ]
-        for attribute in mandatory_attributes:
-            if attribute not in inventory[node_name]:
-                msg = 'MANDATORY DEVICE ATTRIBUTE "' + attribute + '" not specified for ' + \
-                      node_name
-                raise tc_error.TcError(msg)
-
-        # Extra Massaging for specific attributes.
-        # light sanity checking.
-        if 'function' not in inventory[node_name]:
-            inventory[node_name]['function'] = 'Unknown'
-
-        if 'memory' in inventory[node_name]:
-            try:
-                if int(inventory[node_name]['memory']) <= 0:
-                    msg = 'Memory must be greater than 0mb on ' + node_name
-                    raise tc_error.TcError(msg)
-            except:
-                msg = 'There is something wrong with the memory definition on ' + node_name
-                raise tc_error.TcError(msg)
-
-        if provider == 'libvirt':
-            if tunnel_ip:
-                inventory[node_name]['tunnel_ip'] = tunnel_ip
-            elif 'tunnel_ip' not in inventory[node_name]:
-                inventory[node_name]['tunnel_ip'] = '127.0.0.1'
-
-        if 'vagrant' not in inventory[node_name]:
-            inventory[node_name]['vagrant'] = config.vagrant
-
-    # Add All the Edges to Inventory
-    net_number = 1
-    port_a = str(config.start_port + net_number)
-    port_b = str(config.start_port + config.port_gap + net_number)
-    for edge in edges:
-        network_string = 'net' + str(net_number)
+        if attribute.startswith('left_'):
+            inventory[left_device]['interfaces'][left_interface][attribute[5:]] = value
 
-        # Set Devices/interfaces/MAC Addresses
-        left_device = edge.get_source().split(':')[0].replace('"', '')
-        left_interface = edge.get_source().split(':')[1].replace('"', '')
-
-        if '/' in left_interface:
-            new_left_interface = left_interface.replace('/', '-')
-            WARNING.append(styles.WARNING + styles.BOLD +
-                           '    WARNING: Device %s interface %s has bad \
-                           characters altering to this %s.'
-                           % (left_device, left_interface, new_left_interface) +
-                           styles.ENDC)
-            left_interface = new_left_interface
-
-        right_device = edge.get_destination().split(':')[0].replace('"', '')
-        right_interface = edge.get_destination().split(':')[1].replace('"', '')
-        if '/' in right_interface:
-            new_right_interface = right_interface.replace('/', '-')
-            WARNING.append(styles.WARNING + styles.BOLD +
-                           '    WARNING: Device %s interface %s has bad \
-                           characters altering to this %s.'
-                           % (right_device, right_interface, new_right_interface) +
-                           styles.ENDC)
-            right_interface = new_right_interface
-
-        for value in [left_device, left_interface, right_device, right_interface]:
-            # Try to encode into ascii
-            try:
-                value.encode('ascii', 'ignore')
-            except UnicodeDecodeError as err:
-                msg = 'in line --> "%s":"%s" -- "%s":"%s"\n        ' \
-                    % (left_device, left_interface, right_device, right_interface)
-                msg += 'Link component: "%s" has hidden unicode characters in it ' \
-                    % re.sub(r'[^\x00-\x7F]+', ' ', value)
-                msg += 'which prevent it from being converted to Ascii cleanly. ' + \
-                       'Try manually typing it instead of copying and pasting.'
-                raise tc_error.TcError(msg)
-
-        left_mac_address = ''
-
-        if edge.get('left_mac'):
-            temp_left_mac = edge.get('left_mac').replace('"', '').replace(':', '').lower()
-            left_mac_address = add_mac_colon(temp_left_mac, config)
+        elif attribute.startswith('right_'):
+            inventory[right_device]['interfaces'][right_interface][attribute[6:]] = value
 
         else:
-            left_mac_address = mac_fetch(left_device, left_interface, config)
+            inventory[left_device]['interfaces'][left_interface][attribute] = value
+            inventory[right_device]['interfaces'][right_interface][attribute] = value
 
-        right_mac_address = ''
 
-        if edge.get('right_mac'):
-            temp_right_mac = edge.get('right_mac').replace('"', '').replace(':', '').lower()
-            right_mac_address = add_mac_colon(temp_right_mac, config)
-
-        else:
-            right_mac_address = mac_fetch(right_device, right_interface, config)
-
-        # Check to make sure each device in the edge already exists in inventory
-        if left_device not in inventory:
-            msg = 'device ' + left_device + ' is referred to in list of edges/links ' + \
-                  'but not defined as a node.'
-            raise tc_error.TcError(msg)
-
-        if right_device not in inventory:
-            msg = 'device ' + right_device + ' is referred to in list of edges/links but ' + \
-                  'not defined as a node.'
-            raise tc_error.TcError(msg)
-
-        # Adds link to inventory datastructure
-        add_link(inventory,
-                 left_device,
-                 right_device,
-                 left_interface,
-                 right_interface,
-                 left_mac_address,
-                 right_mac_address,
-                 net_number,
-                 config)
-
-        # Handle Link-based Passthrough Attributes
-        edge_attributes = {}
-        for attribute in edge.get_attributes():
-            if attribute in ('left_mac', 'right_mac'):
-                continue
+def _parse_topology(topology_file, config, dot_data=None):
+    """ Implements parse_topology(). TcErrors raised here are printed by the caller """
+    provider = config.provider
+    verbose = config.verbose
+    tunnel_ip = config.tunnel_ip
+    if not topology_file and not dot_data:
+        raise tc_error.TcError('Must pass either the topology_file or dot_data argument',
+                               print_on_create=False)
 
-            if attribute in edge_attributes:
-                WARNING.append(styles.WARNING + styles.BOLD +
-                               '    WARNING: Attribute "' + attribute +
-                               '" specified twice. Using second value.' + styles.ENDC)
+    # Problems are collected as (line_number, message) so they can all be reported at once
+    errors = []
+    timings = config.timings
+    timings.start()
+    topology = load_topology(topology_file, dot_data, errors, verbose)
+    timings.lap('parse')
 
-            value = edge.get(attribute)
+    inventory = {}
+    config.links = []
 
-            if value.startswith('"') or value.startswith('\''):
-                value = value[1:]
+    lock = None
+    if config.stable_ids:
+        lock = stable_ids.load_lock(config.id_lock)
+        config.network_ids = stable_ids.NetworkIds.from_config(config, lock['networks'])
 
-            if value.endswith('"') or value.endswith('\''):
-                value = value[:-1]
+    # Generate a random localhost IP for libvirt tunnels (if needed)
+    if tunnel_ip == 'random':
+        if lock is not None:
+            tunnel_ip = stable_ids.stable_tunnel_ip(config, lock['tunnel_ip'])
+            config.network_ids.tunnel_ip = tunnel_ip
+        else:
+            tunnel_ip = get_random_localhost_ip()
+        config.counters['auto_ips'] += 1
 
-            if attribute.startswith('left_'):
-                inventory[left_device]['interfaces'][left_interface][attribute[5:]] = value
+    # Add Nodes to inventory
+    for node in topology.get_node_list():
+        config.counters['nodes'] += 1
+        try:
+            add_node(inventory, node, config, tunnel_ip)
+        except tc_error.TcError as err:
+            errors.append((getattr(node, 'line', None), err.message))
+    timings.lap('nodes')
 
-            elif attribute.startswith('right_'):
-                inventory[right_device]['interfaces'][right_interface][attribute[6:]] = value
+    # Add All the Edges to Inventory
+    edges = topology.get_edge_list()
+    try:
+        if lock is not None:
+            config.mac_allocator = stable_ids.StableMacAllocator.from_config(config, lock['macs'])
+        else:
+            config.mac_allocator = MacAllocator.from_config(config)
+    except tc_error.TcError as err:
+        errors.append((None, err.message))
+        raise tc_error.TopologyErrors(errors, print_on_create=False)
+    reserve_explicit_macs(edges, config)
 
-            else:
-                inventory[left_device]['interfaces'][left_interface][attribute] = value
-                inventory[right_device]['interfaces'][right_interface][attribute] = value
-                # edge_attributes[attribute]=value
+    net_number = 1
+    for edge in edges:
+        config.counters['edges'] += 1
+        network_string = 'net' + str(net_number)
+        try:
+            add_edge(inventory, edge, net_number, config)
+        except tc_error.TcError as err:
+            errors.append((getattr(edge, 'line', None), err.message))
+        except IndexError:
+            msg = 'Link "%s -- %s" must specify an interface for both devices' \
+                % (edge.get_source(), edge.get_destination())
+            errors.append((getattr(edge, 'line', None), msg))
 
         net_number += 1
-        port_a = str(config.start_port + net_number)
-        port_b = str(config.start_port + config.port_gap + net_number)
+
+    if errors:
+        raise tc_error.TopologyErrors(errors, print_on_create=False)
+    timings.lap('edges')
 
     # Remove PXEbootinterface attribute from hosts which are not set to PXEboot=True
     for device in inventory:
@@ -602,7 +778,9 @@ def parse_topology(topology_file, config, dot_data=None):
 
         if count > 1:
             msg = 'Device ' + device + ' sets pxebootinterface more than once.'
-            raise tc_error.TcError(msg)
+            raise tc_error.TcError(msg, print_on_create=False)
+
+    timings.lap('pxe')
 
     #######################
     # Add Mgmt Network Links
@@ -627,14 +805,13 @@ def parse_topology(topology_file, config, dot_data=None):
         if mgmt_server is None:
             if 'oob-mgmt-server' in inventory:
                 msg = 'oob-mgmt-server must be set to function = "oob-server"'
-                raise tc_error.TcError(msg)
-            inventory['oob-mgmt-server'] = {}
+                raise tc_error.TcError(msg, print_on_create=False)
+            inventory['oob-mgmt-server'] = Device()
             inventory['oob-mgmt-server']['function'] = 'oob-server'
             inventory['oob-mgmt-server']['vagrant'] = config.vagrant
 
             intf = ipaddress.ip_interface(u'192.168.200.254/24')
 
-            inventory['oob-mgmt-server']['interfaces'] = {}
             mgmt_server = 'oob-mgmt-server'
             if provider == 'libvirt':
                 if tunnel_ip:
@@ -670,14 +847,16 @@ def parse_topology(topology_file, config, dot_data=None):
             inventory[mgmt_server]['mgmt_cidrmask'] = ('/%s' % intf.network.prefixlen)
             inventory[mgmt_server]['mgmt_netmask'] = ('%s' % intf.netmask)
 
-        try:
-            inventory[mgmt_server]['mgmt_dhcp_start'] = ('%s' % intf.network[10])
-            inventory[mgmt_server]['mgmt_dhcp_stop'] = ('%s' % intf.network[50])
+        # The OOB server is provisioned with an IPv4 dhcpd (isc-dhcp-server) and IPv4 addresses
+        if intf.version != 4:
+            msg = 'The mgmt_ip of the out of band management server (%s) is not an IPv4 ' \
+                  'address. The automatic management network only supports IPv4 subnets.' \
+                  % intf
+            raise tc_error.TcError(msg, print_on_create=False)
 
-        except IndexError:
-            msg = 'Prefix Length on the Out Of Band Server is not big enough to support usage ' + \
-                  'of the 10th-50th IP addresses being used for DHCP'
-            raise tc_error.TcError(msg)
+        dhcp_start, dhcp_stop = ip_pool.dhcp_range(intf.network, config.mgmt_dhcp_range)
+        inventory[mgmt_server]['mgmt_dhcp_start'] = ('%s' % dhcp_start)
+        inventory[mgmt_server]['mgmt_dhcp_stop'] = ('%s' % dhcp_stop)
 
         if 'os' not in inventory[mgmt_server]:
             inventory[mgmt_server]['os'] = 'generic/ubuntu2004'
@@ -710,11 +889,10 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
 
             if 'oob-mgmt-switch' in inventory:
                 msg = 'oob-mgmt-switch must be set to function = "oob-switch"'
-                raise tc_error.TcError(msg)
+                raise tc_error.TcError(msg, print_on_create=False)
 
-            inventory['oob-mgmt-switch'] = {}
+            inventory['oob-mgmt-switch'] = Device()
             inventory['oob-mgmt-switch']['function'] = 'oob-switch'
-            inventory['oob-mgmt-switch']['interfaces'] = {}
             inventory['oob-mgmt-switch']['vagrant'] = config.vagrant
 
             if provider == 'libvirt':
@@ -742,9 +920,9 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                              network_string))
 
                 elif provider == 'libvirt':
-                    print('    %s:%s udp_port %s (mac: %s) --> %s:%s udp_port %s (mac: %s)'
-                          % (mgmt_switch, 'swp1', left_mac, port_a, mgmt_server, 'eth1', port_b,
-                             right_mac))
+                    # The UDP ports are printed once they are planned, see plan_ports()
+                    print('    %s:%s (mac: %s) --> %s:%s (mac: %s)'
+                          % (mgmt_switch, 'swp1', left_mac, mgmt_server, 'eth1', right_mac))
 
             add_link(inventory,
                      mgmt_switch,
@@ -756,24 +934,68 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                      net_number,
                      config)
 
-            mgmt_switch_swp = 1
-
             # Add Eth0 MGMT Link for every device that is is not oob-switch, oob-server or fake
-            for device in inventory:
-                if inventory[device]['function'] in ['oob-server', 'oob-switch', 'fake']:
-                    continue
+            mgmt_devices = [device for device in inventory if inventory[device]['function']
+                            not in ['oob-server', 'oob-switch', 'fake']]
 
-                mgmt_switch_swp += 1
-                net_number += 1
+            if len(mgmt_devices) <= config.mgmt_fanout:
+                mgmt_ports = [(mgmt_switch, 'swp' + str(port), device)
+                              for port, device in enumerate(mgmt_devices, 2)]
+            else:
+                # Too many devices for one switch: connect them to oob leaf switches which are
+                # uplinked to the mgmt switch
+                racks = mgmt_racks(mgmt_devices, inventory, config.mgmt_fanout)
+                if len(racks) > config.mgmt_fanout:
+                    msg = '%s devices need %s oob leaf switches but the mgmt fanout is %s. ' \
+                          'Increase the mgmt fanout.' \
+                        % (len(mgmt_devices), len(racks), config.mgmt_fanout)
+                    raise tc_error.TcError(msg, print_on_create=False)
+
+                inventory[mgmt_switch]['mgmt_bridge_file'] = 'bridge-untagged-' + mgmt_switch
+                mgmt_ports = []
+                for number, rack in enumerate(racks, 1):
+                    oob_leaf = sys.intern('oob-mgmt-leaf%02d' % number)
+                    if oob_leaf in inventory:
+                        msg = '%s is reserved for the two-tier mgmt network' % oob_leaf
+                        raise tc_error.TcError(msg, print_on_create=False)
+
+                    inventory[oob_leaf] = Device()
+                    inventory[oob_leaf]['function'] = 'oob-switch'
+                    inventory[oob_leaf]['vagrant'] = config.vagrant
+                    inventory[oob_leaf]['os'] = 'CumulusCommunity/cumulus-vx'
+                    inventory[oob_leaf]['memory'] = '512'
+                    inventory[oob_leaf]['config'] = config.script_storage+'/oob_switch_config.sh'
+                    inventory[oob_leaf]['mgmt_bridge_file'] = 'bridge-untagged-' + oob_leaf
+                    if provider == 'libvirt':
+                        inventory[oob_leaf]['tunnel_ip'] = \
+                            tunnel_ip or inventory[mgmt_switch].get('tunnel_ip', '127.0.0.1')
+
+                    # Uplink swp1 of the oob leaf switch to the mgmt switch
+                    net_number += 1
+                    uplink = 'swp' + str(number + 1)
+                    left_mac = mac_fetch(mgmt_switch, uplink, config)
+                    right_mac = mac_fetch(oob_leaf, 'swp1', config)
+                    if verbose > 1:
+                        print('    %s:%s (mac: %s) --> %s:%s (mac: %s)'
+                              % (mgmt_switch, uplink, left_mac, oob_leaf, 'swp1', right_mac))
 
-                if int(port_a) > int(config.start_port + config.port_gap) and provider == 'libvirt':
-                    msg = 'Configured Port_Gap: (' + str(config.port_gap) + ') exceeds ' + \
-                          'the number of links in the topology. Read the help options to fix.\n\n'
-                    config.parser.print_help()
-                    raise tc_error.TcError(msg)
+                    add_link(inventory,
+                             mgmt_switch,
+                             oob_leaf,
+                             uplink,
+                             'swp1',
+                             left_mac,
+                             right_mac,
+                             net_number,
+                             config)
+
+                    mgmt_ports += [(oob_leaf, 'swp' + str(port), device)
+                                   for port, device in enumerate(rack, 2)]
 
-                mgmt_switch_swp_val = 'swp' + str(mgmt_switch_swp)
-                left_mac = mac_fetch(mgmt_switch, mgmt_switch_swp_val, config)
+            for oob_switch, mgmt_switch_swp_val, device in mgmt_ports:
+                net_number += 1
+
+                left_mac = mac_fetch(oob_switch, mgmt_switch_swp_val, config)
                 right_mac = mac_fetch(device, 'eth0', config)
 
                 half1_exists = False
@@ -785,35 +1007,35 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                     if inventory[device]['interfaces']['eth0']['remote_interface'] \
                             != mgmt_switch_swp_val:
                         msg = '%s:eth0 interface already exists but not connected to %s:%s' \
-                            % (device, mgmt_switch, mgmt_switch_swp_val)
-                        raise tc_error.TcError(msg)
+                            % (device, oob_switch, mgmt_switch_swp_val)
+                        raise tc_error.TcError(msg, print_on_create=False)
 
-                    if inventory[device]['interfaces']['eth0']['remote_device'] != mgmt_switch:
+                    if inventory[device]['interfaces']['eth0']['remote_device'] != oob_switch:
                         msg = '%s:eth0 interface already exists but not connected to %s:%s' \
-                            % (device, mgmt_switch, mgmt_switch_swp_val)
-                        raise tc_error.TcError(msg)
+                            % (device, oob_switch, mgmt_switch_swp_val)
+                        raise tc_error.TcError(msg, print_on_create=False)
 
                     if verbose > 2:
-                        print('        mgmt link on %s already exists and is good.' % (mgmt_switch))
+                        print('        mgmt link on %s already exists and is good.' % (oob_switch))
 
                     half1_exists = True
 
-                if mgmt_switch_swp_val in inventory[mgmt_switch]['interfaces']:
+                if mgmt_switch_swp_val in inventory[oob_switch]['interfaces']:
 
-                    if inventory[mgmt_switch]['interfaces'][mgmt_switch_swp_val]\
+                    if inventory[oob_switch]['interfaces'][mgmt_switch_swp_val]\
                             ['remote_interface'] != 'eth0':
                         msg = '%s:%s-- link already exists but not connected to %s:eth0' \
-                            % (mgmt_switch, mgmt_switch_swp_val, device)
-                        raise tc_error.TcError(msg)
+                            % (oob_switch, mgmt_switch_swp_val, device)
+                        raise tc_error.TcError(msg, print_on_create=False)
 
-                    if inventory[mgmt_switch]['interfaces'][mgmt_switch_swp_val]['remote_device'] \
+                    if inventory[oob_switch]['interfaces'][mgmt_switch_swp_val]['remote_device'] \
                             != device:
                         msg = '%s:%s-- link already exists but not connected to %s:eth0' \
-                            % (mgmt_switch, mgmt_switch_swp_val, device)
-                        raise tc_error.TcError(msg)
+                            % (oob_switch, mgmt_switch_swp_val, device)
+                        raise tc_error.TcError(msg, print_on_create=False)
 
                     if verbose > 2:
-                        print('        mgmt link on %s already exists and is good.' % (mgmt_switch))
+                        print('        mgmt link on %s already exists and is good.' % (oob_switch))
 
                     half2_exists = True
 
@@ -823,16 +1045,16 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                     if verbose > 1:
                         if provider == 'virtualbox':
                             print('    %s:%s (mac: %s) --> %s:%s (mac: %s)     network_string:net%s'
-                                  % (mgmt_switch, mgmt_switch_swp_val, left_mac, device,
+                                  % (oob_switch, mgmt_switch_swp_val, left_mac, device,
                                      'eth0', right_mac, net_number))
 
                         elif provider == 'libvirt':
-                            print('    %s:%s udp_port %s (mac: %s) --> %s:%s udp_port %s (mac: %s)'
-                                  % (mgmt_switch, mgmt_switch_swp_val, port_a, left_mac, device,
-                                     'eth0', port_b, right_mac))
+                            print('    %s:%s (mac: %s) --> %s:%s (mac: %s)'
+                                  % (oob_switch, mgmt_switch_swp_val, left_mac, device,
+                                     'eth0', right_mac))
 
                     add_link(inventory,
-                             mgmt_switch,
+                             oob_switch,
                              device,
                              mgmt_switch_swp_val,
                              'eth0',
@@ -850,7 +1072,7 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                                                 inventory[mgmt_server]['mgmt_cidrmask']))
         network = ipaddress.ip_network('%s' % (intf.network))
 
-        acceptable_host_addresses = list(intf.network.hosts())
+        acceptable_host_addresses = ip_pool.AddressPool(network)
 
         for device in inventory:
 
@@ -863,45 +1085,45 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
 
                         except:
                             msg = 'Invalid IP specified in mgmt_ip option for %s' % device
-                            raise tc_error.TcError(msg)
+                            raise tc_error.TcError(msg, print_on_create=False)
                     else:
                         try:
                             node_mgmt_ip = ipaddress.ip_address(inventory[device]['mgmt_ip'])
 
                         except:
                             msg = 'Invalid IP specified in mgmt_ip option for %s' % device
-                            raise tc_error.TcError(msg)
+                            raise tc_error.TcError(msg, print_on_create=False)
                 else:
                     msg = 'Empty value provided for mgmt_ip option for %s' % device
-                    raise tc_error.TcError(msg)
+                    raise tc_error.TcError(msg, print_on_create=False)
 
 
                 # Check that Defined Mgmt_IP is in same Subnet as OOB-SERVER
                 if node_mgmt_ip not in network:
                     msg = 'IP address (%s) is not in the Management Server subnet %s' \
                         % (node_mgmt_ip, network)
-                    raise tc_error.TcError(msg)
+                    raise tc_error.TcError(msg, print_on_create=False)
 
                 # Remove Address from Valid Assignable Address Pool
-                try:
-                    acceptable_host_addresses.remove(node_mgmt_ip)
-
-                    if verbose > 2:
-                        print('  INFO: Removing MGMT_IP Address %s from Assignable Pool. \
-                              Address already assigned to %s' % (node_mgmt_ip, device))
-
-                except:
+                if not acceptable_host_addresses.reserve(node_mgmt_ip):
                     msg = 'Cannot mark the mgmt_ip (%s) as used.' % node_mgmt_ip
-                    raise tc_error.TcError(msg)
+                    raise tc_error.TcError(msg, print_on_create=False)
+
+                if verbose > 2:
+                    print('  INFO: Removing MGMT_IP Address %s from Assignable Pool. \
+                          Address already assigned to %s' % (node_mgmt_ip, device))
 
         # Add Mgmt_IP if not configured
         for device in inventory:
             if 'mgmt_ip' not in inventory[device]:
-                new_mgmt_ip = acceptable_host_addresses.pop(0)
+                new_mgmt_ip = acceptable_host_addresses.allocate()
+                config.counters['auto_ips'] += 1
                 inventory[device]['mgmt_ip'] = '%s' % (new_mgmt_ip)
                 if verbose > 1:
                     print('    Device: "%s" was assigned mgmt_ip %s' % (device, new_mgmt_ip))
 
+    timings.lap('mgmt_network')
+
     # Add Dummy Eth0 Link
     for device in inventory:
 
@@ -936,7 +1158,7 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
             inventory[device]['function'] in config.network_functions:
 
             if provider != 'libvirt':
-                WARNING.append(styles.WARNING + styles.BOLD +
+                config.warnings.append(styles.WARNING + styles.BOLD +
                                '    WARNING: "ports" setting on node %s will be ignored \
                                when not using the libvirt hypervisor.' % (device) +
                                styles.ENDC)
@@ -960,6 +1182,7 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
 
             # exit(1)
 
+            config.counters['generated_ports'] += len(ports_to_create)
             for i in ports_to_create:
                 net_number += 1
                 add_link(inventory,
@@ -972,8 +1195,19 @@ folder to see how we set up the OOB server for you..''' + styles.ENDC)
                          net_number,
                          config)
 
+    timings.lap('ports')
+
+    if config.shards:
+        config.shard_map = sharding.shard_inventory(inventory, config)
+
+    if provider == 'libvirt':
+        port_planner.plan_ports(config)
+    timings.lap('plan')
+
     if verbose > 2:
+        import pprint # pylint: disable=import-outside-toplevel
+
         print('\n\n ### Inventory Datastructure: ###')
-        PP.pprint(inventory)
+        pprint.PrettyPrinter(depth=6).pprint(plain(inventory))
 
     return inventory
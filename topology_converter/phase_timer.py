@@ -0,0 +1,98 @@
+"""
+Measures how long the phases of a conversion take.
+"""
+# pylint: disable=print-function
+
+import collections
+import contextlib
+import time
+import tracemalloc
+
+class PhaseTimer:
+    """
+    Accumulates the wall clock time of named phases (ie. "parse", "nodes", "render:Vagrantfile.j2").
+    Every conversion gets its own instance (TcConfig.timings). Phases are either timed as a block
+    with phase() or as laps: lap(name) records the time since the previous lap (or start()).
+
+    The CPU time of every phase is recorded as well and, while tracemalloc is tracing, the peak
+    of the memory allocated during the phase (above what was allocated when it started). Since
+    the tracemalloc peak is reset when a phase starts, the highest peak seen by any phase is kept
+    in traced_peak.
+    """
+    def __init__(self):
+        self.timings = collections.OrderedDict()
+        self.cpu_times = collections.OrderedDict()
+        self.peaks = collections.OrderedDict()
+        self.traced_peak = 0
+        self.last = self.now()
+
+    def __iter__(self):
+        return iter(self.timings.items())
+
+    def add(self, name, seconds, cpu_seconds=0.0, peak=None):
+        """ Adds the time (and memory peak) of a run of a phase """
+        self.timings[name] = self.timings.get(name, 0.0) + seconds
+        self.cpu_times[name] = self.cpu_times.get(name, 0.0) + cpu_seconds
+        if peak is not None:
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def peak(self):
+        """ Returns the highest traced memory since tracing started, including earlier phases """
+        if tracemalloc.is_tracing():
+            self.traced_peak = max(self.traced_peak, tracemalloc.get_traced_memory()[1])
+        return self.traced_peak
+
+    def now(self):
+        """ Returns (wall clock, CPU time, traced memory) and starts a new memory peak """
+        allocated = 0
+        if tracemalloc.is_tracing():
+            self.peak()
+            if hasattr(tracemalloc, 'reset_peak'):
+                tracemalloc.reset_peak()
+            allocated = tracemalloc.get_traced_memory()[0]
+        return time.perf_counter(), time.process_time(), allocated
+
+    def add_since(self, name, start):
+        """ Adds the time since `start`, a value of now(), to a phase """
+        wall, cpu = time.perf_counter(), time.process_time()
+        peak = None
+        if tracemalloc.is_tracing():
+            peak = max(0, tracemalloc.get_traced_memory()[1] - start[2])
+            self.peak()
+        self.add(name, wall - start[0], cpu - start[1], peak)
+
+    def start(self):
+        """ Starts the first lap """
+        self.last = self.now()
+
+    def lap(self, name):
+        """ Records the time since the previous lap as phase `name` and starts the next lap """
+        self.add_since(name, self.last)
+        self.last = self.now()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """ Records the time spent in the with block as phase `name` """
+        start = self.now()
+        try:
+            yield
+        finally:
+            self.add_since(name, start)
+
+    def phases(self):
+        """
+        Returns:
+        OrderedDict - {phase: {'wall_seconds': ..., 'cpu_seconds': ..., 'peak_bytes': ...}}.
+                      peak_bytes is only included for phases timed while tracemalloc was tracing
+        """
+        phases = collections.OrderedDict()
+        for name, seconds in self.timings.items():
+            phases[name] = {'wall_seconds': seconds, 'cpu_seconds': self.cpu_times[name]}
+            if name in self.peaks:
+                phases[name]['peak_bytes'] = self.peaks[name]
+        return phases
+
+    def print_timings(self):
+        """ Prints the time of every phase """
+        for name, seconds in self.timings.items():
+            print('    %-40s %9.2f ms' % (name, seconds * 1000))
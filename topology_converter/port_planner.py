@@ -0,0 +1,257 @@
+"""
+Plans the UDP ports used by libvirt tunnels.
+
+Every libvirt link is a UDP tunnel between two ports: the left side binds start_port + N and the
+right side binds start_port + port_gap + N. The planner runs once all links are known so that the
+port gap can be sized to the real number of links, ports which are already bound on the hypervisor
+are skipped and, when the port space of one IP address runs out, links are spread over further
+loopback addresses.
+"""
+# pylint: disable=print-function
+
+import ipaddress
+import os
+
+from . import tc_error
+from .styles import styles
+
+# The Vagrantfile adds `offset = wbid * 100` (wbid = 1) to every tunnel port
+TEMPLATE_PORT_OFFSET = 100
+
+MAX_PORT = 65535
+
+def used_udp_ports(proc_net='/proc/net'):
+    """
+    Reads the UDP ports which are currently bound on this host
+
+    Arguments:
+    proc_net [str] - Location of the proc net directory
+
+    Returns:
+    set - Bound port numbers. Empty if the information is not available (ie. not Linux)
+    """
+    ports = set()
+    for table in ('udp', 'udp6'):
+        try:
+            with open('%s/%s' % (proc_net, table), 'r') as udp:
+                next(udp, None)
+                for line in udp:
+                    fields = line.split()
+                    if len(fields) > 1 and ':' in fields[1]:
+                        ports.add(int(fields[1].rsplit(':', 1)[1], 16))
+        except (OSError, ValueError):
+            continue
+    return ports
+
+class Link:
+    """
+    A libvirt tunnel between two interfaces of the inventory. `right` is None for interfaces which
+    are not connected to anything. `name` is used in messages.
+    """
+    __slots__ = ('net_number', 'left', 'right', 'name')
+
+    def __init__(self, net_number, left, right=None, name=None):
+        self.net_number = net_number
+        self.left = left
+        self.right = right
+        self.name = name or 'net%s' % net_number
+
+def tunnel_ips(links):
+    """ Returns the addresses of every tunnel IP used by the links """
+    addresses = set()
+    for link in links:
+        for intf in (link.left, link.right):
+            for key in ('local_ip', 'remote_ip'):
+                try:
+                    addresses.add(ipaddress.ip_address(intf[key]))
+                except (TypeError, KeyError, ValueError):
+                    continue
+    return addresses
+
+def lane_ips(links, lanes):
+    """
+    Returns the tunnel IPs of the additional lanes. They are the loopback addresses following the
+    highest loopback tunnel IP of the links which are not a tunnel IP of any device, so that the
+    ports of a lane never collide with the ports of other lanes or devices.
+
+    Arguments:
+    links (list) - Links of the topology (before their lanes are applied)
+    lanes (int) - Number of additional lanes
+
+    Raises TcError if the loopback range is exhausted
+    """
+    used = tunnel_ips(links)
+    loopbacks = [address for address in used if address.is_loopback and address.version == 4]
+    address = max(loopbacks, default=ipaddress.ip_address('127.0.0.1'))
+    addresses = []
+    while len(addresses) < lanes:
+        address += 1
+        if not address.is_loopback:
+            raise tc_error.TcError('The loopback range is exhausted, no tunnel IPs are left for '
+                                   'the links which do not fit on one IP address.',
+                                   print_on_create=False)
+        if address not in used:
+            addresses.append(str(address))
+    return addresses
+
+def check_lane_base(base_ip):
+    """
+    Checks that a link whose tunnel IP is base_ip can be moved to another loopback address
+
+    Raises TcError if the base IP is not a loopback address, since only loopback addresses can be
+    added without changing the hypervisor's configuration
+    """
+    try:
+        loopback = ipaddress.ip_address(base_ip).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        msg = 'The UDP port space on tunnel IP %s is exhausted. Use a loopback tunnel_ip so that ' \
+              'links can be spread across several loopback addresses, or a lower --start-port.' \
+              % base_ip
+        raise tc_error.TcError(msg, print_on_create=False)
+
+class PortPlanner:
+    """
+    Assigns local_port/remote_port/local_ip/remote_ip to every link endpoint
+    """
+    def __init__(self, start_port, port_gap, used_ports=None, offset=TEMPLATE_PORT_OFFSET):
+        self.start_port = start_port
+        self.port_gap = port_gap
+        self.used_ports = used_ports or set()
+        self.offset = offset
+
+    def max_gap(self):
+        """ Returns the largest gap for which both port ranges fit below MAX_PORT """
+        return (MAX_PORT - self.offset - self.start_port) // 2
+
+    def is_free(self, slot, gap):
+        """ Checks that both ports of a slot are unused on the host """
+        return self.start_port + slot + self.offset not in self.used_ports and \
+            self.start_port + gap + slot + self.offset not in self.used_ports
+
+    def assign(self, links, gap, lanes=False):
+        """
+        Assigns a (lane, slot) to every link. Links keep their network number as slot. Only a link
+        whose own slot has a port in use is moved, to the next free slot above the highest network
+        number, so that the other links keep their ports. Without lanes every link is placed on the
+        first lane, even if its slot exceeds the gap. With lanes the links whose slot exceeds the
+        gap are placed on additional lanes.
+
+        Returns:
+        list - (lane, slot) for every link
+        """
+        plan = []
+        taken = set()
+        spare = max((link.net_number for link in links), default=0)
+        for link in links:
+            slot = link.net_number
+            if slot in taken or not self.is_free(slot, gap):
+                spare += 1
+                while spare in taken or not self.is_free(spare, gap):
+                    spare += 1
+                slot = spare
+            taken.add(slot)
+            plan.append((0, slot))
+
+        if lanes:
+            lane, slot = 1, 0
+            for index, (_, planned) in enumerate(plan):
+                if planned <= gap:
+                    continue
+                slot += 1
+                while not self.is_free(slot, gap):
+                    slot += 1
+                if slot > gap:
+                    lane, slot = lane + 1, 1
+                    while not self.is_free(slot, gap):
+                        slot += 1
+                plan[index] = (lane, slot)
+        return plan
+
+    def plan(self, links):
+        """
+        Finds the smallest port gap (not below the configured gap) which fits every link on one
+        IP address, falling back to several loopback addresses when no gap is big enough. The gap
+        is reduced when the configured one would push ports past MAX_PORT.
+
+        Returns:
+        tuple - (gap, plan)
+        """
+        gap = min(self.port_gap, self.max_gap())
+        while True:
+            plan = self.assign(links, gap)
+            needed = max((slot for _, slot in plan), default=0)
+            if needed <= gap:
+                return gap, plan
+            if needed > self.max_gap():
+                break
+            gap = needed
+
+        gap = self.max_gap()
+        return gap, self.assign(links, gap, lanes=True)
+
+    def apply(self, links, gap, plan):
+        """ Writes the planned ports and IPs to the interfaces of every link """
+        addresses = lane_ips(links, max((lane for lane, _ in plan), default=0))
+        for link, (lane, slot) in zip(links, plan):
+            port_a = str(self.start_port + slot)
+            port_b = str(self.start_port + gap + slot)
+            link.left['local_port'] = port_a
+            link.left['remote_port'] = port_b
+            if link.right is not None:
+                link.right['local_port'] = port_b
+                link.right['remote_port'] = port_a
+            if lane:
+                check_lane_base(link.left['local_ip'])
+                tunnel_ip = addresses[lane - 1]
+                for intf in (link.left, link.right):
+                    if intf is not None:
+                        intf['local_ip'] = tunnel_ip
+                        intf['remote_ip'] = tunnel_ip
+
+def plan_ports(config):
+    """
+    Plans the ports of all libvirt links recorded in config.links. Updates config.port_gap when
+    the gap had to be grown to fit the topology.
+
+    Arguments:
+    config (TcConfig) - TcConfig instance
+
+    Raises TcError if the links cannot be placed
+    """
+    if config.network_ids is not None:
+        # Stable network IDs are the slots of the links and already skip the ports in use
+        used_ports = config.network_ids.used_ports
+        gap = config.network_ids.last
+        planner = PortPlanner(config.start_port, gap, used_ports)
+        plan = [(0, link.net_number) for link in config.links]
+    else:
+        used_ports = used_udp_ports(os.path.join(config.proc_root, 'net')) \
+            if config.probe_ports else set()
+        planner = PortPlanner(config.start_port, config.port_gap, used_ports)
+        gap, plan = planner.plan(config.links)
+    planner.apply(config.links, gap, plan)
+
+    moved = ['%s (%s -> %s)' % (link.name, link.net_number, slot)
+             for link, (lane, slot) in zip(config.links, plan)
+             if lane == 0 and slot != link.net_number]
+    if moved:
+        config.warnings.append(styles.WARNING + styles.BOLD +
+                               '    WARNING: Tunnel ports of %s links are in use on this host, '
+                               'moved them to other slots: %s' % (len(moved), ', '.join(moved)) +
+                               styles.ENDC)
+    lanes = max((lane for lane, _ in plan), default=0) + 1
+    if gap != config.port_gap:
+        config.warnings.append(styles.WARNING + styles.BOLD +
+                               '    WARNING: Port_Gap (%s) does not fit the links in the '
+                               'topology, using a port gap of %s instead.'
+                               % (config.port_gap, gap) + styles.ENDC)
+        config.port_gap = gap
+    if config.verbose > 1:
+        print('  INFO: planned %s libvirt links with a port gap of %s on %s tunnel IP(s), '
+              'skipping %s ports in use' % (len(config.links), gap, lanes, len(used_ports)))
+        for link in config.links:
+            print('    %s: %s:%s -- %s:%s' % (link.name, link.left['local_ip'],
+                                              link.left['local_port'], link.left['remote_ip'],
+                                              link.left['remote_port']))
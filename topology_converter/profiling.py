@@ -0,0 +1,171 @@
+"""
+Profiles conversions and exports their metrics.
+
+A profile holds the wall clock time, CPU time and peak traced memory of the whole conversion and of
+every phase (see PhaseTimer) and template, plus counters of what the conversion produced (nodes,
+edges, generated ports, automatically assigned MAC and IP addresses and warnings). Profiles are
+written as JSON and optionally as a Prometheus textfile for the node exporter's textfile collector.
+A cProfile of the conversion can be written in pstats format as well.
+"""
+
+import collections
+import contextlib
+import json
+import os
+import time
+import tracemalloc
+
+from .output import AtomicFile
+
+METRIC_PREFIX = 'topology_converter_'
+
+# Counters of a conversion, see TcConfig.counters
+COUNTERS = ('nodes', 'edges', 'generated_ports', 'auto_macs', 'auto_ips', 'warnings')
+
+class Profiler:
+    """
+    A context manager which measures a conversion. tracemalloc traces the memory while the
+    conversion runs (so that PhaseTimer records the memory peak of every phase) and, if
+    pstats_file is given, the conversion runs under cProfile.
+
+    After the exit `wall_seconds`, `cpu_seconds` and `peak_bytes` describe the whole conversion.
+    PhaseTimer resets the tracemalloc peak at every phase, so the peaks it saw are passed as
+    `timer`.
+    """
+    def __init__(self, pstats_file=None, timer=None):
+        self.pstats_file = pstats_file
+        self.timer = timer
+        self.profile = None
+        self.started_tracing = False
+        self.start = None
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.peak_bytes = 0
+
+    def __enter__(self):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        if self.pstats_file:
+            import cProfile # pylint: disable=import-outside-toplevel
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = (time.perf_counter(), time.process_time())
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.wall_seconds = time.perf_counter() - self.start[0]
+        self.cpu_seconds = time.process_time() - self.start[1]
+        if self.profile:
+            self.profile.disable()
+            self.profile.dump_stats(self.pstats_file)
+        self.peak_bytes = tracemalloc.get_traced_memory()[1]
+        if self.timer is not None:
+            self.peak_bytes = max(self.peak_bytes, self.timer.peak())
+        if self.started_tracing:
+            tracemalloc.stop()
+        return False
+
+def profile_data(config, profiler):
+    """
+    Collects the profile of a conversion
+
+    Arguments:
+    config (TcConfig) - TcConfig instance of the profiled conversion
+    profiler (Profiler) - Profiler which measured the conversion
+
+    Returns:
+    dict - JSON serializable profile
+    """
+    counters = collections.OrderedDict((name, config.counters.get(name, 0)) for name in COUNTERS)
+    counters['warnings'] = len(config.warnings)
+    return {'topology_file': config.topology_file,
+            'provider': config.provider,
+            'version': config.version,
+            'timestamp': time.time(),
+            'wall_seconds': profiler.wall_seconds,
+            'cpu_seconds': profiler.cpu_seconds,
+            'peak_bytes': profiler.peak_bytes,
+            'phases': config.timings.phases(),
+            'counters': counters}
+
+def prometheus_label(value):
+    """ Escapes a Prometheus label value """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus_text(profile):
+    """
+    Formats a profile in the Prometheus text exposition format
+
+    Arguments:
+    profile (dict) - Profile returned by profile_data()
+
+    Returns:
+    str - Metrics labelled with the topology (and phase)
+    """
+    topology = 'topology="%s"' % prometheus_label(profile['topology_file'])
+    lines = []
+
+    def metric(name, help_text, samples):
+        lines.append('# HELP %s%s %s' % (METRIC_PREFIX, name, help_text))
+        lines.append('# TYPE %s%s gauge' % (METRIC_PREFIX, name))
+        for labels, value in samples:
+            lines.append('%s%s{%s} %s' % (METRIC_PREFIX, name, labels, value))
+
+    metric('wall_seconds', 'Wall clock time of the conversion.',
+           [(topology, profile['wall_seconds'])])
+    metric('cpu_seconds', 'CPU time of the conversion.', [(topology, profile['cpu_seconds'])])
+    metric('peak_bytes', 'Peak memory allocated by the conversion.',
+           [(topology, profile['peak_bytes'])])
+
+    phases = profile['phases']
+    phase_labels = {name: '%s,phase="%s"' % (topology, prometheus_label(name)) for name in phases}
+    metric('phase_wall_seconds', 'Wall clock time of a phase of the conversion.',
+           [(phase_labels[name], phase['wall_seconds']) for name, phase in phases.items()])
+    metric('phase_cpu_seconds', 'CPU time of a phase of the conversion.',
+           [(phase_labels[name], phase['cpu_seconds']) for name, phase in phases.items()])
+    metric('phase_peak_bytes', 'Peak memory allocated during a phase of the conversion.',
+           [(phase_labels[name], phase['peak_bytes']) for name, phase in phases.items()
+            if 'peak_bytes' in phase])
+
+    for name, value in profile['counters'].items():
+        metric(name, 'Number of %s of the conversion.' % name.replace('_', ' '),
+               [(topology, value)])
+    metric('last_run_timestamp_seconds', 'Time the conversion finished.',
+           [(topology, profile['timestamp'])])
+    return '\n'.join(lines) + '\n'
+
+def write_profile(profile, json_file=None, prometheus_file=None):
+    """
+    Writes a profile. Both files are replaced atomically, as the textfile collector requires.
+
+    Arguments:
+    profile (dict) - Profile returned by profile_data()
+    json_file [str] - Path of the JSON profile
+    prometheus_file [str] - Path of the Prometheus textfile
+    """
+    if json_file:
+        with AtomicFile(json_file) as outfile:
+            json.dump(profile, outfile, indent=2)
+            outfile.write('\n')
+    if prometheus_file:
+        with AtomicFile(prometheus_file) as outfile:
+            outfile.write(prometheus_text(profile))
+
+@contextlib.contextmanager
+def profiled(config):
+    """
+    Profiles the conversion run in the with block if the config asks for a profile
+    (config.profile, config.profile_prometheus or config.profile_pstats) and writes the profile
+    when the block completes
+    """
+    if not (config.profile or config.profile_prometheus or config.profile_pstats):
+        yield
+        return
+
+    for path in (config.profile, config.profile_prometheus, config.profile_pstats):
+        if path and os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+    with Profiler(config.profile_pstats, config.timings) as profiler:
+        yield
+    write_profile(profile_data(config, profiler), config.profile, config.profile_prometheus)
@@ -5,16 +5,140 @@ Renderer module
 # pylint: disable=too-many-branches,too-many-locals,too-many-return-statements
 
 
+import concurrent.futures
+import functools
+import hashlib
+import json
 import os
-import pprint
 import re
 import time
 
 import jinja2
+import jinja2.meta
 
+from .model import json_default, plain
+from .output import AtomicFile, OutputWriter, file_digest, output_path
 from .styles import styles
+from .tc_config import pinned_epoch_time
 from .tc_error import RenderError
 
+# TcConfig attributes which are not passed to templates
+UNRENDERED_CONFIG = ('counters', 'links', 'mac_allocator', 'output', 'parser', 'timings',
+                     'warnings')
+
+# Size of the write buffer used when streaming rendered templates to disk
+STREAM_BUFFER_SIZE = 256 * 1024
+
+# Template holding the definition of a single VM, included by Vagrantfile.j2
+FRAGMENT_TEMPLATE = 'vagrant_device.j2'
+
+# Globals which the fragment template only tests with "is defined", so that their value does not
+# invalidate the fragments
+FRAGMENT_DEFINED_GLOBALS = ('function_group',)
+
+# First line of every VM fragment
+FRAGMENT_HEADER = '# Topology Converter VM fragment (inputs: %s)\n'
+
+# Bridge configuration of the oob switches of the mgmt network
+MGMT_BRIDGE_TEMPLATE = 'bridge-untagged.j2'
+
+# Environments are shared by every Renderer using the same template storage and bytecode cache
+ENVIRONMENTS = {}
+
+def default_template_cache_dir():
+    """ Returns the default location of the compiled template cache """
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'),
+                                                                  '.cache')
+    return os.path.join(cache_home, 'topology_converter', 'jinja2')
+
+def get_environment(template_storage, template_cache_dir=None):
+    """
+    Returns the Jinja2 Environment for a template storage directory. Templates are loaded from the
+    template storage directory or, for extra templates, by their absolute path. Compiled templates
+    are kept in a bytecode cache on disk so they are only compiled again when their source changes.
+
+    Arguments:
+    template_storage (str) - Directory holding the bundled templates
+    template_cache_dir [str] - Directory for compiled templates (default is under ~/.cache)
+
+    Returns:
+    jinja2.Environment
+    """
+    template_storage = os.path.abspath(template_storage)
+    template_cache_dir = template_cache_dir or default_template_cache_dir()
+    key = (template_storage, template_cache_dir)
+    if key not in ENVIRONMENTS:
+        try:
+            os.makedirs(template_cache_dir, exist_ok=True)
+            bytecode_cache = jinja2.FileSystemBytecodeCache(template_cache_dir)
+        except OSError:
+            bytecode_cache = None
+        loader = jinja2.FileSystemLoader([template_storage, os.sep])
+        ENVIRONMENTS[key] = jinja2.Environment(loader=loader, bytecode_cache=bytecode_cache)
+    return ENVIRONMENTS[key]
+
+def render_job(template_storage, template_cache_dir, templatefile, context, destination=None):
+    """
+    Renders a template with a prepared context. Runs in render worker processes, so it only uses
+    its (picklable) arguments. When a destination is given the output is streamed to that file in
+    chunks instead of being built as one string.
+
+    Returns:
+    tuple - (rendered template, None), ((sha256, changed), None) when streamed or
+            (None, error message)
+    """
+    environment = get_environment(template_storage, template_cache_dir)
+    try:
+        template = environment.get_template(template_name(template_storage, templatefile))
+        if destination is None:
+            return template.render(**context), None
+        atomic = AtomicFile(destination, buffering=STREAM_BUFFER_SIZE)
+        with atomic as outfile:
+            template.stream(**context).dump(outfile)
+        return (atomic.digest, atomic.changed), None
+    except jinja2.TemplateError as err:
+        return None, 'ERROR: Could not render %s: %s' % (templatefile, err)
+
+def collect_render(result):
+    """ Returns the rendered template of a render_job() result, raising RenderError on errors """
+    rendered_template, error = result()
+    if error:
+        raise RenderError(error, print_on_create=False)
+    return rendered_template
+
+def fragment_hash(source, device, fragment_globals):
+    """ Hashes everything a VM fragment is rendered from """
+    digest = hashlib.sha256(source.encode('utf-8'))
+    for data in (device, fragment_globals):
+        digest.update(json.dumps(data, sort_keys=True, default=json_default).encode('utf-8'))
+    return digest.hexdigest()
+
+def template_name(template_storage, templatefile):
+    """ Returns the loader name of a template file (see get_environment()) """
+    template_storage = os.path.abspath(template_storage)
+    templatefile = os.path.abspath(templatefile)
+    if templatefile.startswith(template_storage + os.sep):
+        return os.path.relpath(templatefile, template_storage).replace(os.sep, '/')
+    return templatefile.lstrip(os.sep).replace(os.sep, '/')
+
+def warm_template_cache(template_storage, template_cache_dir=None):
+    """
+    Compiles every bundled template into the bytecode cache, ie. at install time
+
+    Arguments:
+    template_storage (str) - Directory holding the bundled templates
+    template_cache_dir [str] - Directory for compiled templates
+
+    Returns:
+    list - Names of the compiled templates
+    """
+    environment = get_environment(template_storage, template_cache_dir)
+    names = jinja2.FileSystemLoader(os.path.abspath(template_storage)).list_templates()
+    names = [name for name in names if name.endswith('.j2')]
+    for name in names:
+        environment.get_template(name)
+    return names
+
 class Renderer:
     """
     Provides methods for rendering Jinja2 templates
@@ -22,13 +146,25 @@ class Renderer:
     def __init__(self, config):
         self.config = config
         vagrantfile_template = self.config.template_storage + '/Vagrantfile.j2'
-        self.config.templates = [[vagrantfile_template, 'Vagrantfile']]
-        self.epoch_time = str(int(time.time()))
+        self.config.templates = [[vagrantfile_template, output_path(self.config, 'Vagrantfile')]]
+        self.config.templates += [[templatefile, output_path(self.config, destination)]
+                                  for templatefile, destination in self.config.extra_templates]
+        self.environment = get_environment(self.config.template_storage,
+                                           self.config.template_cache_dir)
+        if self.config.output is None:
+            self.config.output = OutputWriter(self.config.verbose)
+        if self.config.reproducible:
+            self.epoch_time = pinned_epoch_time(self.config)
+        else:
+            self.epoch_time = str(int(time.time()))
+        self.fragment_files = []
 
     def print_datastructures(self, devices, config):
         """
         Prints the renderer's config datastructures
         """
+        import pprint # pylint: disable=import-outside-toplevel
+
         pp = pprint.PrettyPrinter(depth=6) # pylint: disable=invalid-name
         print('\n\n######################################')
         print('   DATASTRUCTURES SENT TO TEMPLATE:')
@@ -47,19 +183,24 @@ class Renderer:
         print('network_functions=')
         pp.pprint(config.network_functions)
         print('devices=')
-        pp.pprint(devices)
+        pp.pprint(plain(devices))
 
-    def render_jinja_templates(self, devices, write_files=True): # pylint: disable=inconsistent-return-statements
+    def render_jinja_templates(self, devices, write_files=True, keep_rendered=False): # pylint: disable=inconsistent-return-statements
         """
         Renders Jinja2 templates. Some templates require the devices list to be in a certain order.
         Therefore, you should build the device list via Renderer.populate_data_structures()
 
+        When writing files the output is streamed to disk and not kept in memory, unless
+        keep_rendered is set.
+
         Arguments:
         devices (list) - List of devices
         write_files [bool] - If True, the rendered templates will also be written to disk
+        keep_rendered [bool] - If True, the rendered templates are also returned when writing files
 
         Returns:
-        dict - Rendered templates in the form of {<template_file>: <rendered_template>}
+        dict - Rendered templates in the form of {<template_file>: <rendered_template>}. Empty
+               when the templates were only streamed to disk
 
         Raises tc_error.RenderError if any error occurs
         """
@@ -81,7 +222,7 @@ class Renderer:
             # Scan MGMT Template Dir for .j2 files
             mgmt_templates = []
 
-            for file in os.listdir(mgmt_template_dir):
+            for file in sorted(os.listdir(mgmt_template_dir)):
 
                 if file.endswith('.j2'):
                     mgmt_templates.append(file)
@@ -92,20 +233,26 @@ class Renderer:
                 print(mgmt_templates)
 
             # Create output location for MGMT template files
-            if write_files and not os.path.isdir(self.config.mgmt_destination_dir):
+            mgmt_destination_dir = output_path(self.config, self.config.mgmt_destination_dir)
+            if write_files and not os.path.isdir(mgmt_destination_dir):
                 if self.config.verbose > 2:
                     print('Making Directory for MGMT Helper Files: ' + \
-                          self.config.mgmt_destination_dir)
+                          mgmt_destination_dir)
 
                 try:
-                    os.makedirs(self.config.mgmt_destination_dir)
+                    os.makedirs(mgmt_destination_dir)
                 except:
                     raise RenderError('ERROR: Could not create output directory for mgmt ' + \
                                       'template renders!')
 
-            # Render out the templates
+            # Render out the templates. The oob switches of a two-tier mgmt network get a bridge
+            # configuration each, see render_mgmt_bridges()
+            if MGMT_BRIDGE_TEMPLATE in mgmt_templates and \
+                    any('mgmt_bridge_file' in device for device in devices):
+                mgmt_templates.remove(MGMT_BRIDGE_TEMPLATE)
+
             for template in mgmt_templates:
-                render_destination = os.path.join(self.config.mgmt_destination_dir, template[0:-3])
+                render_destination = os.path.join(mgmt_destination_dir, template[0:-3])
                 template_source = os.path.join(mgmt_template_dir, template)
                 self.config.templates.append([template_source, render_destination])
 
@@ -113,34 +260,242 @@ class Renderer:
         if self.config.create_mgmt_device and self.config.create_mgmt_configs_only:
             del self.config.templates[0]
 
+        context = self.template_context(devices)
+
+        # Render the VM fragments loaded by the Vagrantfile
+        if self.config.fragments_dir and write_files and not self.config.create_mgmt_configs_only:
+            with self.config.timings.phase('render:fragments'):
+                self.render_fragments(devices, context)
+
+        # Render the Templates
+        templatefiles = [templatefile for templatefile, _ in self.config.templates]
+        if self.config.verbose > 2:
+            for templatefile, destination in self.config.templates:
+                print('    Rendering: ' + templatefile + ' --> ' + destination)
+
+        if write_files and not keep_rendered:
+            destinations = [destination for _, destination in self.config.templates]
+            self.render_templates(templatefiles, devices, destinations, context)
+            return {}
+
+        rendered_templates = {}
+        renders = self.render_templates(templatefiles, devices, context=context)
+        for (templatefile, destination), rendered_template in zip(self.config.templates, renders):
+            rendered_templates[templatefile] = rendered_template
+            if write_files:
+                self.config.output.write(destination, rendered_template)
+        return rendered_templates
+
+    def template_context(self, devices):
+        """
+        Builds the variables passed to every template
+
+        Arguments:
+        devices (list) - List of devices
+
+        Returns:
+        dict - Template variables. Only picklable values are included so the context can be sent
+               to render workers
+        """
         # Use Prefix as customer name if available
         if self.config.prefix:
             customer = self.config.prefix
         else:
             customer = os.path.basename(os.path.dirname(os.getcwd()))
-        generate_ansible_hostfile = self.config.ansible_hostfile
 
-        # Render the Templates
-        rendered_templates = {}
-        for templatefile, destination in self.config.templates:
+        context = {key: value for key, value in self.config.__dict__.items()
+                   if key not in UNRENDERED_CONFIG}
+        context.update(devices=devices,
+                       customer=customer,
+                       epoch_time=self.epoch_time,
+                       generate_ansible_hostfile=self.config.ansible_hostfile,
+                       libvirt_prefix=self.config.prefix)
+        return context
+
+    def render_templates(self, templatefiles, devices, destinations=None, context=None):
+        """
+        Renders templates with the same devices, in a pool of config.render_workers processes if
+        more than one worker is configured
+
+        Arguments:
+        templatefiles (list) - Paths to the templates
+        devices (list) - List of devices
+        destinations [list] - Files to stream each rendered template to, in the order of
+                              templatefiles. If not given the templates are rendered to strings
+        context [dict] - Template variables (default is template_context(devices))
+
+        Returns:
+        list - Rendered templates (None for streamed templates) in the order of templatefiles.
+               Streamed templates are recorded in config.output
+
+        Raises RenderError for the first template (in order) that fails to render
+        """
+        context = context or self.template_context(devices)
+        destinations = destinations or [None] * len(templatefiles)
+        jobs = [(self.config.template_storage, self.config.template_cache_dir, templatefile,
+                 context, destination)
+                for templatefile, destination in zip(templatefiles, destinations)]
+
+        timings = self.config.timings
+        workers = self.config.render_workers or os.cpu_count() or 1
+        if workers > 1 and len(jobs) > 1:
+            # The templates render concurrently, so only the whole pool can be timed
+            with timings.phase('render'), \
+                 concurrent.futures.ProcessPoolExecutor(min(workers, len(jobs))) as pool:
+                futures = [pool.submit(render_job, *job) for job in jobs]
+                results = [collect_render(future.result) for future in futures]
+        else:
+            results = []
+            for job in jobs:
+                with timings.phase('render:' + os.path.basename(job[2])):
+                    results.append(collect_render(functools.partial(render_job, *job)))
+
+        for destination, result in zip(destinations, results):
+            if destination is not None:
+                self.config.output.record(destination, *result)
+        return [None if destination else result for destination, result in
+                zip(destinations, results)]
+
+    def render_template(self, templatefile, devices):
+        """
+        Renders a single Jinja2 template
+
+        Arguments:
+        templatefile (str) - Path to the template
+        devices (list) - List of devices
+
+        Returns:
+        str - Rendered template
+
+        Raises RenderError if the template cannot be rendered
+        """
+        return self.render_templates([templatefile], devices)[0]
+
+    def render_fragments(self, devices, context):
+        """
+        Renders the definition of every VM to its own Ruby fragment in config.fragments_dir. A
+        fragment starts with a hash of everything it is rendered from and is only rendered and
+        written again when that hash changes. Fragments of devices which no longer exist are
+        removed.
+
+        Arguments:
+        devices (list) - List of devices
+        context (dict) - Template variables
+
+        Returns:
+        list - Paths of all fragments
+
+        Raises RenderError if a fragment cannot be rendered
+        """
+        fragments_dir = output_path(self.config, self.config.fragments_dir)
+        try:
+            os.makedirs(fragments_dir, exist_ok=True)
+        except OSError:
+            raise RenderError('ERROR: Could not create output directory %s for the VM fragments!'
+                              % fragments_dir, print_on_create=False)
+
+        source, _, _ = self.environment.loader.get_source(self.environment, FRAGMENT_TEMPLATE)
+        template = self.environment.get_template(FRAGMENT_TEMPLATE)
+        variables = sorted(jinja2.meta.find_undeclared_variables(self.environment.parse(source)))
+        fragment_globals = {name: name in context if name in FRAGMENT_DEFINED_GLOBALS else
+                            context.get(name) for name in variables if name != 'device'}
+
+        self.fragment_files = []
+        rendered = 0
+        for device in devices:
+            fragment = os.path.join(fragments_dir, device['hostname'] + '.rb')
+            self.fragment_files.append(fragment)
+            header = FRAGMENT_HEADER % fragment_hash(source, device, fragment_globals)
+            try:
+                with open(fragment, 'r') as existing:
+                    if existing.readline() == header:
+                        self.config.output.record(fragment, file_digest(fragment), False)
+                        continue
+            except OSError:
+                pass
+
+            try:
+                rendered_fragment = template.render(context, device=device)
+            except jinja2.TemplateError as err:
+                raise RenderError('ERROR: Could not render the VM fragment of %s: %s'
+                                  % (device['hostname'], err), print_on_create=False)
+            self.config.output.write(fragment, header + rendered_fragment + '\n')
+            rendered += 1
+
+        for file in os.listdir(fragments_dir):
+            path = os.path.join(fragments_dir, file)
+            if file.endswith('.rb') and path not in self.fragment_files:
+                with open(path, 'r') as stale:
+                    is_fragment = stale.readline().startswith(FRAGMENT_HEADER.split('%')[0])
+                if is_fragment:
+                    os.remove(path)
+
+        if self.config.verbose > 1:
+            print('  INFO: rendered %s of %s VM fragments' % (rendered, len(devices)))
+        return self.fragment_files
+
+    def render_shards(self, devices, write_files=True):
+        """
+        Renders one Vagrantfile per hypervisor in config.shard_map, containing only the devices
+        placed on that hypervisor
 
+        Arguments:
+        devices (list) - List of devices
+        write_files [bool] - If True, the Vagrantfiles are streamed to disk instead of returned
+
+        Returns:
+        dict - Rendered Vagrantfiles in the form of {<destination>: <rendered_template>}. The
+               rendered template is None when it was streamed to disk
+        """
+        rendered_shards = {}
+        if self.config.create_mgmt_configs_only:
+            return rendered_shards
+
+        vagrantfile_template = self.config.template_storage + '/Vagrantfile.j2'
+        for host_ip, hostnames in self.config.shard_map.items():
+            destination = output_path(self.config, 'Vagrantfile-%s' % host_ip)
             if self.config.verbose > 2:
-                print('    Rendering: ' + templatefile + ' --> ' + destination)
+                print('    Rendering: ' + vagrantfile_template + ' --> ' + destination)
 
-            template = jinja2.Template(open(templatefile).read())
+            shard_devices = [device for device in devices if device['hostname'] in hostnames]
+            rendered_shards[destination] = self.render_templates(
+                [vagrantfile_template], shard_devices,
+                [destination] if write_files else None)[0]
+        return rendered_shards
 
-            rendered_template = template.render(devices=devices,
-                                                customer=customer,
-                                                epoch_time=self.epoch_time,
-                                                generate_ansible_hostfile=generate_ansible_hostfile,
-                                                libvirt_prefix=self.config.prefix,
-                                                **self.config.__dict__)
+    def render_mgmt_bridges(self, devices, write_files=True):
+        """
+        Renders the bridge configuration of every oob switch of a two-tier mgmt network to its own
+        file (the mgmt_bridge_file of the device), as the bridge template describes one switch
 
-            rendered_templates[templatefile] = rendered_template
-            if write_files:
-                with open(destination, 'w') as outfile:
-                    outfile.write(rendered_template)
-        return rendered_templates
+        Arguments:
+        devices (list) - List of devices
+        write_files [bool] - If True, the bridge configurations are streamed to disk instead of
+                             returned
+
+        Returns:
+        dict - Rendered bridge configurations in the form of {<destination>: <rendered_template>}.
+               The rendered template is None when it was streamed to disk
+        """
+        rendered_bridges = {}
+        if not self.config.create_mgmt_device:
+            return rendered_bridges
+
+        bridge_template = os.path.join(self.config.template_storage, 'auto_mgmt_network',
+                                       MGMT_BRIDGE_TEMPLATE)
+        mgmt_destination_dir = output_path(self.config, self.config.mgmt_destination_dir)
+        for device in devices:
+            if 'mgmt_bridge_file' not in device:
+                continue
+
+            destination = os.path.join(mgmt_destination_dir, device['mgmt_bridge_file'])
+            if self.config.verbose > 2:
+                print('    Rendering: ' + bridge_template + ' --> ' + destination)
+
+            # The template takes the mgmt subnet from the oob-server, the first device
+            rendered_bridges[destination] = self.render_templates(
+                [bridge_template], [devices[0], device], [destination] if write_files else None)[0]
+        return rendered_bridges
 
     def populate_data_structures(self, inventory):
         """
@@ -152,6 +507,11 @@ class Renderer:
         Returns
         list - List of a devices suitable for template parsing
         """
+        with self.config.timings.phase('populate'):
+            return self._populate_data_structures(inventory)
+
+    def _populate_data_structures(self, inventory):
+        """ Implements populate_data_structures() """
         devices = []
 
         for device in inventory:
@@ -161,6 +521,7 @@ class Renderer:
         devices_clean = self.clean_datastructure(devices)
 
         # Create Functional Group Map
+        self.config.function_group = {}
         for device in devices_clean:
 
             if device['function'] not in self.config.function_group:
@@ -193,7 +554,7 @@ class Renderer:
                 print('     code: ' + device['os'])
 
                 if 'memory' in device:
-                    print('     memory: ' + device['memory'])
+                    print('     memory: ' + str(device['memory']))
 
                 for attribute in device:
                     if attribute in ('memory', 'os', 'interfaces'):
@@ -205,7 +566,8 @@ class Renderer:
                     print('       LINK: ' + interface_entry['local_interface'])
                     for attribute in interface_entry:
                         if attribute != 'local_interface':
-                            print('               ' + attribute + ': ' + interface_entry[attribute])
+                            print('               ' + attribute + ': ' +
+                                  str(interface_entry[attribute]))
 
         # Remove Fake Devices
         indexes_to_remove = []
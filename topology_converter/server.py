@@ -0,0 +1,298 @@
+"""
+Serves conversions over HTTP on a local Unix socket or a loopback address.
+
+The server imports everything and compiles the templates once, then converts topologies in a
+bounded pool of worker processes forked from the warm server process. This avoids paying for
+interpreter start, imports and template compilation on every conversion.
+
+Requests:
+POST /convert - JSON body {"topology": "<DOT text>", "options": {...}, "format": "json" or "tar"}
+                Returns {"files": {...}, "warnings": [...], "summary": {...}} or, with the tar
+                format, a gzipped tarball of the generated files. Invalid requests, options and
+                topologies are answered with 400 and {"error": "..."}. When more conversions are
+                pending than the server accepts it answers with 503.
+GET /health   - Returns {"status": "ok", "workers": N}
+
+Usage:
+$ python3 ./topology_converter.py --serve /run/topology_converter.sock
+$ curl --unix-socket /run/topology_converter.sock -d @request.json http://localhost/convert
+"""
+# pylint: disable=print-function
+
+import concurrent.futures
+import http.client
+import http.server
+import io
+import ipaddress
+import json
+import os
+import re
+import signal
+import socket
+import socketserver
+import sys
+import tarfile
+import threading
+
+from .api import VERSION, convert
+from .renderer import warm_template_cache
+from .styles import styles
+from .tc_config import TcConfig
+from .tc_error import TcError
+
+# Options a request may set. Options which read or write files on the server are not accepted.
+REQUEST_OPTIONS = ('ansible_hostfile', 'create_mgmt_configs_only', 'create_mgmt_device',
+                   'create_mgmt_network', 'mac_pool', 'mgmt_dhcp_range', 'mgmt_fanout', 'port_gap',
+                   'prefix', 'probe_ports', 'provider', 'reproducible', 'shard', 'stable_ids',
+                   'start_port', 'synced_folder', 'tunnel_ip')
+
+# Largest request body that is accepted
+MAX_REQUEST_SIZE = 16 * 1024 * 1024
+
+# Conversions which may be pending per worker before requests are rejected
+PENDING_PER_WORKER = 4
+
+ANSI_RE = re.compile(r'\033\[[0-9;]*m')
+
+def parse_address(address):
+    """
+    Parses a server address
+
+    Arguments:
+    address (str) - Path of a Unix socket or HOST:PORT of a loopback address
+
+    Returns:
+    tuple - ('unix', path) or ('tcp', (host, port))
+
+    Raises TcError if a TCP address is not a loopback address
+    """
+    host, _, port = address.rpartition(':')
+    if os.sep in address or not host or not port.isdigit():
+        return 'unix', address
+
+    host = host.strip('[]')
+    try:
+        loopback = host == 'localhost' or ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        loopback = False
+    if not loopback:
+        raise TcError('The conversion server only listens on loopback addresses, not %s' % host,
+                      print_on_create=False)
+    return 'tcp', (host, int(port))
+
+def convert_request(topology, options):
+    """
+    Converts the topology of a request. Runs in the worker processes.
+
+    Returns:
+    tuple - (response, None) or (None, error message)
+    """
+    options = dict(options, arg_string='topology_converter --serve',
+                   version=VERSION)
+    try:
+        result = convert(topology, options)
+    except TcError as err:
+        return None, ANSI_RE.sub('', err.message)
+    files = {os.path.normpath(path): content for path, content in result.files.items()}
+    return {'files': files,
+            'warnings': [ANSI_RE.sub('', warning).strip() for warning in result.warnings],
+            'summary': result.summary()}, None
+
+def tarball(files):
+    """ Packs {path: content} into a gzipped tarball """
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:gz') as tar:
+        for path in sorted(files):
+            data = files[path].encode('utf-8')
+            info = tarfile.TarInfo(path)
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    return buffer.getvalue()
+
+class RequestHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handles conversion requests. The conversions run in the worker pool of the server.
+    """
+    server_version = 'TopologyConverter/' + VERSION
+
+    def address_string(self):
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args): # pylint: disable=redefined-builtin
+        if self.server.verbose > 0:
+            super().log_message(format, *args)
+
+    def send_json(self, status, data):
+        """ Sends a JSON response """
+        self.send_body(status, 'application/json', json.dumps(data).encode('utf-8'))
+
+    def send_body(self, status, content_type, body):
+        """ Sends a response """
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self): # pylint: disable=invalid-name
+        """ Answers health checks """
+        if self.path != '/health':
+            self.send_json(404, {'error': 'Not found'})
+            return
+        self.send_json(200, {'status': 'ok', 'workers': self.server.workers})
+
+    def do_POST(self): # pylint: disable=invalid-name
+        """ Converts a topology """
+        if self.path != '/convert':
+            self.send_json(404, {'error': 'Not found'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            length = -1
+        if length < 0 or length > MAX_REQUEST_SIZE:
+            self.send_json(400, {'error': 'Request body must be at most %s bytes'
+                                          % MAX_REQUEST_SIZE})
+            return
+
+        try:
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            topology = request['topology']
+            options = request.get('options', {})
+            response_format = request.get('format', 'json')
+            if not isinstance(topology, str) or '{' not in topology:
+                raise ValueError('"topology" must be a topology in DOT format')
+            unknown = sorted(set(options) - set(REQUEST_OPTIONS))
+            if unknown:
+                raise ValueError('Unsupported options: %s' % ', '.join(unknown))
+            if response_format not in ('json', 'tar'):
+                raise ValueError('"format" must be "json" or "tar"')
+        except (ValueError, KeyError, TypeError, AttributeError) as err:
+            self.send_json(400, {'error': 'Invalid request: %s' % err})
+            return
+
+        if not self.server.pending.acquire(blocking=False):
+            self.send_json(503, {'error': 'Too many pending conversions'})
+            return
+        try:
+            response, error = self.server.pool.submit(convert_request, topology, options).result()
+        except Exception as err: # pylint: disable=broad-except
+            self.send_json(500, {'error': 'Conversion failed: %s' % err})
+            return
+        finally:
+            self.server.pending.release()
+
+        if error:
+            self.send_json(400, {'error': error})
+        elif response_format == 'tar':
+            self.send_body(200, 'application/gzip', tarball(response['files']))
+        else:
+            self.send_json(200, response)
+
+class LoopbackHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    """ Threaded HTTP server on a loopback address """
+    daemon_threads = True
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """ Threaded HTTP server on a Unix socket """
+    daemon_threads = True
+
+class ConversionServer:
+    """
+    An HTTP server which converts topologies in a pool of `workers` processes (0 uses one worker
+    per CPU)
+    """
+    def __init__(self, address, workers=0, verbose=0):
+        self.address = address
+        self.family, bind_address = parse_address(address)
+        self.workers = workers or os.cpu_count() or 1
+
+        # Compile the templates before the workers are forked so that every worker starts warm
+        config = TcConfig()
+        warm_template_cache(config.template_storage, config.template_cache_dir)
+        self.pool = concurrent.futures.ProcessPoolExecutor(self.workers)
+
+        if self.family == 'unix':
+            if os.path.exists(bind_address):
+                os.remove(bind_address)
+            self.httpd = UnixHTTPServer(bind_address, RequestHandler)
+        else:
+            self.httpd = LoopbackHTTPServer(bind_address, RequestHandler)
+        self.httpd.pool = self.pool
+        self.httpd.workers = self.workers
+        self.httpd.verbose = verbose
+        self.httpd.pending = threading.BoundedSemaphore(self.workers * PENDING_PER_WORKER)
+
+    def serve_forever(self):
+        """ Handles requests until shutdown() is called or the process is interrupted """
+        try:
+            self.httpd.serve_forever()
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        finally:
+            self.close()
+
+    def shutdown(self):
+        """ Stops serve_forever() from another thread """
+        self.httpd.shutdown()
+
+    def close(self):
+        """ Releases the socket and the worker pool """
+        self.httpd.server_close()
+        self.pool.shutdown()
+        if self.family == 'unix' and os.path.exists(self.address):
+            os.remove(self.address)
+
+def serve(address, workers=0, verbose=0):
+    """
+    Runs a conversion server until it is interrupted
+
+    Raises TcError if the address is not valid
+    """
+    server = ConversionServer(address, workers, verbose)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    print(styles.GREEN + styles.BOLD + '\n    Serving conversions on %s with %s workers.'
+          % (address, server.workers) + styles.ENDC)
+    server.serve_forever()
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """ An HTTPConnection to a server on a Unix socket """
+    def __init__(self, path, timeout=None):
+        super().__init__('localhost', timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+def request(address, method='GET', path='/health', payload=None, timeout=None):
+    """
+    Sends a request to a conversion server
+
+    Arguments:
+    address (str) - Address the server listens on
+    method [str] - HTTP method
+    path [str] - Request path
+    payload [dict] - JSON body of the request
+    timeout [float] - Socket timeout in seconds
+
+    Returns:
+    tuple - (status, content type, body bytes)
+    """
+    family, bind_address = parse_address(address)
+    if family == 'unix':
+        connection = UnixHTTPConnection(bind_address, timeout)
+    else:
+        connection = http.client.HTTPConnection(*bind_address, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode('utf-8') if payload is not None else None
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, body, headers)
+        response = connection.getresponse()
+        return response.status, response.getheader('Content-Type'), response.read()
+    finally:
+        connection.close()
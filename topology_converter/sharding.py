@@ -0,0 +1,266 @@
+"""
+Splits a libvirt topology across several hypervisors.
+
+Devices are placed on hosts so that every host stays within its memory and CPU budget while as few
+links as possible cross between hosts. Placement is a greedy breadth-first fill followed by a
+Fiduccia-Mattheyses style refinement which moves (or swaps) devices between hosts as long as that
+reduces the number of cross-host links.
+"""
+# pylint: disable=print-function,too-few-public-methods
+
+import collections
+import ipaddress
+
+from . import tc_error
+
+# vCPUs given to a device which does not set the cpu attribute
+DEFAULT_CPUS = 1
+
+# Hosts without a memory budget get an equal share of the topology's memory plus this headroom
+BALANCE_HEADROOM = 1.1
+
+MAX_REFINEMENT_PASSES = 10
+
+class Host:
+    """ A hypervisor and its memory (MB) and CPU budgets. A budget of None is unlimited """
+    def __init__(self, ip, memory=None, cpus=None):
+        self.ip = ip
+        self.memory = memory
+        self.cpus = cpus
+        self.used_memory = 0
+        self.used_cpus = 0
+
+    def fits(self, memory, cpus):
+        """ Checks whether a device with the given demand still fits on the host """
+        return (self.memory is None or self.used_memory + memory <= self.memory) and \
+            (self.cpus is None or self.used_cpus + cpus <= self.cpus)
+
+    def add(self, memory, cpus):
+        """ Accounts for a device placed on the host """
+        self.used_memory += memory
+        self.used_cpus += cpus
+
+def parse_host(spec):
+    """
+    Parses a host specification of the form HOST_IP[:MEMORY[:CPUS]]
+
+    Arguments:
+    spec (str) - ie. '10.0.0.1:65536:32'
+
+    Returns:
+    Host
+
+    Raises TcError if the specification is not valid
+    """
+    fields = spec.split(':')
+    try:
+        ip = str(ipaddress.ip_address(fields[0]))
+        memory = int(fields[1]) if len(fields) > 1 and fields[1] else None
+        cpus = int(fields[2]) if len(fields) > 2 and fields[2] else None
+        if len(fields) > 3:
+            raise ValueError('too many fields')
+    except ValueError as err:
+        raise tc_error.TcError('Invalid shard "%s" (expected HOST_IP[:MEMORY[:CPUS]]): %s'
+                               % (spec, err), print_on_create=False)
+    return Host(ip, memory, cpus)
+
+def device_demand(device):
+    """ Returns the (memory, cpus) needed by a device of the inventory """
+    try:
+        memory = int(device.get('memory', 0))
+        cpus = int(device.get('cpu', DEFAULT_CPUS))
+    except ValueError:
+        memory, cpus = 0, DEFAULT_CPUS
+    return memory, cpus
+
+def link_weights(inventory, devices):
+    """
+    Counts the links between every pair of devices
+
+    Returns:
+    dict - {device: Counter({neighbour: number_of_links})}
+    """
+    weights = {device: collections.Counter() for device in devices}
+    for device in devices:
+        for interface in inventory[device]['interfaces'].values():
+            remote = interface.get('remote_device')
+            if remote in weights and remote != device:
+                weights[device][remote] += 1
+    return weights
+
+def placement_order(devices, weights):
+    """ Orders devices breadth-first, starting with the best connected device of each component """
+    order = []
+    seen = set()
+    for start in sorted(devices, key=lambda device: -sum(weights[device].values())):
+        if start in seen:
+            continue
+        seen.add(start)
+        queue = collections.deque([start])
+        while queue:
+            device = queue.popleft()
+            order.append(device)
+            for neighbour, _ in weights[device].most_common():
+                if neighbour not in seen:
+                    seen.add(neighbour)
+                    queue.append(neighbour)
+    return order
+
+def cut_size(assignment, weights):
+    """ Returns the number of links between devices on different hosts """
+    return sum(count for device in weights for neighbour, count in weights[device].items()
+               if assignment[device] is not assignment[neighbour]) // 2
+
+def partition(inventory, hosts):
+    """
+    Places every device of the inventory on one of the hosts
+
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    hosts (list) - List of Host
+
+    Returns:
+    dict - {device: Host}
+
+    Raises TcError if a device does not fit on any host
+    """
+    devices = [device for device in inventory if inventory[device]['function'] != 'fake']
+    demand = {device: device_demand(inventory[device]) for device in devices}
+    weights = link_weights(inventory, devices)
+
+    total_memory = sum(memory for memory, _ in demand.values())
+    for host in hosts:
+        host.used_memory = host.used_cpus = 0
+        if host.memory is None:
+            host.memory = int(total_memory * BALANCE_HEADROOM / len(hosts)) + 1
+
+    # Greedy fill: keep each device with as many of its neighbours as possible
+    assignment = {}
+    for device in placement_order(devices, weights):
+        candidates = [host for host in hosts if host.fits(*demand[device])]
+        if not candidates:
+            memory, cpus = demand[device]
+            msg = 'Device %s (%s MB of memory, %s CPUs) does not fit on any of the shard hosts. ' \
+                  'Add hosts or increase their budgets.' % (device, memory, cpus)
+            raise tc_error.TcError(msg, print_on_create=False)
+
+        def affinity(host, device=device):
+            neighbours = sum(count for neighbour, count in weights[device].items()
+                             if assignment.get(neighbour) is host)
+            return (neighbours, host.used_memory > 0)
+        host = max(candidates, key=affinity)
+        host.add(*demand[device])
+        assignment[device] = host
+
+    refine(assignment, weights, demand, hosts)
+    return assignment
+
+def refine(assignment, weights, demand, hosts):
+    """
+    Moves and swaps devices between hosts while that reduces the number of cross-host links and
+    keeps every host within its budget. Mutates assignment.
+    """
+    def links_to(device, host):
+        return sum(count for neighbour, count in weights[device].items()
+                   if assignment[neighbour] is host)
+
+    for _ in range(MAX_REFINEMENT_PASSES):
+        improved = False
+        for device in weights:
+            source = assignment[device]
+            memory, cpus = demand[device]
+            for target in hosts:
+                if target is source:
+                    continue
+                if links_to(device, target) - links_to(device, source) <= 0:
+                    continue
+                if target.fits(memory, cpus):
+                    source.add(-memory, -cpus)
+                    target.add(memory, cpus)
+                    assignment[device] = target
+                    improved = True
+                    break
+                if swap(device, target, assignment, weights, demand, links_to):
+                    improved = True
+                    break
+        if not improved:
+            break
+
+def swap(device, target, assignment, weights, demand, links_to):
+    """ Swaps a device with a device on the target host if that reduces the cut """
+    source = assignment[device]
+    memory, cpus = demand[device]
+    device_gain = links_to(device, target) - links_to(device, source)
+    for other in weights:
+        if assignment[other] is not target:
+            continue
+        other_memory, other_cpus = demand[other]
+        gain = device_gain + links_to(other, source) - links_to(other, target) \
+            - 2 * weights[device][other]
+        if gain <= 0:
+            continue
+        source.add(other_memory - memory, other_cpus - cpus)
+        target.add(memory - other_memory, cpus - other_cpus)
+        if source.fits(0, 0) and target.fits(0, 0):
+            assignment[device], assignment[other] = target, source
+            return True
+        source.add(memory - other_memory, cpus - other_cpus)
+        target.add(other_memory - memory, other_cpus - cpus)
+    return False
+
+def apply_shards(inventory, assignment):
+    """
+    Rewrites the tunnel IPs of every device and link endpoint to the IP of the host the device
+    was placed on. This function mutates the provided inventory dict.
+    """
+    for device, host in assignment.items():
+        inventory[device]['tunnel_ip'] = host.ip
+
+    for device in assignment:
+        local_ip = inventory[device]['tunnel_ip']
+        for interface in inventory[device]['interfaces'].values():
+            if 'local_ip' not in interface:
+                continue
+            remote = interface.get('remote_device')
+            interface['local_ip'] = local_ip
+            if remote in inventory:
+                interface['remote_ip'] = inventory[remote]['tunnel_ip']
+            else:
+                interface['remote_ip'] = local_ip
+
+def shard_inventory(inventory, config):
+    """
+    Partitions the inventory across the hosts in config.shards and rewrites the tunnel endpoints
+
+    Arguments:
+    inventory (dict) - Dict of parsed inventory
+    config (TcConfig) - TcConfig instance
+
+    Returns:
+    dict - {host_ip: [device, ...]} in the order of config.shards
+
+    Raises TcError if the hosts are not valid or too small for the topology
+    """
+    if config.provider != 'libvirt':
+        raise tc_error.TcError('Sharding across hypervisors is only supported with the libvirt '
+                               'provider', print_on_create=False)
+    hosts = [parse_host(spec) for spec in config.shards]
+    if len(set(host.ip for host in hosts)) != len(hosts):
+        raise tc_error.TcError('Each shard host may only be specified once',
+                               print_on_create=False)
+
+    assignment = partition(inventory, hosts)
+    apply_shards(inventory, assignment)
+
+    shard_map = collections.OrderedDict((host.ip, []) for host in hosts)
+    for device, host in assignment.items():
+        shard_map[host.ip].append(device)
+
+    if config.verbose > 0:
+        print('  INFO: sharded %s devices across %s hosts with %s cross-host links'
+              % (len(assignment), len(hosts), cut_size(assignment, link_weights(inventory,
+                                                                               assignment))))
+        for host in hosts:
+            print('    %s: %s devices, %s MB of memory, %s CPUs'
+                  % (host.ip, len(shard_map[host.ip]), host.used_memory, host.used_cpus))
+    return shard_map
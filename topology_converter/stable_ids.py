@@ -0,0 +1,232 @@
+"""
+Derives MAC addresses, network IDs and tunnel IPs from the names of the link endpoints.
+
+By default MAC addresses and network numbers are handed out in the order of the links, so adding
+a link near the top of a topology changes the MAC address, the network (virtualbox) and the tunnel
+ports (libvirt) of every link after it. With stable IDs:
+* the MAC address of an interface is derived from a hash of 'device:interface'
+* the network ID of a link (its virtualbox network and libvirt port slot) is derived from a hash
+  of its sorted endpoints, within 1 - port_gap
+* --tunnel-ip random is derived from a hash of the libvirt prefix or the output directory
+
+When a hash hits an ID which is taken (a collision, an explicit left_mac/right_mac or a tunnel
+port which is bound on the host), further hashes of the name are tried. An optional lockfile
+records every assignment; locked IDs are kept on the next conversion, so that collisions are
+always resolved the same way, and are never handed to other interfaces or links.
+"""
+
+import hashlib
+import ipaddress
+import json
+import os
+
+from . import port_planner
+from . import tc_error
+from .mac_allocator import MacAllocator, int_to_mac, mac_to_int
+
+LOCK_FORMAT = 1
+
+# Hashes tried for a name before the IDs after the last hash are searched in order
+MAX_HASHES = 64
+
+def stable_id(name, first, last, taken):
+    """
+    Derives an ID from a name
+
+    Arguments:
+    name (str) - Name the ID is derived from
+    first (int) - Smallest ID
+    last (int) - Largest ID
+    taken (container) - IDs which must not be returned
+
+    Returns:
+    int - ID in first - last
+
+    Raises ValueError if every ID is taken
+    """
+    size = last - first + 1
+    value = first
+    for attempt in range(MAX_HASHES):
+        key = name if attempt == 0 else '%s#%s' % (name, attempt)
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest()
+        value = first + int.from_bytes(digest, 'big') % size
+        if value not in taken:
+            return value
+    for offset in range(1, size):
+        candidate = first + (value - first + offset) % size
+        if candidate not in taken:
+            return candidate
+    raise ValueError('every ID in %s - %s is taken' % (first, last))
+
+def link_name(left_device, left_interface, right_device, right_interface):
+    """ Returns the name of a link: its 'device:interface' endpoints, sorted """
+    return ' -- '.join(sorted(('%s:%s' % (left_device, left_interface),
+                               '%s:%s' % (right_device, right_interface))))
+
+def load_lock(path):
+    """
+    Reads an ID lockfile
+
+    Arguments:
+    path (str) - Lockfile, which does not need to exist
+
+    Returns:
+    dict - macs ({'device:interface': mac}), networks ({link: network ID}) and tunnel_ip
+
+    Raises TcError if the lockfile cannot be read
+    """
+    lock = {'macs': {}, 'networks': {}, 'tunnel_ip': None}
+    if not path or not os.path.exists(path):
+        return lock
+    try:
+        with open(path, 'r') as lock_file:
+            data = json.load(lock_file)
+        if data.get('format') != LOCK_FORMAT:
+            raise ValueError('unknown format %s' % data.get('format'))
+        lock['macs'] = {name: mac_to_int(mac) for name, mac in data.get('macs', {}).items()}
+        lock['networks'] = {name: int(number) for name, number in
+                            data.get('networks', {}).items()}
+        lock['tunnel_ip'] = data.get('tunnel_ip')
+    except (OSError, ValueError, TypeError, AttributeError) as err:
+        raise tc_error.TcError('Cannot read the ID lockfile %s: %s' % (path, err),
+                               print_on_create=False)
+    return lock
+
+class StableMacAllocator(MacAllocator):
+    """
+    Hands out the MAC address derived from the name of an interface, or the address locked for
+    it. Addresses reserved for explicit MACs and locked addresses are never derived for other
+    interfaces.
+    """
+    def __init__(self, first, last, locked=None):
+        super().__init__(first, last)
+        self.locked = locked or {}
+        self.locked_macs = set(self.locked.values())
+        self.assigned = {}
+
+    @classmethod
+    def from_config(cls, config, locked=None): # pylint: disable=arguments-differ
+        """ Builds an allocator with the pool of MacAllocator.from_config() """
+        pool = MacAllocator.from_config(config)
+        return cls(pool.first, pool.last, locked)
+
+    def allocate(self, name=None):
+        """
+        Returns the address of an interface as an integer. Asking again for the same interface
+        returns the same address.
+
+        Arguments:
+        name (str) - 'device:interface'
+
+        Raises TcError if the pool is exhausted
+        """
+        if name in self.assigned:
+            return self.assigned[name]
+        mac_int = self.locked.get(name)
+        if mac_int is None or mac_int in self.reserved or not self.first <= mac_int <= self.last:
+            try:
+                mac_int = stable_id(name, self.first, self.last,
+                                    _Union(self.reserved, self.locked_macs))
+            except ValueError:
+                msg = 'The MAC address pool (%s - %s) is exhausted. Use a larger --mac-pool.' \
+                    % (int_to_mac(self.first), int_to_mac(self.last))
+                raise tc_error.TcError(msg, print_on_create=False)
+        self.reserved.add(mac_int)
+        self.assigned[name] = mac_int
+        self.allocated += 1
+        return mac_int
+
+class NetworkIds:
+    """
+    Hands out the network ID derived from the name of a link, or the ID locked for it. On libvirt
+    the ID is the port slot of the link, so new links skip slots whose ports are bound on the
+    host. Locked IDs are kept even then, since their ports are usually bound by the simulation
+    itself.
+    """
+    def __init__(self, last, locked=None, used_ports=None, busy=None):
+        self.last = last
+        self.locked = locked or {}
+        self.locked_ids = set(self.locked.values())
+        self.used_ports = used_ports or set()
+        self.busy = busy or set()
+        self.taken = set()
+        self.assigned = {}
+        self.tunnel_ip = None # Set by parse_topology() for --tunnel-ip random
+
+    @classmethod
+    def from_config(cls, config, locked=None):
+        """
+        Builds the network IDs of a conversion. IDs range from 1 to the port gap (limited so that
+        libvirt ports stay below 65536).
+        """
+        planner = port_planner.PortPlanner(config.start_port, config.port_gap)
+        last = max(1, min(config.port_gap, planner.max_gap()))
+        if config.provider == 'libvirt' and config.probe_ports:
+            planner.used_ports = port_planner.used_udp_ports(os.path.join(config.proc_root,
+                                                                          'net'))
+        busy = {slot for slot in range(1, last + 1) if not planner.is_free(slot, last)} \
+            if planner.used_ports else set()
+        return cls(last, locked, planner.used_ports, busy)
+
+    def allocate(self, name):
+        """
+        Returns the network ID of a link
+
+        Arguments:
+        name (str) - Link name, see link_name()
+
+        Raises TcError if every ID is taken
+        """
+        if name in self.assigned:
+            return self.assigned[name]
+        number = self.locked.get(name)
+        if number is None or number in self.taken or not 1 <= number <= self.last:
+            try:
+                number = stable_id(name, 1, self.last,
+                                   _Union(self.taken, self.locked_ids, self.busy))
+            except ValueError:
+                msg = 'The topology has more links than network IDs (1 - %s). Use a larger ' \
+                      '--port-gap.' % self.last
+                raise tc_error.TcError(msg, print_on_create=False)
+        self.taken.add(number)
+        self.assigned[name] = number
+        return number
+
+class _Union:
+    """ Membership test over several sets without copying them """
+    __slots__ = ('sets',)
+
+    def __init__(self, *sets):
+        self.sets = sets
+
+    def __contains__(self, item):
+        return any(item in ids for ids in self.sets)
+
+def stable_tunnel_ip(config, locked=None):
+    """
+    Returns the tunnel IP used for --tunnel-ip random: the locked one or an address in
+    127.0.0.0/8 derived from the libvirt prefix (or the output directory)
+    """
+    if locked:
+        return locked
+    subnet = ipaddress.IPv4Network('127.0.0.0/8')
+    name = config.prefix or os.path.abspath(config.output_dir or '.')
+    # Neither the network nor the broadcast address
+    offset = stable_id(name, 1, subnet.num_addresses - 2, ())
+    return str(subnet.network_address + offset)
+
+def lock_content(config):
+    """
+    Returns:
+    str - ID lockfile with the MAC addresses and network IDs of the links and the tunnel IP of a
+          conversion with stable IDs
+    """
+    macs = {}
+    for name, mac_int in config.mac_allocator.assigned.items():
+        mac = int_to_mac(mac_int)
+        # Addresses which were derived but not used (ie. for mgmt links which already existed)
+        if config.mac_map.get(mac) == name.replace(':', ',', 1):
+            macs[name] = mac
+    lock = {'format': LOCK_FORMAT, 'macs': macs, 'networks': config.network_ids.assigned,
+            'tunnel_ip': config.network_ids.tunnel_ip}
+    return json.dumps(lock, indent=2, sort_keys=True) + '\n'
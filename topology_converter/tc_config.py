@@ -3,9 +3,14 @@ The TcConfig module represents a configuration set needed for running Topology C
 """
 # pylint: disable=too-few-public-methods
 
+import collections
+import hashlib
 import os
 import sys
 
+from .phase_timer import PhaseTimer
+from .warning_messages import WarningMessages
+
 class TcConfig:
     """
     Provides configuration options with defaults for TopologyConverter. An instance of this class
@@ -23,32 +28,81 @@ class TcConfig:
 
         self.ansible_hostfile = clean_kwargs.get('ansible_hostfile', False)
         self.arg_string = clean_kwargs.get('arg_string', ' '.join(sys.argv))
+        self.cache_dir = clean_kwargs.get('cache_dir', None)
+        self.cache_max_size = clean_kwargs.get('cache_max_size', 512)
+        self.capacity_report = clean_kwargs.get('capacity_report', False)
+        self.counters = collections.Counter()
         self.create_mgmt_configs_only = clean_kwargs.get('create_mgmt_configs_only', False)
         self.create_mgmt_device = clean_kwargs.get('create_mgmt_device', False)
         self.create_mgmt_network = clean_kwargs.get('create_mgmt_network', False)
+        self.diff = clean_kwargs.get('diff', None)
         self.display_datastructures = clean_kwargs.get('display_datastructures', False)
+        self.extra_templates = [list(template) for template in clean_kwargs.get('template', [])]
+        self.fragments_dir = clean_kwargs.get('fragments_dir', None)
         self.function_group = clean_kwargs.get('function_group', {})
+        self.id_lock = clean_kwargs.get('id_lock', None)
+        self.links = []
+        self.mac_allocator = None
         self.mac_map = {}
-        self.mgmt_destination_dir = clean_kwargs.get('function_group',
+        self.mac_pool = clean_kwargs.get('mac_pool', None)
+        self.manifest = clean_kwargs.get('manifest', None)
+        self.mgmt_dhcp_range = clean_kwargs.get('mgmt_dhcp_range', None)
+        self.mgmt_destination_dir = clean_kwargs.get('mgmt_destination_dir',
                                                      './helper_scripts/auto_mgmt_network/')
+        self.mgmt_fanout = clean_kwargs.get('mgmt_fanout', 126)
         self.network_functions = clean_kwargs.get('network_functions',
                                                   ['oob-switch', 'internet', 'exit', 'superspine',
                                                    'spine', 'leaf', 'tor'])
+        self.network_ids = None
+        self.output = None
+        self.output_dir = clean_kwargs.get('output_dir', None)
         self.parser = clean_kwargs.get('parser', None)
         self.port_gap = clean_kwargs.get('port_gap', 1000)
         self.prefix = clean_kwargs.get('prefix', None)
+        self.probe_ports = clean_kwargs.get('probe_ports', False)
+        self.proc_root = clean_kwargs.get('proc_root', '/proc')
+        self.profile = clean_kwargs.get('profile', None)
+        self.profile_prometheus = clean_kwargs.get('profile_prometheus', None)
+        self.profile_pstats = clean_kwargs.get('profile_pstats', None)
         self.provider = clean_kwargs.get('provider', 'virtualbox')
         self.relpath_to_me = clean_kwargs.get('relpath_to_me', default_relpath_to_me)
+        self.render_workers = clean_kwargs.get('render_workers', 1)
+        self.reproducible = clean_kwargs.get('reproducible', False)
         self.script_storage = clean_kwargs.get('script_storage', './helper_scripts')
+        self.shard_map = {}
+        self.shards = clean_kwargs.get('shard', [])
+        self.snapshot = clean_kwargs.get('snapshot', None)
+        self.stable_ids = clean_kwargs.get('stable_ids', False)
         self.start_mac = clean_kwargs.get('start_mac', '443839000000')
         self.start_port = clean_kwargs.get('start_port', 8000)
         self.synced_folder = clean_kwargs.get('synced_folder', False)
+        self.sys_root = clean_kwargs.get('sys_root', '/sys')
         self.template_storage = default_template_storage
-        self.templates = clean_kwargs.get('template', [])
+        self.template_cache_dir = clean_kwargs.get('template_cache_dir', None)
+        self.templates = [list(template) for template in self.extra_templates]
+        self.timings = PhaseTimer()
         self.tunnel_ip = clean_kwargs.get('tunnel_ip', None)
         self.topology_file = clean_kwargs.get('topology_file', '')
         self.total_memory = clean_kwargs.get('total_memory', 0)
+        self.up = clean_kwargs.get('up', False) # pylint: disable=invalid-name
+        self.up_jobs = clean_kwargs.get('up_jobs', None)
+        self.up_log = clean_kwargs.get('up_log', None)
+        self.up_memory = clean_kwargs.get('up_memory', None)
+        self.up_retries = clean_kwargs.get('up_retries', 2)
         self.use_ztp = clean_kwargs.get('use_ztp', True)
         self.vagrant = clean_kwargs.get('vagrant', 'eth0')
+        self.vagrant_binary = clean_kwargs.get('vagrant_binary', 'vagrant')
         self.verbose = clean_kwargs.get('verbose', 0)
+        self.warnings = WarningMessages()
         self.version = clean_kwargs.get('version', '')
+
+def pinned_epoch_time(config):
+    """
+    Returns the simulation ID used instead of the current time in reproducible mode. This is
+    SOURCE_DATE_EPOCH when set, otherwise a number derived from the location of the topology so
+    that simulations in different directories still get different IDs.
+    """
+    if os.environ.get('SOURCE_DATE_EPOCH', '').isdigit():
+        return os.environ['SOURCE_DATE_EPOCH']
+    location = os.path.join(os.getcwd(), config.topology_file or '')
+    return str(int(hashlib.sha256(location.encode('utf-8')).hexdigest()[:8], 16))
@@ -28,3 +28,23 @@ class LintError(TcError):
     def __init__(self, message, print_on_create=True):
         self.message = message
         super().__init__(message, print_on_create)
+
+class TopologyErrors(TcError):
+    """
+    A collection of problems found while linting and parsing a topology. Each error is stored as
+    a (line_number, message) tuple where line_number may be None if it is not known.
+    """
+    def __init__(self, errors, print_on_create=True):
+        self.errors = errors
+        lines = []
+        for line_number, message in errors:
+            if line_number is None:
+                lines.append(message.rstrip())
+            else:
+                lines.append('Line %s: %s' % (line_number, message.rstrip()))
+        if len(lines) == 1:
+            message = lines[0]
+        else:
+            message = '%s problems found in the topology:\n' % len(lines)
+            message += '\n'.join(' %s) %s' % (i, line) for i, line in enumerate(lines, 1))
+        super().__init__(message, print_on_create)
@@ -0,0 +1,5 @@
+"""
+Version of Topology Converter. Kept in its own module so that reading it imports nothing else.
+"""
+
+VERSION = '4.7.1'
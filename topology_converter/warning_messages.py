@@ -1,20 +1,28 @@
 """
-Serves as a global logger that can be used to print messages at the end of a Topology Converter run.
+Collects warnings that are printed at the end of a Topology Converter run.
 """
-# pylint: disable=print-function,no-self-use
+# pylint: disable=print-function
 
 class WarningMessages:
     """
-    An instance of this class can be used to create and print warning messages
+    An instance of this class can be used to create and print warning messages. Every conversion
+    gets its own instance (TcConfig.warnings) so that conversions in the same process do not
+    share warnings.
     """
-    # A static list of warnings that will be shared amongst WarningMessages instances
-    warnings = []
+    def __init__(self):
+        self.warnings = []
+
+    def __iter__(self):
+        return iter(self.warnings)
+
+    def __len__(self):
+        return len(self.warnings)
 
     def append(self, msg):
         """ Wrapper for appending a message to the list """
-        WarningMessages.warnings.append(msg)
+        self.warnings.append(msg)
 
     def print_warnings(self):
         """ Prints all warnings that have been generated so far """
-        for warning in WarningMessages.warnings:
+        for warning in self.warnings:
             print(warning)